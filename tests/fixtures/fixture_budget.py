@@ -0,0 +1,147 @@
+"""Плагин бюджетов запросов: каждый маршрут posts.urls каждым методом,
+для которого объявлен бюджет, на 1, 10 и 100 постах на странице
+с одним и двадцатью комментариями у каждого поста."""
+import json
+
+import pytest
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+
+from core.budget import budgets
+from posts import counters, fulltext
+from posts.models import Comment, Follow, Group, Post
+
+PAGE_SIZES = (1, 10, 100)
+ROWS_PER_POST = (1, 20)
+BUDGETS = budgets('posts.urls')
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def _image():
+    return SimpleUploadedFile('budget.gif', SMALL_GIF, 'image/gif')
+
+
+# Тела запросов на запись: самый дорогой путь — с группой и картинкой.
+PAYLOADS = {
+    'posts:post_create': lambda values: {
+        'text': 'Новый пост', 'group': values['group_id'], 'image': _image(),
+    },
+    'posts:post_edit': lambda values: {
+        'text': 'Правка', 'group': values['group_id'], 'image': _image(),
+    },
+    'posts:add_comment': lambda values: {'text': 'Ещё комментарий'},
+    'posts:api_post_list': lambda values: {
+        'text': 'Через API', 'group': values['slug'],
+    },
+    'posts:api_post_detail': lambda values: {
+        'text': 'Правка через API', 'group': values['slug'],
+    },
+    'posts:api_comment_list': lambda values: {'text': 'Через API'},
+    'posts:api_follow_list': lambda values: {'author': values['new_author']},
+}
+# Подписка дороже всего, когда её ещё нет.
+NEW_FOLLOW = {'posts:profile_follow'}
+# Поиск с запросом, под который попадает вся страница постов.
+QUERIES = {
+    'posts:search': {'q': 'пост'},
+    'posts:search_api': {'q': 'пост'},
+}
+
+
+def pytest_generate_tests(metafunc):
+    if 'budget' in metafunc.fixturenames:
+        metafunc.parametrize(
+            'budget', BUDGETS,
+            ids=[f'{budget.name}-{budget.method}' for budget in BUDGETS],
+        )
+    if 'posts_per_page' in metafunc.fixturenames:
+        metafunc.parametrize(
+            'posts_per_page', PAGE_SIZES,
+            ids=[f'{size}-posts' for size in PAGE_SIZES],
+        )
+    if 'rows_per_post' in metafunc.fixturenames:
+        metafunc.parametrize(
+            'rows_per_post', ROWS_PER_POST,
+            ids=[f'{rows}-rows' for rows in ROWS_PER_POST],
+        )
+
+
+@pytest.fixture
+def budget_kwargs(settings, mock_media, user, another_user, posts_per_page,
+                  rows_per_post):
+    """Полные страницы постов ``user`` и автора, на которого он подписан.
+
+    У каждого поста своя картинка и ``rows_per_post`` комментариев:
+    стоимость на строку выдаёт себя ростом числа запросов. Запросы идут
+    от ``user``: он автор своих постов и всех комментариев, поэтому
+    правка и удаление проходят по-настоящему. Возвращает значения для
+    аргументов маршрутов по их именам.
+    """
+    settings.POSTS_ON_PAGE = posts_per_page
+    cache.clear()
+    group = Group.objects.create(
+        title='Бюджет', slug='budget', description='Запросы на страницу'
+    )
+    Post.objects.bulk_create(
+        Post(
+            author=author,
+            group=group,
+            text=f'Пост {number}',
+            image=f'posts/budget-{number}.jpg',
+        )
+        for author in (user, another_user)
+        for number in range(posts_per_page)
+    )
+    posts = list(Post.objects.filter(author=user).order_by('pk'))
+    Comment.objects.bulk_create(
+        Comment(post=post, author=user, text=f'Комментарий {number}')
+        for post in Post.objects.all()
+        for number in range(rows_per_post)
+    )
+    Follow.objects.create(user=user, author=another_user)
+    newcomer = type(user).objects.create_user(username='Newcomer')
+    # bulk_create обходит сигналы: счётчики и поисковый индекс заводятся
+    # заново, как после импорта, и счётчики читаются один раз, как на
+    # живом сайте.
+    counters.rebuild_all()
+    fulltext.rebuild()
+    for scope in (counters.ALL, counters.group_scope(group.pk)):
+        counters.get_count(scope)
+    return {
+        'slug': group.slug,
+        'group_id': group.pk,
+        'username': another_user.username,
+        'new_author': newcomer.username,
+        'post_id': posts[0].pk,
+        'comment_id': Comment.objects.filter(post=posts[0]).first().pk,
+    }
+
+
+@pytest.fixture
+def budget_request(budget, budget_kwargs):
+    """Адрес и аргументы клиента для запроса ``budget.method``."""
+    values = dict(budget_kwargs)
+    if budget.name in NEW_FOLLOW:
+        values['username'] = values['new_author']
+    url = reverse(budget.name, kwargs={
+        name: values[name] for name in budget.pattern.pattern.converters
+    })
+    if budget.method == 'GET':
+        return url, {'data': QUERIES.get(budget.name, {})}
+    if budget.method == 'DELETE':
+        return url, {}
+    data = PAYLOADS[budget.name](values)
+    if budget.name.startswith('posts:api_'):
+        return url, {
+            'data': json.dumps(data), 'content_type': 'application/json',
+        }
+    return url, {'data': data}
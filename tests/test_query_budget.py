@@ -0,0 +1,27 @@
+from core.budget import within_budget
+
+
+def test_view_has_budget(budget):
+    assert budget.limit is not None, (
+        f'У представления `{budget.name}` не объявлен бюджет запросов. '
+        f'Добавьте декоратор `@query_budget(...)`.'
+    )
+
+
+def test_view_within_budget(budget, posts_per_page, rows_per_post,
+                            user_client, budget_request):
+    if budget.limit is None:
+        return
+    url, arguments = budget_request
+    with within_budget(
+        budget.limit,
+        f'`{budget.name}` {budget.method} при {posts_per_page} постах '
+        f'по {rows_per_post} комментариев',
+    ):
+        response = getattr(user_client, budget.method.lower())(
+            url, **arguments
+        )
+    assert response.status_code < 400, (
+        f'`{budget.name}` {budget.method} ответил {response.status_code}: '
+        f'бюджет замерен не на рабочем пути'
+    )
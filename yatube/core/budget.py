@@ -0,0 +1,72 @@
+"""Бюджеты SQL-запросов для представлений.
+
+Представление объявляет потолок запросов декоратором ``query_budget``,
+отдельно для каждого метода, который оно принимает. Потолок не зависит
+от числа постов на странице, поэтому N+1 во view или в шаблоне сразу
+выводит страницу за бюджет. Бюджеты всех маршрутов и методов проверяет
+pytest-плагин ``tests.fixtures.fixture_budget`` на страницах из 1, 10 и
+100 постов от имени автора постов и комментариев.
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+from importlib import import_module
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+Budget = namedtuple('Budget', 'name pattern view method limit')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(limit=None, **methods):
+    """Не больше ``limit`` запросов на GET к представлению.
+
+    Потолки других методов передаются по имени метода:
+    ``query_budget(4, POST=6)``, ``query_budget(DELETE=7)``. Декоратор
+    ставится внешним, поверх ``login_required`` и прочих.
+    """
+    limits = dict(methods)
+    if limit is not None:
+        limits['GET'] = limit
+
+    def decorator(view):
+        view.query_budget = limits
+        return view
+    return decorator
+
+
+def budgets(urlconf):
+    """Бюджеты представлений из urlconf: по одному на маршрут и метод.
+
+    У представления без бюджета один ``Budget`` с методом GET и
+    ``limit`` None.
+    """
+    module = import_module(urlconf)
+    app_name = getattr(module, 'app_name', None)
+    result = []
+    for pattern in module.urlpatterns:
+        name = f'{app_name}:{pattern.name}' if app_name else pattern.name
+        limits = getattr(pattern.callback, 'query_budget', None) or {
+            'GET': None
+        }
+        result.extend(
+            Budget(name, pattern, pattern.callback, method, limit)
+            for method, limit in limits.items()
+        )
+    return result
+
+
+@contextmanager
+def within_budget(limit, label):
+    """Падает QueryBudgetExceeded, если в блоке запросов больше ``limit``."""
+    with CaptureQueriesContext(connection) as context:
+        yield context
+    if len(context) > limit:
+        queries = '\n'.join(query['sql'] for query in context.captured_queries)
+        raise QueryBudgetExceeded(
+            f'{label}: {len(context)} запросов при бюджете {limit}\n'
+            f'{queries}'
+        )
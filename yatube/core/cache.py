@@ -0,0 +1,264 @@
+import pickle
+import select
+import socket
+from urllib.parse import urlparse
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+# Команды, которые можно повторить, не зная, выполнилась ли первая
+# попытка: второй раз они приводят к тому же итогу.
+IDEMPOTENT = frozenset(
+    ('GET', 'MGET', 'EXISTS', 'DEL', 'PEXPIRE', 'PERSIST', 'SCAN', 'SELECT')
+)
+
+
+class RedisError(Exception):
+    pass
+
+
+def _idempotent(args):
+    command = str(args[0]).upper()
+    if command == 'SET':
+        return 'NX' not in args
+    return command in IDEMPOTENT
+
+
+class RedisConnection:
+    """Минимальный клиент протокола RESP: команда — ответ."""
+
+    def __init__(self, host, port, db=0, timeout=None):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+
+    def _connect(self):
+        self._sock = socket.create_connection(
+            (self.host, self.port), self.timeout
+        )
+        self._reader = self._sock.makefile('rb')
+        if self.db:
+            self._send('SELECT', self.db)
+
+    def close(self):
+        if self._sock is not None:
+            self._reader.close()
+            self._sock.close()
+        self._sock = self._reader = None
+
+    @staticmethod
+    def _encode(args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def _read(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError('Redis закрыл соединение')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            raise RedisError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length == -1:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(payload)
+            if length == -1:
+                return None
+            return [self._read() for _ in range(length)]
+        raise RedisError(f'Непонятный ответ: {line!r}')
+
+    def _send(self, *args):
+        self._sock.sendall(self._encode(args))
+        return self._read()
+
+    def _stale(self):
+        """Сервер закрыл простаивающее соединение.
+
+        Между командами из сокета читать нечего; если он готов к
+        чтению, там конец потока или мусор.
+        """
+        readable, _, _ = select.select([self._sock], [], [], 0)
+        return bool(readable)
+
+    def execute(self, *args):
+        if self._sock is not None and self._stale():
+            self.close()
+        if self._sock is None:
+            self._connect()
+        try:
+            self._sock.sendall(self._encode(args))
+        except OSError:
+            # Команда не ушла на сервер: отправляем её заново по новому
+            # соединению, дальше ошибка уходит наверх.
+            self.close()
+            self._connect()
+            return self._send(*args)
+        try:
+            return self._read()
+        except OSError:
+            # Сервер мог выполнить команду и не успеть ответить. Повтор
+            # только для тех, что безопасно выполнить дважды: INCRBY или
+            # SET NX второй раз дали бы другой итог.
+            self.close()
+            if not _idempotent(args):
+                raise
+            self._connect()
+            return self._send(*args)
+
+
+class RedisCache(BaseCache):
+    """Кэш Django поверх сервера с протоколом Redis.
+
+    ``LOCATION`` — адрес вида ``redis://host:port/db``. Целые числа
+    хранятся строкой, чтобы ``incr`` выполнялся на сервере атомарно,
+    остальное — в pickle. Ключи строятся стандартной ``KEY_FUNCTION``:
+    по префиксу из неё ``clear()`` находит свои ключи.
+    """
+    # Проверка и прибавление одним шагом на сервере: между EXISTS и
+    # INCRBY ключ мог истечь, и INCRBY создал бы его без срока жизни.
+    INCR_SCRIPT = (
+        "if redis.call('EXISTS', KEYS[1]) == 1 then "
+        "return redis.call('INCRBY', KEYS[1], ARGV[1]) end "
+        "return false"
+    )
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        url = urlparse(location)
+        self._connection = RedisConnection(
+            url.hostname or '127.0.0.1',
+            url.port or 6379,
+            int(url.path.strip('/') or 0),
+            params.get('OPTIONS', {}).get('SOCKET_TIMEOUT', 1),
+        )
+
+    def _ttl(self, timeout):
+        """Срок жизни в миллисекундах; None — вечно, 0 — уже истёк."""
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return None
+        return max(0, int(timeout * 1000))
+
+    @staticmethod
+    def _dump(value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return str(value).encode()
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _load(data):
+        if data is None:
+            return None
+        try:
+            return int(data)
+        except ValueError:
+            return pickle.loads(data)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _set(self, key, value, timeout, only_new=False):
+        ttl = self._ttl(timeout)
+        if ttl == 0:
+            self._connection.execute('DEL', key)
+            return False
+        args = ['SET', key, self._dump(value)]
+        if ttl is not None:
+            args += ['PX', ttl]
+        if only_new:
+            args.append('NX')
+        return self._connection.execute(*args) == 'OK'
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._set(self._key(key, version), value, timeout, True)
+
+    def get(self, key, default=None, version=None):
+        data = self._connection.execute('GET', self._key(key, version))
+        return default if data is None else self._load(data)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._set(self._key(key, version), value, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        ttl = self._ttl(timeout)
+        if ttl is None:
+            return bool(self._connection.execute('PERSIST', key)) or bool(
+                self._connection.execute('EXISTS', key)
+            )
+        return bool(self._connection.execute('PEXPIRE', key, ttl))
+
+    def delete(self, key, version=None):
+        self._connection.execute('DEL', self._key(key, version))
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        redis_keys = [self._key(key, version) for key in keys]
+        values = self._connection.execute('MGET', *redis_keys)
+        return {
+            key: self._load(data)
+            for key, data in zip(keys, values)
+            if data is not None
+        }
+
+    def has_key(self, key, version=None):
+        return bool(
+            self._connection.execute('EXISTS', self._key(key, version))
+        )
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        value = self._connection.execute(
+            'EVAL', self.INCR_SCRIPT, 1, key, delta
+        )
+        if value is None:
+            raise ValueError(f"Key '{key}' not found")
+        return value
+
+    def _pattern(self):
+        """Шаблон SCAN для ключей этого кэша всех версий."""
+        prefix = self.key_prefix
+        for char in '\\*?[]':
+            prefix = prefix.replace(char, '\\' + char)
+        return f'{prefix}:*'
+
+    def clear(self):
+        # Только свои ключи: в той же базе Redis могут жить чужие.
+        cursor = b'0'
+        while True:
+            cursor, keys = self._connection.execute(
+                'SCAN', cursor, 'MATCH', self._pattern(), 'COUNT', 1000
+            )
+            if keys:
+                self._connection.execute('DEL', *keys)
+            if cursor == b'0':
+                return
+
+    def close(self, **kwargs):
+        # Django вызывает close() после каждого запроса; соединение
+        # живёт дольше запроса, как у CONN_MAX_AGE базы.
+        pass
+
+    def disconnect(self):
+        """Закрывает соединение с сервером, например при остановке."""
+        self._connection.close()
@@ -0,0 +1,164 @@
+"""Чтение с реплик и проверка постоянных соединений.
+
+Представления, помеченные ``@use_replica``, читают модели приложений
+``REPLICATED_APPS`` с одной из реплик ``REPLICA_DATABASES``; всё прочее
+и любая запись идут в ``default``. После записи в реплицируемые модели
+ответ ставит cookie, и ещё ``REPLICA_STICKY_SECONDS`` секунд этот
+браузер читает только с основной базы — так автор сразу видит свой
+пост, комментарий или подписку, даже если реплика отстаёт. Ремонт
+счётчиков по ходу чтения идёт в блоке ``repair()``: он читает и пишет
+основную базу, но чтение липким не делает.
+
+Соединения живут ``CONN_MAX_AGE`` секунд — в Django это и есть пул: по
+соединению на поток и базу. Перед запросом соединение, которое долго
+простаивало, проверяется и закрывается, если база его уже оборвала.
+Реплика, к которой не удалось подключиться, на ``REPLICA_RETRY_SECONDS``
+выводится из ротации.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DatabaseError, connections
+from django.dispatch import receiver
+
+DEFAULT = 'default'
+REPLICATED_APPS = {'posts', 'auth'}
+STICKY_COOKIE = 'read_primary'
+
+_state = ContextVar('replica_state', default=None)
+_down_until = {}
+
+
+def use_replica(view):
+    """Чтение в представлении может отставать от записи."""
+    view.replica_reads = True
+    return view
+
+
+@contextmanager
+def repair():
+    """Запись производных данных, которую затеяло чтение.
+
+    Пересчёт по отстающей реплике сохранил бы устаревшее число, поэтому
+    внутри блока всё читается с основной базы. Пользователь сам ничего
+    не записал, и cookie липкого чтения ответ не получит.
+    """
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    replica = state['replica']
+    state['replica'] = None
+    state['repairing'] += 1
+    try:
+        yield
+    finally:
+        state['repairing'] -= 1
+        state['replica'] = replica
+
+
+def _available(alias):
+    if _down_until.get(alias, 0) > time.monotonic():
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError:
+        _down_until[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+        return False
+    return True
+
+
+def choose_replica():
+    """Живая реплика или None, если читать не с чего."""
+    replicas = list(settings.REPLICA_DATABASES)
+    random.shuffle(replicas)
+    for alias in replicas:
+        if _available(alias):
+            return alias
+    return None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (
+            state is not None
+            and state['replica']
+            and model._meta.app_label in REPLICATED_APPS
+        ):
+            return state['replica']
+        return DEFAULT
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if (
+            state is not None
+            and not state['repairing']
+            and model._meta.app_label in REPLICATED_APPS
+        ):
+            # Остаток запроса тоже читает своё же.
+            state['wrote'] = True
+            state['replica'] = None
+        return DEFAULT
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = {
+            'replica': None,
+            'wrote': False,
+            'repairing': 0,
+            'sticky': STICKY_COOKIE in request.COOKIES,
+        }
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state['wrote']:
+            response.set_cookie(
+                STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _state.get()
+        if (
+            getattr(view_func, 'replica_reads', False)
+            and not state['sticky']
+            and not state['wrote']
+        ):
+            state['replica'] = choose_replica()
+
+
+def check_connection(connection, now):
+    """Закрывает соединение, если оно простаивало и перестало отвечать."""
+    if connection.connection is None:
+        return
+    checked = getattr(connection, 'health_checked', now)
+    connection.health_checked = now
+    if (
+        now - checked >= settings.CONN_HEALTH_CHECK_INTERVAL
+        and not connection.is_usable()
+    ):
+        connection.close()
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    now = time.monotonic()
+    for connection in connections.all():
+        check_connection(connection, now)
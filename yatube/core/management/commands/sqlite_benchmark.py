@@ -0,0 +1,154 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.test.utils import override_settings
+
+from core.sqlite import WriteQueue
+
+MODES = ('baseline', 'pragmas', 'queue')
+
+TABLE = '''
+    CREATE TABLE entry (
+        id INTEGER PRIMARY KEY,
+        author INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        created TEXT NOT NULL
+    )
+'''
+COUNTER = '''
+    CREATE TABLE counter (
+        id INTEGER PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+'''
+UPDATE = 'UPDATE counter SET value = value + 1 WHERE id = %s'
+INSERT = (
+    "INSERT INTO entry (author, text, created) "
+    "VALUES (%s, %s, datetime('now'))"
+)
+
+
+class Command(BaseCommand):
+    help = ('Меряет пропускную способность записей в SQLite из многих '
+            'потоков: без настройки, с прагмами и с очередью записей')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Сколько потоков пишут одновременно',
+        )
+        parser.add_argument(
+            '--writes',
+            type=int,
+            default=200,
+            help='Сколько записей делает каждый поток',
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для JSON; по умолчанию stdout',
+        )
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        try:
+            result = {
+                'threads': options['threads'],
+                'writes_per_thread': options['writes'],
+                'modes': {
+                    mode: self.measure(
+                        mode, os.path.join(directory, f'{mode}.sqlite3'),
+                        options['threads'], options['writes'],
+                    )
+                    for mode in MODES
+                },
+            }
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        output = json.dumps(result, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                stream.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def measure(self, mode, path, threads, writes):
+        alias = f'benchmark_{mode}'
+        connections.databases[alias] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': path,
+        }
+        connections.ensure_defaults(alias)
+        connections.prepare_test_settings(alias)
+        overrides = {'WRITE_QUEUE': True}
+        if mode == 'baseline':
+            overrides['SQLITE_PRAGMAS'] = {}
+        try:
+            with override_settings(**overrides):
+                self.create_tables(alias, threads)
+                seconds, errors = self.write(mode, alias, threads, writes)
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM entry')
+                written, = cursor.fetchone()
+        finally:
+            connections[alias].close()
+            # Временная база не должна пережить замер.
+            del connections[alias]
+            del connections.databases[alias]
+        return {
+            'written': written,
+            'errors': len(errors),
+            'seconds': round(seconds, 3),
+            'writes_per_second': round(written / seconds, 1),
+        }
+
+    def create_tables(self, alias, threads):
+        with connections[alias].cursor() as cursor:
+            cursor.execute(TABLE)
+            cursor.execute(COUNTER)
+            for author in range(threads):
+                cursor.execute(
+                    'INSERT INTO counter (id, value) VALUES (%s, 0)',
+                    [author],
+                )
+        connections[alias].close()
+
+    def write(self, mode, alias, threads, writes):
+        """Пишет из ``threads`` потоков; возвращает (секунды, ошибки)."""
+        write_queue = WriteQueue(using=alias)
+        errors = []
+
+        def insert(author, number):
+            with transaction.atomic(using=alias):
+                with connections[alias].cursor() as cursor:
+                    cursor.execute(INSERT, [author, f'Запись {number}'])
+                    cursor.execute(UPDATE, [author])
+
+        def worker(author):
+            for number in range(writes):
+                try:
+                    if mode == 'queue':
+                        write_queue.run(lambda: insert(author, number))
+                    else:
+                        insert(author, number)
+                except OperationalError as error:
+                    errors.append(str(error))
+            connections[alias].close()
+
+        workers = [
+            threading.Thread(target=worker, args=(author,))
+            for author in range(threads)
+        ]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return time.perf_counter() - started, errors
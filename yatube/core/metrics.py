@@ -0,0 +1,337 @@
+"""Метрики в текстовом формате Prometheus, общие для всех процессов.
+
+Каждый процесс копит значения у себя и не чаще раза в
+``METRICS_FLUSH_INTERVAL`` секунд сбрасывает их в свой файл
+``<pid>-<uuid>.json`` в ``METRICS_DIR``: новый воркер с тем же pid не
+затрёт файл предшественника. Страница метрик складывает файлы всех
+процессов: счётчики и корзины гистограмм просто суммируются. Файлы
+завершившихся процессов вливаются в ``retired.json`` и удаляются,
+поэтому каталог не растёт, а счётчики не откатываются назад при
+перезапуске воркеров. Каталог — на одной машине с процессами: живость
+проверяется по pid.
+"""
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from django.conf import settings
+from django.db import connections
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+RETIRED = 'retired.json'
+# Недописанный временный файл упавшего процесса живёт не дольше этого.
+STALE_TEMPORARY = 60 * 60
+
+_lock = threading.Lock()
+_values = defaultdict(float)
+_flushed = 0.0
+_process = f'{os.getpid()}-{uuid.uuid4().hex}'
+_metrics = {}
+
+
+def _forked():
+    # Потомок начинает с нуля и под своим именем, иначе значения
+    # родителя посчитались бы дважды.
+    global _process, _flushed
+    _values.clear()
+    _flushed = 0.0
+    _process = f'{os.getpid()}-{uuid.uuid4().hex}'
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forked)
+
+
+class Counter:
+    """Счётчик; имя — как у его серии, с ``_total`` на конце."""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        _metrics[name] = self
+
+    def inc(self, *labels, amount=1):
+        _add(self.name, '', labels, amount)
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        _metrics[name] = self
+
+    def observe(self, value, *labels):
+        # Корзины храним сразу накопленными: так их можно суммировать
+        # между процессами без пересчёта.
+        with _lock:
+            for bound in self.buckets:
+                if value <= bound:
+                    _values[self.name, '_bucket', labels + (bound,)] += 1
+            _values[self.name, '_bucket', labels + ('+Inf',)] += 1
+            _values[self.name, '_sum', labels] += value
+            _values[self.name, '_count', labels] += 1
+        _maybe_flush()
+
+
+def _add(name, suffix, labels, amount):
+    with _lock:
+        _values[name, suffix, labels] += amount
+    _maybe_flush()
+
+
+REQUEST_LATENCY = Histogram(
+    'yatube_request_duration_seconds',
+    'Время ответа по имени маршрута',
+    ('view',),
+)
+DB_QUERIES = Counter(
+    'yatube_db_queries_total',
+    'SQL-запросы по имени маршрута',
+    ('view',),
+)
+FRAGMENT_CACHE = Counter(
+    'yatube_fragment_cache_requests_total',
+    'Обращения к кэшу фрагментов: hit, stale или miss',
+    ('fragment', 'result'),
+)
+THUMBNAIL_SECONDS = Histogram(
+    'yatube_thumbnail_generation_seconds',
+    'Время отрисовки всех вариантов одной картинки',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+def _path(name):
+    return os.path.join(settings.METRICS_DIR, f'{name}.json')
+
+
+def _rows(values):
+    return [
+        [name, suffix, list(labels), value]
+        for (name, suffix, labels), value in values.items()
+    ]
+
+
+def _write(path, data):
+    descriptor, temporary = tempfile.mkstemp(dir=settings.METRICS_DIR)
+    with os.fdopen(descriptor, 'w') as stream:
+        json.dump(data, stream)
+    os.replace(temporary, path)
+
+
+def _read(path, default):
+    try:
+        with open(path) as stream:
+            return json.load(stream)
+    except FileNotFoundError:
+        return default
+
+
+def flush():
+    """Сбрасывает значения процесса в его файл атомарной заменой."""
+    global _flushed
+    with _lock:
+        rows = _rows(_values)
+        _flushed = time.monotonic()
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    _write(_path(_process), rows)
+
+
+def _maybe_flush():
+    if time.monotonic() - _flushed >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def _alive(name):
+    try:
+        pid = int(name.split('-', 1)[0])
+    except ValueError:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _add_rows(totals, rows):
+    for name, suffix, labels, value in rows:
+        totals[name, suffix, tuple(labels)] += value
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def _directory_lock():
+    """Один сборщик за раз: пока он вливает файлы, другие не читают."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(settings.METRICS_DIR, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _process_files():
+    """(имя файла, жив ли процесс) для файлов процессов в каталоге.
+
+    Заодно удаляет временные файлы, брошенные упавшими процессами.
+    """
+    for entry in os.scandir(settings.METRICS_DIR):
+        if entry.name == RETIRED or entry.name.startswith('.'):
+            continue
+        if entry.name.endswith('.json'):
+            yield entry.name, _alive(entry.name[:-len('.json')])
+        elif time.time() - entry.stat().st_mtime > STALE_TEMPORARY:
+            _remove(entry.path)
+
+
+def _retire():
+    """Вливает файлы завершившихся процессов в ``retired.json``.
+
+    Возвращает накопленную сумму. Список влитых файлов пишется вместе
+    с ней: если процесс упадёт до их удаления, следующий вызов удалит
+    их, не сложив второй раз.
+    """
+    path = os.path.join(settings.METRICS_DIR, RETIRED)
+    retired = _read(path, {'rows': [], 'merged': []})
+    for name in retired['merged']:
+        _remove(os.path.join(settings.METRICS_DIR, name))
+    totals = defaultdict(float)
+    _add_rows(totals, retired['rows'])
+    dead = []
+    for name, alive in list(_process_files()):
+        if not alive:
+            _add_rows(totals, _read(
+                os.path.join(settings.METRICS_DIR, name), []
+            ))
+            dead.append(name)
+    if dead or retired['merged']:
+        _write(path, {'rows': _rows(totals), 'merged': dead})
+        for name in dead:
+            _remove(os.path.join(settings.METRICS_DIR, name))
+        _write(path, {'rows': _rows(totals), 'merged': []})
+    return totals
+
+
+def collect():
+    """Значения всех процессов: {(имя, суффикс, метки): сумма}."""
+    flush()
+    with _directory_lock():
+        totals = _retire()
+        for name, _ in _process_files():
+            _add_rows(totals, _read(
+                os.path.join(settings.METRICS_DIR, name), []
+            ))
+    return totals
+
+
+def _escape(value):
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\n', '\\n')
+        .replace('"', '\\"')
+    )
+
+
+def _format_bound(bound):
+    return bound if isinstance(bound, str) else repr(float(bound))
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def _order(sample):
+    """Серия за серией: корзины по возрастанию границы, затем sum и count."""
+    suffix, labels, _ = sample
+    if suffix == '_bucket':
+        bound = labels[-1]
+        return labels[:-1], 0, math.inf if bound == '+Inf' else bound
+    return labels, 1 if suffix == '_sum' else 2, 0
+
+
+def exposition():
+    """Все метрики в текстовом формате Prometheus 0.0.4."""
+    totals = collect()
+    lines = []
+    for metric in _metrics.values():
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        samples = sorted(
+            (
+                (suffix, labels, value)
+                for (name, suffix, labels), value in totals.items()
+                if name == metric.name
+            ),
+            key=_order,
+        )
+        for suffix, labels, value in samples:
+            names = list(metric.labels)
+            if suffix == '_bucket':
+                names.append('le')
+                labels = labels[:-1] + (_format_bound(labels[-1]),)
+            pairs = ','.join(
+                f'{name}="{_escape(label)}"'
+                for name, label in zip(names, labels)
+            )
+            series = f'{metric.name}{suffix}'
+            if pairs:
+                series += f'{{{pairs}}}'
+            lines.append(f'{series} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Время ответа и число запросов к базе по имени маршрута."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count))
+            response = self.get_response(request)
+        view = getattr(request.resolver_match, 'view_name', None)
+        view = view or 'unresolved'
+        REQUEST_LATENCY.observe(time.perf_counter() - started, view)
+        DB_QUERIES.inc(view, amount=queries)
+        return response
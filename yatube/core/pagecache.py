@@ -0,0 +1,110 @@
+"""Кэш целых страниц с дырками под личные части.
+
+Страница собирается один раз как для анонима. Всё, что зависит от
+пользователя, в шаблоне вынесено в ``{% punch 'шаблон' имя=значение %}``:
+при сборке вместо него в страницу попадает метка, а сам шаблон и его
+параметры сохраняются рядом. Аноним получает копию, в которой метки
+заполнены ещё при сборке, — без отрисовки и контекст-процессоров.
+Вошедшему метки заполняются его шапкой, переключателем лент и кнопками
+при каждом ответе, как edge-side includes.
+
+Шаблон дырки видит только свои параметры и контекст-процессоры
+(``user``, ``request``, ``csrf_token``). Параметры хранятся в кэше,
+поэтому это простые значения: числа, строки, готовый HTML. Вне сборки
+страницы ``{% punch %}`` просто включает шаблон, как ``{% include %}``.
+"""
+import functools
+import re
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+from .stampede import fragment_key, get_or_build
+
+MARKER = re.compile(r'<!--punch:(\d+)-->')
+
+_holes = ContextVar('punch_holes', default=None)
+
+
+def hole(template_name, params):
+    """Метка дырки, если сейчас собирается страница, иначе None."""
+    holes = _holes.get()
+    if holes is None:
+        return None
+    holes.append((template_name, params))
+    return f'<!--punch:{len(holes) - 1}-->'
+
+
+def fill(content, holes, request):
+    """Заполняет метки в ``content`` шаблонами дырок для ``request``."""
+    return MARKER.sub(
+        lambda match: render_to_string(
+            *holes[int(match.group(1))], request=request
+        ),
+        content,
+    )
+
+
+def _build(view, request, args, kwargs):
+    """Страница для кэша: (метки, дырки, копия анонима, тип) или None."""
+    user = request.user
+    request.user = AnonymousUser()
+    token = _holes.set([])
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        holes = _holes.get()
+    finally:
+        _holes.reset(token)
+    try:
+        if response.status_code != 200:
+            return None
+        content = response.content.decode(response.charset)
+        return (
+            content, holes, fill(content, holes, request),
+            response['Content-Type'],
+        )
+    finally:
+        request.user = user
+
+
+def page_cache(version):
+    """Кэширует страницу для всех пользователей сразу.
+
+    ``version(request, *args, **kwargs)`` — поколение страницы; None
+    значит, что страницу не кэшируем. Ключ — полный путь запроса, срок —
+    ``PAGE_CACHE_TIMEOUT`` секунд, 0 выключает кэш.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            timeout = settings.PAGE_CACHE_TIMEOUT
+            if not timeout or request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            page_version = version(request, *args, **kwargs)
+            if page_version is None:
+                return view(request, *args, **kwargs)
+            name = f'page:{view.__qualname__}'
+            page = get_or_build(
+                fragment_key(name, (request.get_full_path(),)),
+                lambda: _build(view, request, args, kwargs),
+                timeout,
+                page_version,
+                name=name,
+            )
+            if page is None:
+                # Ответ не 200: отдаём его как есть, отрисовав заново
+                # для настоящего пользователя.
+                return view(request, *args, **kwargs)
+            content, holes, anonymous, content_type = page
+            if request.user.is_authenticated:
+                content = fill(content, holes, request)
+            else:
+                content = anonymous
+            return HttpResponse(content, content_type=content_type)
+        return wrapper
+    return decorator
@@ -0,0 +1,109 @@
+"""Настройка SQLite для боевой нагрузки.
+
+Каждое новое соединение получает прагмы ``SQLITE_PRAGMAS``: журнал WAL
+(читатели не ждут писателя), ``synchronous=NORMAL`` (fsync только на
+контрольных точках WAL), отображение файла в память, кэш страниц и
+``busy_timeout``.
+
+Писатель у SQLite один на всю базу, поэтому записи из многих потоков
+лучше выстроить в очередь самим, чем отдавать потоки на ожидание
+блокировки в SQLite с её нарастающими паузами. ``WriteQueue`` пускает
+писать один поток за раз и складывает всё, что накопилось, в одну
+транзакцию — одна фиксация и один fsync на пачку. Вызывающий поток
+получает результат своей записи, так что для него ничего не меняется.
+"""
+import contextvars
+import logging
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+class WriteQueue:
+    """Групповая фиксация записей: один писатель, одна транзакция на пачку.
+
+    Поток, захвативший блокировку писателя, забирает все ждущие записи,
+    в том числе чужие, и выполняет их на своём соединении в одной
+    транзакции. Остальные потоки к этому моменту уже ждут блокировку и,
+    получив её, находят свою запись выполненной.
+    """
+
+    def __init__(self, using='default', batch_size=None):
+        self.using = using
+        self.batch_size = batch_size
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._writer = threading.Lock()
+
+    def run(self, function):
+        """Выполняет ``function`` в пачке и возвращает её результат.
+
+        Внутри открытой транзакции и при выключенной очереди
+        ``function`` выполняется сразу: иначе она не увидела бы
+        незафиксированные данные вызывающего.
+        """
+        if (
+            not settings.WRITE_QUEUE
+            or connections[self.using].in_atomic_block
+        ):
+            return function()
+        future = Future()
+        with self._pending_lock:
+            self._pending.append(
+                (future, contextvars.copy_context(), function)
+            )
+        while not future.done():
+            with self._writer:
+                if not future.done():
+                    self._commit(self._take())
+        return future.result()
+
+    def _take(self):
+        limit = self.batch_size or settings.WRITE_QUEUE_BATCH_SIZE
+        with self._pending_lock:
+            batch = self._pending[:limit]
+            del self._pending[:limit]
+        return batch
+
+    def _commit(self, batch):
+        results = []
+        try:
+            with transaction.atomic(using=self.using):
+                for future, context, function in batch:
+                    try:
+                        # Точка сохранения: ошибка одной записи не
+                        # откатывает остальные в пачке.
+                        with transaction.atomic(using=self.using):
+                            results.append(
+                                (future, context.run(function), None)
+                            )
+                    except Exception as error:
+                        results.append((future, None, error))
+        except Exception as error:
+            logger.exception('Пачка записей не зафиксирована')
+            for future, _, _ in batch:
+                future.set_exception(error)
+            return
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+writes = WriteQueue()
@@ -0,0 +1,138 @@
+"""Кэш, который не устраивает давку при истечении ключа.
+
+Значение хранится вместе со сроком свежести и временем сборки. Пока
+срок не вышел, оно отдаётся как есть, но чем ближе конец срока и чем
+дольше значение собиралось, тем вероятнее, что очередной запрос
+пересоберёт его заранее. Протухшее значение пересобирает ровно один
+запрос — тот, кто взял блокировку ключа, — остальные получают старое.
+Если старого нет совсем, остальные недолго ждут результата сборщика.
+"""
+import functools
+import math
+import random
+import time
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from . import metrics, timing
+
+LOCK_TIMEOUT = 30
+WAIT = 5
+POLL = 0.05
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _is_fresh(envelope, version, beta):
+    _, expires, delta, stored_version = envelope
+    if stored_version != version:
+        return False
+    # 1 - random() лежит в (0, 1]: логарифм нуля не случится.
+    early = delta * beta * math.log(1.0 - random.random())
+    return time.time() - early < expires
+
+
+def _build(key, build, timeout, version, stale):
+    started = time.time()
+    value = build()
+    delta = time.time() - started
+    envelope = (value, time.time() + timeout, delta, version)
+    cache.set(key, envelope, timeout + stale)
+    return value
+
+
+def _wait_for(key, version):
+    deadline = time.time() + WAIT
+    while time.time() < deadline:
+        time.sleep(POLL)
+        envelope = cache.get(key)
+        if envelope is not None and envelope[3] == version:
+            return envelope
+        if not cache.has_key(_lock_key(key)):
+            return cache.get(key)
+    return None
+
+
+def _record(result, name):
+    timing.count(f'cache.{result}')
+    metrics.FRAGMENT_CACHE.inc(name or 'unnamed', result)
+
+
+def get_or_build(key, build, timeout, version=None, stale=None, beta=1.0,
+                 name=None):
+    """Значение из кэша или ``build()`` под блокировкой ключа.
+
+    ``version`` — номер поколения: значение другого поколения считается
+    протухшим, но отдаётся, пока его пересобирает другой запрос.
+    ``stale`` — сколько секунд после срока хранить протухшее значение,
+    по умолчанию столько же, сколько ``timeout``. ``name`` — метка
+    фрагмента в метриках.
+    """
+    stale = timeout if stale is None else stale
+    with timing.timer('cache'):
+        envelope = cache.get(key)
+    if envelope is not None and _is_fresh(envelope, version, beta):
+        _record('hit', name)
+        return envelope[0]
+    lock = _lock_key(key)
+    if not cache.add(lock, True, LOCK_TIMEOUT):
+        if envelope is None:
+            envelope = _wait_for(key, version)
+        if envelope is not None:
+            _record('stale', name)
+            return envelope[0]
+        _record('miss', name)
+        return build()
+    _record('miss', name)
+    try:
+        return _build(key, build, timeout, version, stale)
+    finally:
+        cache.delete(lock)
+
+
+def fragment_key(fragment_name, vary_on=()):
+    return make_template_fragment_key(f'fresh:{fragment_name}', vary_on)
+
+
+def cache_view(timeout, key=None, version=None, stale=None):
+    """Декоратор view поверх ``get_or_build``.
+
+    ``key(request)`` и ``version(request)`` — части ключа и поколение;
+    по умолчанию ключ — полный путь запроса. Кэшируются только ответы
+    200 на GET и HEAD.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            parts = (
+                key(request, *args, **kwargs) if key
+                else (request.get_full_path(),)
+            )
+            name = f'view:{view.__qualname__}'
+            built = []
+
+            def build():
+                response = view(request, *args, **kwargs)
+                if hasattr(response, 'render'):
+                    response.render()
+                built.append(response)
+                return response if response.status_code == 200 else None
+
+            response = get_or_build(
+                fragment_key(name, parts),
+                build,
+                timeout,
+                version(request, *args, **kwargs) if version else None,
+                stale,
+                name=name,
+            )
+            if response is None:
+                return built[0] if built else view(request, *args, **kwargs)
+            return response
+        return wrapper
+    return decorator
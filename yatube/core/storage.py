@@ -0,0 +1,99 @@
+import hashlib
+import os
+import time
+import uuid
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы называются по SHA-256 содержимого.
+
+    Одинаковые загрузки ложатся в один файл: второй раз байты не
+    пишутся, а ``save`` возвращает имя уже лежащего файла и обновляет
+    его время изменения. Две одновременные загрузки пишут каждая во
+    временный файл и переносят его на место: победит любая, имя у обеих
+    одно. Удалять такой файл можно, только когда на него никто не
+    ссылается, — для этого есть ``delete_unused``.
+    """
+    RELEASING = '.releasing'
+    UPLOADING = '.uploading'
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        hexdigest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            os.path.dirname(name), hexdigest[:2], hexdigest + extension
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        return super().save(
+            self.content_name(name, content), content, max_length
+        )
+
+    def get_available_name(self, name, max_length=None):
+        # Файл с таким именем хранит те же байты: суффикс не нужен.
+        if max_length is not None and len(name) > max_length:
+            raise SuspiciousFileOperation(
+                f'Имя файла "{name}" длиннее {max_length} символов.'
+            )
+        return name
+
+    def _save(self, name, content):
+        try:
+            # Свежее время изменения не даёт delete_unused убрать файл,
+            # пока пост с ним ещё не сохранён.
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            pass
+        temporary = super()._save(
+            f'{name}.{uuid.uuid4().hex}{self.UPLOADING}', content
+        )
+        os.replace(self.path(temporary), self.path(name))
+        return name
+
+    def delete_unused(self, name, in_use, grace):
+        """Удаляет файл, если ``in_use()`` ложно; True, если удалён.
+
+        Файл на время проверки убирается под другое имя: параллельная
+        загрузка тех же байтов запишет его заново, а не получит имя
+        удаляемого. Загрузка, которая успела раньше, обновила время
+        изменения — файл моложе ``grace`` секунд возвращается на место.
+        """
+        path = self.path(name)
+        releasing = path + self.RELEASING
+        try:
+            os.replace(path, releasing)
+        except FileNotFoundError:
+            return False
+        try:
+            recent = time.time() - os.stat(releasing).st_mtime < grace
+            if recent or in_use():
+                # Если файл уже записали заново, замена ничего не
+                # меняет: байты те же.
+                os.replace(releasing, path)
+                return False
+            os.remove(releasing)
+        except FileNotFoundError:
+            # restore_releasing уже вернул файл на место.
+            return False
+        return True
+
+    def restore_releasing(self, directory=''):
+        """Возвращает файлы, застрявшие в ``delete_unused`` при сбое."""
+        root = self.path(directory)
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(self.RELEASING):
+                    path = os.path.join(dirpath, filename)
+                    os.replace(path, path[:-len(self.RELEASING)])
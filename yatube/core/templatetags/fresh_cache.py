@@ -0,0 +1,59 @@
+from django import template
+
+from core.stampede import fragment_key, get_or_build
+
+register = template.Library()
+
+
+class FreshCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, fragment_name, vary_on, version):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.version = version
+
+    def render(self, context):
+        try:
+            timeout = int(self.timeout.resolve(context))
+        except (ValueError, TypeError):
+            raise template.TemplateSyntaxError(
+                f'fresh_cache: время жизни должно быть числом, '
+                f'а не {self.timeout.var!r}'
+            )
+        key = fragment_key(
+            self.fragment_name,
+            [var.resolve(context) for var in self.vary_on],
+        )
+        version = self.version and self.version.resolve(context)
+        return get_or_build(
+            key, lambda: self.nodelist.render(context), timeout, version,
+            name=self.fragment_name,
+        )
+
+
+@register.tag
+def fresh_cache(parser, token):
+    """{% fresh_cache 600 имя [переменная ...] [version=поколение] %}
+
+    Как встроенный ``{% cache %}``, но фрагмент пересобирает один запрос,
+    а остальные на это время получают старую копию. Поколение не входит
+    в ключ: фрагмент прошлого поколения служит такой старой копией.
+    """
+    nodelist = parser.parse(('endfresh_cache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]}: нужны как минимум время жизни и имя фрагмента'
+        )
+    version = None
+    if bits[-1].startswith('version='):
+        version = parser.compile_filter(bits.pop()[len('version='):])
+    return FreshCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        bits[2],
+        [parser.compile_filter(bit) for bit in bits[3:]],
+        version,
+    )
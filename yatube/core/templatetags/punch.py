@@ -0,0 +1,44 @@
+from django import template
+
+from core.pagecache import hole
+
+register = template.Library()
+
+
+class PunchNode(template.Node):
+    def __init__(self, template_name, params):
+        self.template_name = template_name
+        self.params = params
+
+    def render(self, context):
+        name = self.template_name.resolve(context)
+        params = {
+            key: value.resolve(context) for key, value in self.params.items()
+        }
+        marker = hole(name, params)
+        if marker is not None:
+            return marker
+        with context.push(**params):
+            return context.template.engine.get_template(name).render(context)
+
+
+@register.tag
+def punch(parser, token):
+    """{% punch 'шаблон' [имя=значение ...] %}
+
+    Личная часть страницы из ``core.pagecache``: в кэш страницы не
+    попадает и рисуется для каждого пользователя. Внутри
+    ``{% fresh_cache %}`` не ставится — фрагмент сохранил бы метку.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f'{bits[0]}: нужно имя шаблона')
+    params = {}
+    for bit in bits[2:]:
+        key, sep, value = bit.partition('=')
+        if not sep:
+            raise template.TemplateSyntaxError(
+                f'{bits[0]}: параметры передаются как имя=значение'
+            )
+        params[key] = parser.compile_filter(value)
+    return PunchNode(parser.compile_filter(bits[1]), params)
@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from core.budget import (
+    QueryBudgetExceeded, budgets, query_budget, within_budget,
+)
+
+User = get_user_model()
+
+
+class QueryBudgetTests(TestCase):
+    def test_every_posts_view_has_budget(self):
+        """У каждого маршрута posts.urls объявлен бюджет"""
+        missing = [
+            budget.name for budget in budgets('posts.urls')
+            if budget.limit is None
+        ]
+        self.assertEqual(missing, [])
+
+    def test_every_api_method_has_budget(self):
+        """У API-представления бюджет объявлен для каждого метода"""
+        for budget in budgets('posts.urls'):
+            methods = getattr(budget.view, 'api_methods', None)
+            if methods is not None:
+                self.assertEqual(
+                    set(budget.view.query_budget), set(methods), budget.name
+                )
+
+    def test_budget_per_method(self):
+        """Потолок GET передаётся первым, остальные — по имени метода"""
+        self.assertEqual(
+            query_budget(3, POST=5)(lambda request: None).query_budget,
+            {'GET': 3, 'POST': 5},
+        )
+        self.assertEqual(
+            query_budget(DELETE=2)(lambda request: None).query_budget,
+            {'DELETE': 2},
+        )
+
+    def test_over_budget_fails_with_queries(self):
+        """Превышение бюджета падает и перечисляет запросы"""
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'auth_user'):
+            with within_budget(1, 'проверка'):
+                User.objects.count()
+                User.objects.exists()
+        with within_budget(1, 'проверка'):
+            User.objects.count()
@@ -0,0 +1,239 @@
+import fnmatch
+import socket
+import socketserver
+import threading
+import time
+
+from django.core.cache import caches
+from django.core.signals import request_finished
+from django.test import TestCase, override_settings
+
+from core.cache import RedisCache
+from posts import generations
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """Понимает ровно те команды, которые шлёт core.cache.RedisCache."""
+
+    def read_command(self):
+        header = self.rfile.readline()
+        if not header:
+            return None
+        args = []
+        for _ in range(int(header[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def alive(self, key):
+        value = self.server.data.get(key)
+        if value is None:
+            return None
+        data, expires = value
+        if expires is not None and expires <= time.monotonic():
+            del self.server.data[key]
+            return None
+        return data
+
+    def bulk(self, data):
+        if data is None:
+            return b'$-1\r\n'
+        return b'$%d\r\n%s\r\n' % (len(data), data)
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            command = args[0].decode().lower()
+            handler = getattr(self, f'do_{command}', None)
+            with self.server.lock:
+                if handler is None:
+                    reply = b'-ERR unknown command\r\n'
+                else:
+                    reply = handler(*args[1:])
+                if self.server.drop_replies:
+                    # Команда выполнена, но ответ теряется вместе с
+                    # соединением.
+                    self.server.drop_replies -= 1
+                    return
+            self.wfile.write(reply)
+
+    def do_select(self, db):
+        return b'+OK\r\n'
+
+    def do_get(self, key):
+        return self.bulk(self.alive(key))
+
+    def do_mget(self, *keys):
+        return b'*%d\r\n' % len(keys) + b''.join(
+            self.bulk(self.alive(key)) for key in keys
+        )
+
+    def do_set(self, key, value, *options):
+        if b'NX' in options and self.alive(key) is not None:
+            return b'$-1\r\n'
+        expires = None
+        if b'PX' in options:
+            ttl = int(options[options.index(b'PX') + 1])
+            expires = time.monotonic() + ttl / 1000
+        self.server.data[key] = (value, expires)
+        return b'+OK\r\n'
+
+    def do_exists(self, *keys):
+        found = [key for key in keys if self.alive(key) is not None]
+        return b':%d\r\n' % len(found)
+
+    def do_del(self, *keys):
+        found = [key for key in keys if self.alive(key) is not None]
+        for key in found:
+            del self.server.data[key]
+        return b':%d\r\n' % len(found)
+
+    def do_incrby(self, key, delta):
+        value = int(self.alive(key) or 0) + int(delta)
+        expires = self.server.data.get(key, (None, None))[1]
+        self.server.data[key] = (str(value).encode(), expires)
+        return b':%d\r\n' % value
+
+    def do_eval(self, script, numkeys, key, delta):
+        if script.decode() != RedisCache.INCR_SCRIPT:
+            return b'-ERR unknown script\r\n'
+        if self.alive(key) is None:
+            return b'$-1\r\n'
+        return self.do_incrby(key, delta)
+
+    def do_scan(self, cursor, match, pattern, count, limit):
+        keys = [
+            key for key in list(self.server.data)
+            if self.alive(key) is not None
+            and fnmatch.fnmatchcase(key.decode(), pattern.decode())
+        ]
+        return b'*2\r\n' + self.bulk(b'0') + b'*%d\r\n' % len(keys) + (
+            b''.join(self.bulk(key) for key in keys)
+        )
+
+    def expire(self, key, expires):
+        value = self.alive(key)
+        if value is None:
+            return b':0\r\n'
+        self.server.data[key] = (value, expires)
+        return b':1\r\n'
+
+    def do_pexpire(self, key, ttl):
+        return self.expire(key, time.monotonic() + int(ttl) / 1000)
+
+    def do_persist(self, key):
+        return self.expire(key, None)
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeRedisHandler)
+        self.data = {}
+        self.lock = threading.Lock()
+        self.drop_replies = 0
+
+
+class RedisCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeRedisServer()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        host, port = cls.server.server_address
+        cls.settings = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'core.cache.RedisCache',
+                'LOCATION': f'redis://{host}:{port}/1',
+            },
+        })
+        cls.settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+        self.server.drop_replies = 0
+
+    def test_basic_operations(self):
+        """get/set/add/delete и пакетные операции ходят на сервер"""
+        self.cache.set('post', {'text': 'Пост'})
+        self.assertEqual(self.cache.get('post'), {'text': 'Пост'})
+        self.assertFalse(self.cache.add('post', 'другое'))
+        self.assertTrue(self.cache.add('new', 1))
+        self.cache.set_many({'a': 1, 'b': [2]})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'missing']), {'a': 1, 'b': [2]}
+        )
+        self.cache.delete('post')
+        self.assertIsNone(self.cache.get('post'))
+        self.assertEqual(self.cache.get('post', 'нет'), 'нет')
+        self.assertIn('a', self.cache)
+
+    def test_incr_and_expiry(self):
+        """incr атомарен на сервере, ключи с timeout истекают"""
+        self.cache.set('counter', 5, timeout=None)
+        self.assertEqual(self.cache.incr('counter', 2), 7)
+        self.assertEqual(self.cache.get('counter'), 7)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('short', 'x', timeout=0.05)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.cache.set('gone', 'x', timeout=0)
+        self.assertIsNone(self.cache.get('gone'))
+
+    def test_generations_shared_between_connections(self):
+        """Поколение, сдвинутое одним процессом, видно другому"""
+        before = generations.current(generations.SITE)
+        host, port = self.server.server_address
+        other = RedisCache(f'redis://{host}:{port}/1', {})
+        other.incr(generations._key(generations.SITE))
+        self.assertNotEqual(generations.current(generations.SITE), before)
+        other.disconnect()
+
+    def test_connection_outlives_request(self):
+        """Конец запроса не закрывает соединение, disconnect закрывает"""
+        self.cache.set('key', 'value')
+        sock = self.cache._connection._sock
+        request_finished.send(sender=self.__class__)
+        self.assertIs(self.cache._connection._sock, sock)
+        self.cache.disconnect()
+        self.assertIsNone(self.cache._connection._sock)
+        self.assertEqual(self.cache.get('key'), 'value')
+
+    def test_reconnects_after_server_drop(self):
+        """Оборванное соединение переоткрывается при следующей команде"""
+        self.cache.set('key', 'value')
+        self.cache._connection._sock.shutdown(socket.SHUT_RDWR)
+        self.assertEqual(self.cache.get('key'), 'value')
+
+    def test_lost_reply_retried_only_for_idempotent(self):
+        """Потерянный ответ на GET повторяется, на incr — нет"""
+        self.cache.set('counter', 1, timeout=None)
+        self.server.drop_replies = 1
+        self.assertEqual(self.cache.get('counter'), 1)
+        self.server.drop_replies = 1
+        with self.assertRaises(ConnectionError):
+            self.cache.incr('counter')
+        self.assertEqual(self.cache.get('counter'), 2)
+
+    def test_clear_keeps_foreign_keys(self):
+        """clear() удаляет только ключи кэша, а не всю базу"""
+        self.cache.set('own', 1)
+        self.cache._connection.execute('SET', 'foreign', 'x')
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('own'))
+        self.assertEqual(
+            self.cache._connection.execute('GET', 'foreign'), b'x'
+        )
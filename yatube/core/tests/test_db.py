@@ -0,0 +1,128 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import OperationalError, connections
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import db
+from posts.models import Post, UserStats
+
+User = get_user_model()
+
+LOCMEM = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+
+@override_settings(CACHES=LOCMEM, REPLICA_DATABASES=['replica0'])
+class ReplicaRoutingTests(TestCase):
+    """Реплика — отдельная база SQLite: что читается с неё, видно по данным"""
+
+    databases = {'default', 'replica0'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='replicated')
+        Post.objects.create(author=cls.author, text='С основной базы')
+        replica_author = User.objects.using('replica0').create(
+            pk=cls.author.pk, username='replicated'
+        )
+        Post.objects.using('replica0').create(
+            author=replica_author, text='С реплики'
+        )
+
+    def setUp(self):
+        cache.clear()
+        db._down_until.clear()
+
+    def test_read_only_view_reads_replica(self):
+        """Лента читается с реплики"""
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'С реплики')
+        self.assertNotContains(response, 'С основной базы')
+
+    def test_write_makes_reads_sticky(self):
+        """После записи автор читает с основной базы"""
+        self.client.force_login(self.author)
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Только что'}
+        )
+        self.assertIn(db.STICKY_COOKIE, response.cookies)
+        self.assertTrue(
+            Post.objects.using('default').filter(text='Только что').exists()
+        )
+        self.assertFalse(
+            Post.objects.using('replica0').filter(text='Только что').exists()
+        )
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Только что')
+        self.assertNotContains(response, 'С реплики')
+
+    def test_counter_repair_is_not_sticky(self):
+        """Пересчёт счётчиков при чтении идёт по основной базе без cookie"""
+        Post.objects.using('replica0').create(
+            author_id=self.author.pk, text='Ещё с реплики'
+        )
+        response = self.client.get(
+            reverse('posts:profile', args=(self.author.username,))
+        )
+        self.assertNotIn(db.STICKY_COOKIE, response.cookies)
+        self.assertEqual(
+            UserStats.objects.using('default').get(
+                pk=self.author.pk
+            ).posts_count,
+            1,
+        )
+
+    def test_unmarked_view_reads_primary(self):
+        """Представление без пометки читает с основной базы"""
+        self.client.force_login(self.author)
+        response = self.client.get(
+            reverse('posts:post_edit', args=(
+                Post.objects.get(text='С основной базы').pk,
+            ))
+        )
+        self.assertContains(response, 'С основной базы')
+
+    def test_broken_replica_leaves_rotation(self):
+        """Недоступная реплика выпадает, чтение идёт с основной базы"""
+        with mock.patch.object(
+            connections['replica0'], 'ensure_connection',
+            side_effect=OperationalError,
+        ) as connect:
+            response = self.client.get(reverse('posts:index'))
+            self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'С основной базы')
+        connect.assert_called_once()
+
+
+class ConnectionHealthTests(TestCase):
+    def connection(self, usable):
+        connection = mock.Mock(spec=('connection', 'is_usable', 'close'))
+        connection.connection = object()
+        connection.is_usable.return_value = usable
+        return connection
+
+    @override_settings(CONN_HEALTH_CHECK_INTERVAL=30)
+    def test_idle_broken_connection_closed(self):
+        """Долго простоявшее и оборванное соединение закрывается"""
+        connection = self.connection(usable=False)
+        db.check_connection(connection, now=100)
+        db.check_connection(connection, now=110)
+        connection.close.assert_not_called()
+        db.check_connection(connection, now=140)
+        connection.close.assert_called_once()
+
+    @override_settings(CONN_HEALTH_CHECK_INTERVAL=30)
+    def test_live_connection_kept(self):
+        """Живое соединение остаётся открытым"""
+        connection = self.connection(usable=True)
+        db.check_connection(connection, now=100)
+        db.check_connection(connection, now=200)
+        connection.is_usable.assert_called_once()
+        connection.close.assert_not_called()
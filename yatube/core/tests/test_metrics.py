@@ -0,0 +1,141 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_METRICS_DIR = tempfile.mkdtemp()
+
+LOCMEM = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+
+@override_settings(CACHES=LOCMEM, METRICS_DIR=TEMP_METRICS_DIR)
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='measured')
+        Post.objects.create(author=author, text='Пост для метрик')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_METRICS_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(TEMP_METRICS_DIR, ignore_errors=True)
+        os.makedirs(TEMP_METRICS_DIR)
+        metrics._values.clear()
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return response.content.decode()
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_latency_queries_and_fragment_cache(self):
+        """Страница метрик показывает время, запросы и кэш фрагментов"""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        text = self.scrape()
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram', text)
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 2',
+            text,
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            text,
+        )
+        self.assertRegex(
+            text, r'yatube_db_queries_total\{view="posts:index"\} [1-9]'
+        )
+        self.assertIn(
+            'yatube_fragment_cache_requests_total'
+            '{fragment="index_page",result="miss"} 1',
+            text,
+        )
+        self.assertIn(
+            'yatube_fragment_cache_requests_total'
+            '{fragment="index_page",result="hit"} 1',
+            text,
+        )
+
+    def test_processes_are_summed(self):
+        """Значения других процессов складываются со своими"""
+        self.client.get(reverse('posts:index'))
+        self.write_process('1-other', 5)
+        text = self.scrape()
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 6',
+            text,
+        )
+        self.assertIn('# TYPE yatube_db_queries_total counter', text)
+
+    def write_process(self, name, requests):
+        path = os.path.join(TEMP_METRICS_DIR, f'{name}.json')
+        with open(path, 'w') as stream:
+            json.dump([
+                ['yatube_request_duration_seconds', '_count',
+                 ['posts:index'], requests],
+                ['yatube_db_queries_total', '', ['posts:index'], 10],
+            ], stream)
+
+    def test_dead_processes_retired(self):
+        """Файлы завершившихся процессов вливаются в общий итог"""
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        self.write_process(f'{process.pid}-dead', 3)
+        self.write_process(f'{process.pid}-older', 4)
+        self.assertEqual(
+            metrics.collect()[
+                'yatube_request_duration_seconds', '_count', ('posts:index',)
+            ],
+            7,
+        )
+        self.assertEqual(
+            sorted(os.listdir(TEMP_METRICS_DIR)),
+            ['.lock', f'{metrics._process}.json', metrics.RETIRED],
+        )
+        self.write_process(f'{process.pid}-newest', 1)
+        self.assertEqual(
+            metrics.collect()['yatube_db_queries_total', '', ('posts:index',)],
+            30,
+        )
+
+    def test_scrape_restricted(self):
+        """Метрики видны только внутренним адресам или по токену"""
+        url = reverse('metrics')
+        self.assertEqual(
+            self.client.get(url, REMOTE_ADDR='203.0.113.7').status_code, 404
+        )
+        self.assertEqual(
+            self.client.get(
+                url, HTTP_X_FORWARDED_FOR='203.0.113.7'
+            ).status_code,
+            404,
+        )
+        with self.settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get(url).status_code, 404)
+            response = self.client.get(
+                url,
+                REMOTE_ADDR='203.0.113.7',
+                HTTP_AUTHORIZATION='Bearer s3cret',
+            )
+            self.assertEqual(response.status_code, 200)
@@ -0,0 +1,73 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import pagecache
+from posts.models import Post
+
+User = get_user_model()
+
+LOCMEM = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+
+@override_settings(CACHES=LOCMEM, PAGE_CACHE_TIMEOUT=60)
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='cached_author')
+        cls.reader = User.objects.create_user(username='cached_reader')
+        cls.post = Post.objects.create(author=cls.author, text='Целиком')
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_anonymous_page_served_without_queries(self):
+        """Повторный анонимный запрос отдаётся из кэша без запросов"""
+        url = reverse('posts:index')
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first.content, second.content)
+        self.assertContains(second, 'Войти')
+        self.assertNotContains(second, '<!--punch:')
+
+    def test_user_parts_filled_per_request(self):
+        """Вошедший получает общую страницу со своей шапкой и кнопками"""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.client.get(url)
+        response = self.author_client.get(url)
+        self.assertContains(response, '- cached_author')
+        self.assertContains(response, 'Редактировать запись')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertNotContains(response, 'Войти')
+        response = self.reader_client.get(url)
+        self.assertContains(response, '- cached_reader')
+        self.assertNotContains(response, 'Редактировать запись')
+        self.assertContains(response, 'Добавить комментарий')
+        self.assertNotContains(self.client.get(url), 'Добавить комментарий')
+
+    def test_switcher_only_for_users(self):
+        """Переключатель лент на закэшированной главной — только вошедшим"""
+        url = reverse('posts:index')
+        self.assertNotContains(self.client.get(url), 'Избранные авторы')
+        self.assertContains(self.reader_client.get(url), 'Избранные авторы')
+
+    def test_new_generation_rebuilds_page(self):
+        """Новый пост меняет поколение, и страница собирается заново"""
+        url = reverse('posts:index')
+        self.client.get(url)
+        Post.objects.create(author=self.author, text='Только что')
+        self.assertContains(self.client.get(url), 'Только что')
+
+    def test_punch_renders_inline_outside_build(self):
+        """Вне сборки страницы дырка не ставится"""
+        self.assertIsNone(pagecache.hole('includes/header.html', {}))
@@ -0,0 +1,84 @@
+import json
+import threading
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core.sqlite import WriteQueue
+from posts.models import Follow
+
+User = get_user_model()
+
+
+class PragmaTests(TestCase):
+    def test_connection_is_tuned(self):
+        """Новое соединение получает прагмы из настроек"""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            busy_timeout, = cursor.fetchone()
+            cursor.execute('PRAGMA cache_size')
+            cache_size, = cursor.fetchone()
+        self.assertEqual(busy_timeout, 5000)
+        self.assertEqual(cache_size, -65536)
+
+
+@override_settings(WRITE_QUEUE=True)
+class WriteQueueTests(TransactionTestCase):
+    def setUp(self):
+        self.queue = WriteQueue()
+        self.author = User.objects.create_user(username='followed')
+
+    def test_inline_inside_transaction(self):
+        """Внутри транзакции запись выполняется сразу в ней же"""
+        with transaction.atomic():
+            Follow.objects.create(user=self.author, author=self.author)
+            self.assertTrue(self.queue.run(
+                lambda: Follow.objects.filter(user=self.author).exists()
+            ))
+
+    def test_writes_from_many_threads(self):
+        """Записи из многих потоков доходят до базы, ошибки — до вызывающего"""
+        readers = [
+            User.objects.create_user(username=f'reader{number}')
+            for number in range(8)
+        ]
+        errors = []
+
+        def follow(user):
+            self.queue.run(lambda: Follow.objects.create(
+                user=user, author=self.author
+            ))
+            try:
+                self.queue.run(lambda: Follow.objects.create(
+                    user=user, author=self.author
+                ))
+            except IntegrityError as error:
+                errors.append(error)
+
+        threads = [
+            threading.Thread(target=follow, args=(user,))
+            for user in readers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(Follow.objects.count(), len(readers))
+        self.assertEqual(len(errors), len(readers))
+
+
+class SqliteBenchmarkTests(TestCase):
+    def test_all_modes_write_everything(self):
+        """Бенчмарк меряет все режимы и ни одна запись не теряется"""
+        stdout = StringIO()
+        call_command('sqlite_benchmark', threads=3, writes=5, stdout=stdout)
+        result = json.loads(stdout.getvalue())
+        self.assertEqual(
+            set(result['modes']), {'baseline', 'pragmas', 'queue'}
+        )
+        for mode in result['modes'].values():
+            self.assertEqual(mode['written'], 15)
+            self.assertEqual(mode['errors'], 0)
@@ -0,0 +1,109 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+
+from core import stampede
+
+LOCMEM = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+
+@override_settings(CACHES=LOCMEM)
+class GetOrBuildTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def build(self, value='новое'):
+        self.calls += 1
+        return value
+
+    def test_single_flight(self):
+        """Пустой ключ собирает один поток, остальные ждут его результат"""
+        results = []
+
+        def slow_build():
+            time.sleep(0.2)
+            return self.build()
+
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                stampede.get_or_build('key', slow_build, 60)
+            ))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['новое'] * 5)
+
+    def test_stale_while_revalidate(self):
+        """Пока другой запрос пересобирает ключ, отдаётся старая копия"""
+        stampede.get_or_build('key', lambda: 'старое', 60, version=1)
+        cache.add(stampede._lock_key('key'), True)
+        self.assertEqual(
+            stampede.get_or_build('key', self.build, 60, version=2), 'старое'
+        )
+        self.assertEqual(self.calls, 0)
+        cache.delete(stampede._lock_key('key'))
+        self.assertEqual(
+            stampede.get_or_build('key', self.build, 60, version=2), 'новое'
+        )
+        self.assertEqual(self.calls, 1)
+
+    def test_probabilistic_early_expiry(self):
+        """Близкий к истечению ключ иногда пересобирается заранее"""
+        # До конца срока секунда, сборка занимала полсекунды.
+        cache.set('key', ('старое', time.time() + 1, 0.5, None), 60)
+        with mock.patch('random.random', return_value=0.5):
+            stampede.get_or_build('key', self.build, 60)
+        self.assertEqual(self.calls, 0)
+        # random() бывает ровно нулём: это самый поздний пересбор.
+        with mock.patch('random.random', return_value=0.0):
+            stampede.get_or_build('key', self.build, 60)
+        self.assertEqual(self.calls, 0)
+        with mock.patch('random.random', return_value=1 - 1e-16):
+            stampede.get_or_build('key', self.build, 60)
+        self.assertEqual(self.calls, 1)
+
+    def test_template_tag(self):
+        """{% fresh_cache %} кэширует фрагмент и сбрасывается поколением"""
+        template = Template(
+            '{% load fresh_cache %}'
+            '{% fresh_cache 60 block name version=version %}'
+            '{{ value }}{% endfresh_cache %}'
+        )
+
+        def render(**context):
+            return template.render(Context(
+                dict({'name': 'x', 'version': 1}, **context)
+            ))
+
+        self.assertEqual(render(value='первое'), 'первое')
+        self.assertEqual(render(value='второе'), 'первое')
+        self.assertEqual(render(value='второе', name='y'), 'второе')
+        self.assertEqual(render(value='третье', version=2), 'третье')
+
+    def test_view_decorator(self):
+        """cache_view отдаёт сохранённый ответ и не кэширует POST"""
+        @stampede.cache_view(60)
+        def view(request):
+            return HttpResponse(self.build(f'ответ {self.calls}'))
+
+        factory = RequestFactory()
+        self.assertEqual(view(factory.get('/')).content, 'ответ 0'.encode())
+        self.assertEqual(view(factory.get('/')).content, 'ответ 0'.encode())
+        self.assertEqual(view(factory.get('/?page=2')).content,
+                         'ответ 1'.encode())
+        view(factory.post('/'))
+        self.assertEqual(self.calls, 3)
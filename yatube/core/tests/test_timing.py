@@ -0,0 +1,55 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+LOCMEM = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+
+@override_settings(CACHES=LOCMEM, SERVER_TIMING_SAMPLE_RATE=1)
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='timer')
+        Post.objects.create(author=author, text='Замеряемый пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_header_lists_db_template_and_cache(self):
+        """Заголовок Server-Timing показывает базу, шаблон и кэш"""
+        with self.assertLogs('yatube.timing', 'INFO'):
+            first = self.client.get(reverse('posts:index'))
+            second = self.client.get(reverse('posts:index'))
+        header = first['Server-Timing']
+        self.assertRegex(header, r'db;dur=[\d.]+;desc="queries=\d+"')
+        self.assertRegex(header, r'template;dur=[\d.]+')
+        self.assertIn('miss=', header)
+        self.assertRegex(header, r'total;dur=[\d.]+$')
+        self.assertIn('hit=', second['Server-Timing'])
+
+    def test_log_line_is_json(self):
+        """В лог пишется строка JSON с замерами запроса"""
+        with self.assertLogs('yatube.timing', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['counts']['db.queries'], 0)
+        self.assertIn('template', record['ms'])
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_request_untouched(self):
+        """Запрос вне выборки проходит без замеров"""
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
@@ -0,0 +1,141 @@
+"""Замеры времени запроса для заголовка Server-Timing и логов.
+
+Замеры копятся в объекте Timings текущего запроса (contextvar), поэтому
+код вне запроса и фоновые потоки миниатюр ничего не пишут. Время в базе
+снимается обёрткой ``execute_wrapper`` соединений, время шаблонов —
+обёрткой ``render`` бэкенда шаблонов, кэш и миниатюры отмечают себя
+сами через ``timer`` и ``count``.
+
+Инструментируется только доля ``SERVER_TIMING_SAMPLE_RATE`` запросов;
+остальные проходят без обёрток.
+"""
+import json
+import logging
+import random
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template
+
+logger = logging.getLogger('yatube.timing')
+
+# Метрики Server-Timing и счётчики, которые идут в их описание.
+METRICS = {
+    'db': ('db.queries',),
+    'template': (),
+    'cache': ('cache.hit', 'cache.stale', 'cache.miss'),
+    'thumbnail': ('thumbnail.drawn',),
+}
+
+_current = ContextVar('timings', default=None)
+
+
+class Timings:
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.counts = Counter()
+
+    def add(self, name, seconds):
+        self.durations[name] += seconds
+
+    def header(self, total):
+        parts = []
+        for name, counters in METRICS.items():
+            described = [
+                f'{counter.split(".")[1]}={self.counts[counter]}'
+                for counter in counters if self.counts[counter]
+            ]
+            if name not in self.durations and not described:
+                continue
+            part = f'{name};dur={self.durations[name] * 1000:.1f}'
+            if described:
+                part += f';desc="{" ".join(described)}"'
+            parts.append(part)
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+    def as_dict(self):
+        return {
+            'ms': {
+                name: round(seconds * 1000, 1)
+                for name, seconds in self.durations.items()
+            },
+            'counts': dict(self.counts),
+        }
+
+
+@contextmanager
+def timer(name):
+    """Прибавляет время блока к метрике замеряемого запроса."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def count(name, value=1):
+    timings = _current.get()
+    if timings is not None and value:
+        timings.counts[name] += value
+
+
+def _execute(execute, sql, params, many, context):
+    count('db.queries')
+    with timer('db'):
+        return execute(sql, params, many, context)
+
+
+_template_render = Template.render
+
+
+def _render(self, context=None, request=None):
+    with timer('template'):
+        return _template_render(self, context, request)
+
+
+def install():
+    """Оборачивает рендер шаблонов; повторный вызов ничего не делает."""
+    Template.render = _render
+
+
+class ServerTimingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install()
+
+    def __call__(self, request):
+        if random.random() >= settings.SERVER_TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+        timings = Timings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_execute))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+        response['Server-Timing'] = timings.header(total)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            **timings.as_dict(),
+        }
+        logger.info(
+            json.dumps(record, ensure_ascii=False), extra={'timing': record}
+        )
+        return response
@@ -1,4 +1,9 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from . import metrics
 
 
 def page_not_found(request, exception):
@@ -12,3 +17,29 @@ def csrf_failure(request, reason=''):
 
 def server_error(request):
     return render(request, "core/500.html", status=500)
+
+
+def _may_scrape(request):
+    """Токен из METRICS_TOKEN или прямой запрос с адреса INTERNAL_IPS.
+
+    Через обратный прокси на той же машине все запросы приходят с
+    127.0.0.1, поэтому запрос с X-Forwarded-For адресом не пускается.
+    """
+    if settings.METRICS_TOKEN:
+        return constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''),
+            f'Bearer {settings.METRICS_TOKEN}',
+        )
+    return (
+        request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS
+        and 'HTTP_X_FORWARDED_FOR' not in request.META
+    )
+
+
+def metrics_view(request):
+    if not _may_scrape(request):
+        raise Http404
+    return HttpResponse(
+        metrics.exposition(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,430 @@
+"""JSON API постов, групп, комментариев и подписок.
+
+Списки листаются курсором ``?cursor=`` и отдают
+``{"results": [...], "next_cursor": ...}``; ``?limit=`` — размер
+страницы. ``?fields=id,text`` оставляет в ответе только перечисленные
+поля, и в ``only()`` попадают ровно их колонки и ключ курсора. На GET
+приходит 304, если поколение кэша не менялось с прошлого ответа.
+
+Запись — от пользователя сессии, тело — JSON или форма. Как и формы
+сайта, запись защищена от CSRF: значение cookie ``csrftoken`` нужно
+прислать в заголовке ``X-CSRFToken``. Без входа запись получает 401,
+с входом, но без токена — 403. Ошибки приходят как ``{"detail": ...}``
+или ``{"errors": {поле: [...]}}``.
+"""
+import functools
+import json
+from collections import namedtuple
+from operator import attrgetter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import Http404, HttpResponse, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.shortcuts import get_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+
+from core.budget import query_budget
+from core.db import use_replica
+from core.sqlite import writes
+
+from . import generations, views
+from .conditional import conditional
+from .forms import CommentForm, PostForm
+from .models import Comment, Follow, Group, Post
+from .utils import NEXT, decode_cursor, encode_cursor, seek
+
+User = get_user_model()
+
+MAX_LIMIT = 100
+SAFE_METHODS = ('GET', 'HEAD')
+
+Field = namedtuple('Field', 'columns related value')
+
+
+def _image_url(post):
+    return post.image.url if post.image else None
+
+
+def _isoformat(name):
+    return lambda instance: getattr(instance, name).isoformat()
+
+
+POST_FIELDS = {
+    'id': Field(('id',), (), attrgetter('pk')),
+    'text': Field(('text',), (), attrgetter('text')),
+    'pub_date': Field(('pub_date',), (), _isoformat('pub_date')),
+    'author': Field(
+        ('author__username',), ('author',), attrgetter('author.username')
+    ),
+    'group': Field(
+        ('group__slug',), ('group',),
+        lambda post: post.group and post.group.slug,
+    ),
+    'image': Field(('image',), (), _image_url),
+    'comments_count': Field(
+        ('comments_count',), (), attrgetter('comments_count')
+    ),
+}
+GROUP_FIELDS = {
+    'id': Field(('id',), (), attrgetter('pk')),
+    'title': Field(('title',), (), attrgetter('title')),
+    'slug': Field(('slug',), (), attrgetter('slug')),
+    'description': Field(('description',), (), attrgetter('description')),
+}
+COMMENT_FIELDS = {
+    'id': Field(('id',), (), attrgetter('pk')),
+    'post': Field(('post',), (), attrgetter('post_id')),
+    'author': Field(
+        ('author__username',), ('author',), attrgetter('author.username')
+    ),
+    'text': Field(('text',), (), attrgetter('text')),
+    'created': Field(('created',), (), _isoformat('created')),
+}
+FOLLOW_FIELDS = {
+    'id': Field(('id',), (), attrgetter('pk')),
+    'author': Field(
+        ('author__username',), ('author',), attrgetter('author.username')
+    ),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, detail=None, errors=None):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.errors = errors
+
+
+class _CsrfCheck(CsrfViewMiddleware):
+    """Проверка CSRF, которая возвращает причину отказа, а не HTML 403."""
+
+    def _reject(self, request, reason):
+        return reason
+
+
+def _json(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def _refuse(request, allowed):
+    """Ответ 405, 401 или 403, если запрос не дойдёт до представления."""
+    if request.method not in allowed:
+        response = _json({'detail': 'Метод не поддерживается'}, status=405)
+        response['Allow'] = ', '.join(allowed)
+        return response
+    if request.method in SAFE_METHODS:
+        return None
+    if not request.user.is_authenticated:
+        return _json({'detail': 'Нужно войти'}, status=401)
+    reason = _CsrfCheck().process_view(request, None, (), {})
+    if reason:
+        return _json({'detail': f'CSRF: {reason}'}, status=403)
+    return None
+
+
+def api_view(*methods):
+    """Разрешённые методы, вход и CSRF для записи, ошибки в виде JSON.
+
+    Промежуточный слой CSRF представление пропускает: токен проверяется
+    здесь, после входа, чтобы аноним получил 401, а не HTML-страницу 403.
+    """
+    allowed = methods + ('HEAD',) if 'GET' in methods else methods
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            refused = _refuse(request, allowed)
+            if refused is not None:
+                return refused
+            try:
+                return view(request, *args, **kwargs)
+            except Http404:
+                return _json({'detail': 'Не найдено'}, status=404)
+            except ApiError as error:
+                if error.errors is not None:
+                    return _json({'errors': error.errors}, error.status)
+                return _json({'detail': error.detail}, error.status)
+        # Бюджет запросов должен быть объявлен для каждого из них.
+        wrapper.api_methods = methods
+        return csrf_exempt(wrapper)
+    return decorator
+
+
+def _field_names(request, fields):
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(fields)
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = sorted(set(names) - set(fields))
+    if unknown:
+        raise ApiError(400, f'Неизвестные поля: {", ".join(unknown)}')
+    return names
+
+
+def _narrow(queryset, fields, names, key):
+    """QuerySet только с колонками и связями выбранных полей."""
+    columns = set(key)
+    related = set()
+    for name in names:
+        columns.update(fields[name].columns)
+        related.update(fields[name].related)
+    return (
+        queryset
+        .select_related(None)
+        .prefetch_related(None)
+        .select_related(*sorted(related))
+        .only(*sorted(columns))
+    )
+
+
+def _serialize(instance, fields, names):
+    return {name: fields[name].value(instance) for name in names}
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', settings.POSTS_ON_PAGE))
+    except ValueError:
+        raise ApiError(400, 'limit — целое число')
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def _date_page(request, queryset, fields, date_field):
+    """Страница по курсору (дата, id) от новых к старым."""
+    names = _field_names(request, fields)
+    limit = _limit(request)
+    cursor = request.GET.get('cursor')
+    key = None
+    if cursor:
+        decoded = decode_cursor(cursor)
+        if decoded is None or decoded[0] != NEXT:
+            raise ApiError(400, 'Неверный курсор')
+        key = decoded[1]
+    queryset = _narrow(queryset, fields, names, ('id', date_field))
+    objects = seek(queryset, key, NEXT, limit + 1, date_field)
+    next_cursor = None
+    if len(objects) > limit:
+        objects = objects[:limit]
+        next_cursor = encode_cursor(objects[-1], NEXT, date_field)
+    return _json({
+        'results': [_serialize(obj, fields, names) for obj in objects],
+        'next_cursor': next_cursor,
+    })
+
+
+def _pk_page(request, queryset, fields):
+    """Страница по курсору id по возрастанию."""
+    names = _field_names(request, fields)
+    limit = _limit(request)
+    cursor = request.GET.get('cursor')
+    queryset = _narrow(queryset, fields, names, ('id',))
+    if cursor:
+        try:
+            queryset = queryset.filter(pk__gt=int(cursor))
+        except ValueError:
+            raise ApiError(400, 'Неверный курсор')
+    objects = list(queryset.order_by('pk')[:limit + 1])
+    next_cursor = None
+    if len(objects) > limit:
+        objects = objects[:limit]
+        next_cursor = str(objects[-1].pk)
+    return _json({
+        'results': [_serialize(obj, fields, names) for obj in objects],
+        'next_cursor': next_cursor,
+    })
+
+
+def _detail(request, queryset, fields, **lookup):
+    names = _field_names(request, fields)
+    instance = get_object_or_404(
+        _narrow(queryset, fields, names, ('id',)), **lookup
+    )
+    return _json(_serialize(instance, fields, names))
+
+
+def _payload(request):
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            raise ApiError(400, 'Тело запроса — не JSON')
+        if not isinstance(data, dict):
+            raise ApiError(400, 'Тело запроса — не объект JSON')
+        return data
+    return request.POST.dict()
+
+
+def _post_data(payload, instance=None):
+    """Данные PostForm: группа приходит слагом, пропущенное не меняется."""
+    data = {}
+    if instance is not None:
+        data = {'text': instance.text, 'group': instance.group_id}
+    if 'text' in payload:
+        data['text'] = payload['text']
+    if payload.get('group'):
+        group_id = Group.objects.filter(
+            slug=payload['group']
+        ).values_list('pk', flat=True).first()
+        if group_id is None:
+            raise ApiError(400, errors={'group': ['Нет такой группы']})
+        data['group'] = group_id
+    elif 'group' in payload:
+        data['group'] = None
+    return data
+
+
+def _valid(form):
+    if not form.is_valid():
+        raise ApiError(400, errors=form.errors)
+    return form
+
+
+def _post_scope(request, *args, **kwargs):
+    # Любое изменение поста или комментария увеличивает POSTS: узнать
+    # поколение группы или автора стоило бы запроса к базе.
+    return [generations.SITE, generations.POSTS]
+
+
+@query_budget(3, POST=15)
+@api_view('GET', 'POST')
+@conditional(_post_scope)
+def post_list(request):
+    if request.method == 'POST':
+        form = _valid(PostForm(
+            _post_data(_payload(request)), files=request.FILES or None
+        ))
+        post = form.save(commit=False)
+        post.author = request.user
+        writes.run(post.save)
+        return _json(
+            _serialize(post, POST_FIELDS, list(POST_FIELDS)), status=201
+        )
+    queryset = views.feed_posts()
+    if request.GET.get('group'):
+        queryset = views.group_feed(
+            get_object_or_404(Group, slug=request.GET['group'])
+        )
+    elif request.GET.get('author'):
+        queryset = views.author_feed(
+            get_object_or_404(User, username=request.GET['author'])
+        )
+    return _date_page(request, queryset, POST_FIELDS, 'pub_date')
+
+
+@query_budget(3, PATCH=11, DELETE=14)
+@api_view('GET', 'PATCH', 'DELETE')
+@conditional(_post_scope)
+def post_detail(request, post_id):
+    if request.method == 'GET':
+        return _detail(request, views.feed_posts(), POST_FIELDS, pk=post_id)
+    instance = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
+    if instance.author_id != request.user.pk:
+        raise ApiError(403, 'Изменять пост может только автор')
+    if request.method == 'DELETE':
+        writes.run(instance.delete)
+        return HttpResponse(status=204)
+    form = _valid(PostForm(
+        _post_data(_payload(request), instance), instance=instance
+    ))
+    return _json(
+        _serialize(writes.run(form.save), POST_FIELDS, list(POST_FIELDS))
+    )
+
+
+@query_budget(4, POST=8)
+@api_view('GET', 'POST')
+@conditional(_post_scope)
+def comment_list(request, post_id):
+    post = get_object_or_404(Post.objects.only('id'), pk=post_id)
+    if request.method == 'GET':
+        return _date_page(
+            request, views.post_comments(post.pk), COMMENT_FIELDS, 'created'
+        )
+    form = _valid(CommentForm(_payload(request)))
+    comment = form.save(commit=False)
+    comment.author = request.user
+    comment.post = post
+    writes.run(comment.save)
+    return _json(
+        _serialize(comment, COMMENT_FIELDS, list(COMMENT_FIELDS)),
+        status=201,
+    )
+
+
+@query_budget(DELETE=7)
+@api_view('DELETE')
+def comment_detail(request, comment_id):
+    instance = get_object_or_404(Comment, pk=comment_id)
+    if instance.author_id != request.user.pk:
+        raise ApiError(403, 'Удалять комментарий может только автор')
+    writes.run(instance.delete)
+    return HttpResponse(status=204)
+
+
+def _site_scope(request, *args, **kwargs):
+    return [generations.SITE]
+
+
+@query_budget(3)
+@use_replica
+@api_view('GET')
+@conditional(_site_scope)
+def group_list(request):
+    return _pk_page(request, Group.objects.all(), GROUP_FIELDS)
+
+
+@query_budget(3)
+@use_replica
+@api_view('GET')
+@conditional(_site_scope)
+def group_detail(request, slug):
+    return _detail(request, Group.objects.all(), GROUP_FIELDS, slug=slug)
+
+
+def _follow_scope(request, *args, **kwargs):
+    if not request.user.is_authenticated:
+        return None
+    return [generations.SITE, generations.follows(request.user.pk)]
+
+
+@query_budget(3, POST=11)
+@api_view('GET', 'POST')
+@conditional(_follow_scope)
+def follow_list(request):
+    if not request.user.is_authenticated:
+        return _json({'detail': 'Нужно войти'}, status=401)
+    if request.method == 'GET':
+        return _pk_page(
+            request,
+            Follow.objects.filter(user=request.user),
+            FOLLOW_FIELDS,
+        )
+    author = get_object_or_404(
+        User, username=_payload(request).get('author')
+    )
+    if author == request.user:
+        raise ApiError(400, 'Нельзя подписаться на себя')
+    follow, created = writes.run(lambda: Follow.objects.get_or_create(
+        user=request.user, author=author
+    ))
+    return _json(
+        _serialize(follow, FOLLOW_FIELDS, list(FOLLOW_FIELDS)),
+        status=201 if created else 200,
+    )
+
+
+@query_budget(DELETE=7)
+@api_view('DELETE')
+def follow_detail(request, username):
+    deleted, _ = writes.run(Follow.objects.filter(
+        user=request.user, author__username=username
+    ).delete)
+    if not deleted:
+        raise Http404
+    return HttpResponse(status=204)
@@ -0,0 +1,192 @@
+"""Нагрузочный прогон страниц постов через тестовый клиент.
+
+Каждый сценарий — один вид запроса. Для него снимаются задержки
+(перцентили), число SQL-запросов и пик выделенной памяти. Память
+меряется отдельными прогонами: ``tracemalloc`` замедляет запросы и
+испортил бы задержки. Результат — словарь, который пишется в JSON и
+сравнивается между прогонами по ключам.
+"""
+import math
+import platform
+import random
+import time
+import tracemalloc
+from collections import Counter, namedtuple
+
+import django
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Group, Post
+
+User = get_user_model()
+
+PERCENTILES = (50, 90, 95, 99)
+
+Scenario = namedtuple('Scenario', 'name login request')
+
+
+class Dataset:
+    """Что из засеянных данных берут сценарии."""
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+        self.slugs = list(Group.objects.values_list('slug', flat=True))
+        self.post_ids = list(Post.objects.values_list('pk', flat=True))
+        authors = (
+            User.objects
+            .annotate(followers=Count('following'))
+            .order_by('-followers', 'pk')
+            .values_list('username', flat=True)
+        )
+        self.authors = list(authors)
+        # Читатель с самой длинной лентой — худший случай follow_index.
+        self.reader = (
+            User.objects
+            .annotate(follows=Count('follower'))
+            .order_by('-follows', 'pk')
+            .first()
+        )
+        self.followed = []
+
+    def author(self):
+        # Популярных авторов открывают чаще: вес обратен месту.
+        return self.random.choices(
+            self.authors,
+            weights=[1 / rank for rank in range(1, len(self.authors) + 1)],
+        )[0]
+
+    def post_id(self):
+        return self.random.choice(self.post_ids)
+
+    def slug(self):
+        return self.random.choice(self.slugs)
+
+    def follow(self):
+        username = self.random.choice(self.authors)
+        self.followed.append(username)
+        return username
+
+    def unfollow(self):
+        return self.followed.pop() if self.followed else self.author()
+
+
+SCENARIOS = (
+    Scenario('index', False, lambda client, data: client.get(
+        reverse('posts:index')
+    )),
+    Scenario('group_posts', False, lambda client, data: client.get(
+        reverse('posts:group_posts', args=(data.slug(),))
+    )),
+    Scenario('profile', False, lambda client, data: client.get(
+        reverse('posts:profile', args=(data.author(),))
+    )),
+    Scenario('post_detail', False, lambda client, data: client.get(
+        reverse('posts:post_detail', args=(data.post_id(),))
+    )),
+    Scenario('follow_index', True, lambda client, data: client.get(
+        reverse('posts:follow_index')
+    )),
+    Scenario('add_comment', True, lambda client, data: client.post(
+        reverse('posts:add_comment', args=(data.post_id(),)),
+        {'text': 'Нагрузочный комментарий'},
+    )),
+    Scenario('profile_follow', True, lambda client, data: client.get(
+        reverse('posts:profile_follow', args=(data.follow(),))
+    )),
+    Scenario('profile_unfollow', True, lambda client, data: client.get(
+        reverse('posts:profile_unfollow', args=(data.unfollow(),))
+    )),
+)
+
+
+def percentile(values, rank):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    index = max(math.ceil(rank / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def summary(values, digits=3):
+    if not values:
+        return {}
+    result = {
+        f'p{rank}': round(percentile(values, rank), digits)
+        for rank in PERCENTILES
+    }
+    result['mean'] = round(sum(values) / len(values), digits)
+    result['max'] = round(max(values), digits)
+    return result
+
+
+def measure(scenario, client, data, iterations, warmup, memory_iterations):
+    for _ in range(warmup):
+        scenario.request(client, data)
+    latencies = []
+    queries = []
+    statuses = Counter()
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = scenario.request(client, data)
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+        statuses[str(response.status_code)] += 1
+    peaks = []
+    for _ in range(memory_iterations):
+        # Новый запуск на каждый запрос обнуляет пик и без reset_peak(),
+        # которого нет до Python 3.9.
+        tracemalloc.start()
+        try:
+            scenario.request(client, data)
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        finally:
+            tracemalloc.stop()
+    return {
+        'name': scenario.name,
+        'requests': iterations,
+        'latency_ms': summary(latencies),
+        'queries': summary(queries, 1),
+        'memory_peak_kib': summary(peaks, 1),
+        'status': dict(statuses),
+    }
+
+
+def run(iterations=50, warmup=5, memory_iterations=5, names=None, seed=0):
+    """Прогоняет сценарии по уже засеянной базе."""
+    data = Dataset(seed)
+    anonymous = Client()
+    reader = Client()
+    if data.reader is not None:
+        reader.force_login(data.reader)
+    results = [
+        measure(
+            scenario, reader if scenario.login else anonymous, data,
+            iterations, warmup, memory_iterations,
+        )
+        for scenario in SCENARIOS
+        if names is None or scenario.name in names
+    ]
+    return {
+        'meta': {
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': iterations,
+            'warmup': warmup,
+            'memory_iterations': memory_iterations,
+            'seed': seed,
+            'rows': {
+                'users': User.objects.count(),
+                'groups': len(data.slugs),
+                'posts': len(data.post_ids),
+            },
+        },
+        'scenarios': results,
+    }
@@ -0,0 +1,335 @@
+"""Потоковая выгрузка и загрузка групп, постов, комментариев и подписок.
+
+Каждый вид записей лежит в своём файле каталога: ``groups``, ``posts``,
+``comments`` и ``follows`` с расширением ``.jsonl`` или ``.csv``.
+Записи читаются и пишутся пачками по ``batch_size``, поэтому память не
+растёт с размером выгрузки; целиком в памяти держатся только словари
+внешних ключей: имя пользователя → pk, слаг группы → pk и номер поста
+в выгрузке → pk в базе.
+
+Пользователи ссылаются по имени; отсутствующие заводятся без пароля.
+Комментарии ссылаются на номера постов из той же выгрузки.
+
+``bulk_create`` не шлёт сигналы, поэтому после загрузки счётчики,
+ленты подписок и поисковый индекс пересчитываются целиком, одной
+транзакцией: до её конца сайт видит прежние данные, а живые записи
+ждут её. Первичные ключи назначает база, как и для живых записей.
+"""
+import csv
+import datetime as dt
+import json
+import os
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import NotSupportedError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, fulltext, generations, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Порядок важен для загрузки: ссылки только на уже загруженное.
+KINDS = ('groups', 'posts', 'comments', 'follows')
+
+EXPORTS = {
+    'groups': (
+        Group.objects,
+        ('slug', 'title', 'description'),
+        ('slug', 'title', 'description'),
+    ),
+    'posts': (
+        Post.objects,
+        ('id', 'author', 'group', 'text', 'pub_date', 'image'),
+        ('pk', 'author__username', 'group__slug', 'text', 'pub_date',
+         'image'),
+    ),
+    'comments': (
+        Comment.objects,
+        ('post', 'author', 'text', 'created'),
+        ('post_id', 'author__username', 'text', 'created'),
+    ),
+    'follows': (
+        Follow.objects,
+        ('user', 'author', 'fanout'),
+        ('user__username', 'author__username', 'fanout'),
+    ),
+}
+
+
+class JSONLines:
+    extension = 'jsonl'
+
+    def write(self, stream, fields, rows):
+        for row in rows:
+            stream.write(json.dumps(dict(zip(fields, row)),
+                                    ensure_ascii=False))
+            stream.write('\n')
+
+    def read(self, stream):
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+FIELD_SIZE_LIMIT = 2 ** 31 - 1
+
+
+class CSV:
+    extension = 'csv'
+
+    def write(self, stream, fields, rows):
+        writer = csv.writer(stream)
+        writer.writerow(fields)
+        writer.writerows(rows)
+
+    def read(self, stream):
+        # Текст поста бывает длиннее стандартного предела в 128 КБ.
+        # Предел общий на процесс, поэтому он поднят только на время
+        # чтения.
+        limit = csv.field_size_limit(FIELD_SIZE_LIMIT)
+        try:
+            yield from csv.DictReader(stream)
+        finally:
+            csv.field_size_limit(limit)
+
+
+FORMATS = {format_.extension: format_ for format_ in (JSONLines(), CSV())}
+
+
+def path_for(directory, kind, extension):
+    return os.path.join(directory, f'{kind}.{extension}')
+
+
+def _plain(value):
+    if isinstance(value, dt.datetime):
+        return value.isoformat()
+    return value
+
+
+def _rows(queryset, lookups, batch_size):
+    """Строки таблицы пачками по pk, без долгоживущего курсора."""
+    last = 0
+    while True:
+        batch = list(
+            queryset
+            .filter(pk__gt=last)
+            .order_by('pk')
+            .values_list('pk', *lookups)[:batch_size]
+        )
+        if not batch:
+            return
+        last = batch[-1][0]
+        for row in batch:
+            yield [_plain(value) for value in row[1:]]
+
+
+def export(directory, extension, kinds=KINDS, batch_size=1000):
+    """Пишет выбранные виды записей в каталог; возвращает {вид: строк}."""
+    format_ = FORMATS[extension]
+    os.makedirs(directory, exist_ok=True)
+    totals = {}
+    for kind in kinds:
+        queryset, fields, lookups = EXPORTS[kind]
+        total = 0
+
+        def counted(rows):
+            nonlocal total
+            for row in rows:
+                total += 1
+                yield row
+
+        path = path_for(directory, kind, extension)
+        with open(path, 'w', newline='', encoding='utf-8') as stream:
+            format_.write(
+                stream, fields,
+                counted(_rows(queryset, lookups, batch_size)),
+            )
+        totals[kind] = total
+    return totals
+
+
+def _bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def _date(value):
+    return parse_datetime(value) if value else timezone.now()
+
+
+def _recover_pks(model, objects):
+    """Ключи строк, только что вставленных ``bulk_create`` в SQLite.
+
+    С первой вставки и до конца транзакции SQLite держит блокировку
+    записи: чужие вставки ждут, а строки этой получают rowid подряд.
+    Поэтому последний ключ, прочитанный в той же транзакции, — наш.
+    """
+    if connection.vendor != 'sqlite':
+        raise NotSupportedError(
+            f'{connection.vendor}: bulk_create не вернул первичные ключи'
+        )
+    last = model.objects.aggregate(last=Max('pk'))['last']
+    for pk, obj in zip(range(last - len(objects) + 1, last + 1), objects):
+        obj.pk = pk
+
+
+def _create(model, objects, date_field):
+    """``bulk_create`` с первичными ключами и датами из выгрузки.
+
+    PostgreSQL возвращает ключи сам, в SQLite они восстанавливаются в
+    той же транзакции. ``auto_now_add`` ставит при вставке текущее
+    время; даты из выгрузки возвращает ``bulk_update``, деля пачку так,
+    чтобы не выйти за предел параметров запроса.
+    """
+    if not objects:
+        return
+    dates = [getattr(obj, date_field) for obj in objects]
+    with transaction.atomic():
+        model.objects.bulk_create(objects)
+        if objects[0].pk is None:
+            _recover_pks(model, objects)
+        for obj, date in zip(objects, dates):
+            setattr(obj, date_field, date)
+        model.objects.bulk_update(objects, [date_field])
+
+
+class Importer:
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.posts = {}
+        self.skipped = 0
+
+    def user_ids(self, usernames):
+        missing = {
+            username for username in usernames
+            if username not in self.users
+        }
+        if missing:
+            User.objects.bulk_create(
+                (
+                    User(username=username, password=make_password(None))
+                    for username in missing
+                ),
+                ignore_conflicts=True,
+            )
+            self.users.update(
+                User.objects.filter(username__in=missing).values_list(
+                    'username', 'pk'
+                )
+            )
+        return self.users
+
+    def load_groups(self, rows):
+        Group.objects.bulk_create(
+            (
+                Group(
+                    slug=row['slug'],
+                    title=row['title'],
+                    description=row['description'],
+                )
+                for row in rows
+                if row['slug'] not in self.groups
+            ),
+            ignore_conflicts=True,
+        )
+        self.groups.update(
+            Group.objects.filter(
+                slug__in=[row['slug'] for row in rows]
+            ).values_list('slug', 'pk')
+        )
+        return len(rows)
+
+    def load_posts(self, rows):
+        users = self.user_ids(row['author'] for row in rows)
+        posts = [
+            Post(
+                author_id=users[row['author']],
+                group_id=self.groups.get(row.get('group') or None),
+                text=row['text'],
+                pub_date=_date(row.get('pub_date')),
+                image=row.get('image') or '',
+            )
+            for row in rows
+        ]
+        _create(Post, posts, 'pub_date')
+        for row, post in zip(rows, posts):
+            if row.get('id') not in (None, ''):
+                self.posts[int(row['id'])] = post.pk
+        return len(posts)
+
+    def load_comments(self, rows):
+        users = self.user_ids(row['author'] for row in rows)
+        comments = []
+        for row in rows:
+            post_id = self.posts.get(int(row['post']))
+            if post_id is None:
+                self.skipped += 1
+                continue
+            comments.append(Comment(
+                post_id=post_id,
+                author_id=users[row['author']],
+                text=row['text'],
+                created=_date(row.get('created')),
+            ))
+        _create(Comment, comments, 'created')
+        return len(comments)
+
+    def load_follows(self, rows):
+        rows = [row for row in rows if row['user'] != row['author']]
+        users = self.user_ids(
+            username for row in rows
+            for username in (row['user'], row['author'])
+        )
+        Follow.objects.bulk_create(
+            (
+                Follow(
+                    user_id=users[row['user']],
+                    author_id=users[row['author']],
+                    fanout=_bool(row.get('fanout', True)),
+                )
+                for row in rows
+            ),
+            ignore_conflicts=True,
+        )
+        return len(rows)
+
+    def load(self, kind, rows):
+        """Загружает поток записей пачками; возвращает число строк."""
+        load = getattr(self, f'load_{kind}')
+        total = 0
+        for batch in timeline._batched(rows, self.batch_size):
+            with transaction.atomic():
+                total += load(batch)
+        return total
+
+    def finish(self):
+        """Пересчитывает всё, что обычно поддерживают сигналы."""
+        with transaction.atomic():
+            counters.rebuild_all(self.batch_size)
+            timeline.rebuild()
+            fulltext.rebuild(self.batch_size)
+        generations.bump(generations.SITE)
+
+
+def import_(directory, kinds=KINDS, batch_size=1000):
+    """Загружает найденные в каталоге файлы; возвращает {вид: строк}."""
+    importer = Importer(batch_size)
+    totals = {}
+    for kind in KINDS:
+        if kind not in kinds:
+            continue
+        for extension, format_ in FORMATS.items():
+            path = path_for(directory, kind, extension)
+            if os.path.exists(path):
+                with open(path, newline='', encoding='utf-8') as stream:
+                    totals[kind] = importer.load(kind, format_.read(stream))
+                break
+    importer.finish()
+    return totals, importer.skipped
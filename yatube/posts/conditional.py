@@ -0,0 +1,88 @@
+"""Условные ответы по поколениям кэша.
+
+Представление объявляет, от каких пространств имён ``generations``
+зависит его ответ. До вызова представления их номер и время изменения
+сравниваются с ``If-None-Match`` и ``If-Modified-Since``: совпало —
+304 без запросов к лентам и без отрисовки.
+
+Ответ анониму общий для всех анонимов, его можно держать в CDN
+``SHARED_CACHE_MAX_AGE`` секунд. Ответ вошедшему — только в браузере и
+с проверкой при каждом показе. ``Vary: Cookie`` не даёт прокси отдать
+одному пользователю страницу другого.
+"""
+import functools
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+
+from . import generations
+
+
+def validators(request, namespaces):
+    """ETag и Last-Modified ответа на ``request`` для пространств имён.
+
+    В ETag входят пользователь и полный адрес с параметрами: разные
+    страницы и разные пользователи не делят один валидатор.
+    """
+    version, changed = generations.snapshot(*namespaces)
+    source = '|'.join((version, str(request.user.pk), request.get_full_path()))
+    return quote_etag(hashlib.md5(source.encode()).hexdigest()), int(changed)
+
+
+def scope_of(namespaces, request, *args, **kwargs):
+    """``namespaces(request, ...)``, вычисленные один раз на запрос."""
+    scopes = request.__dict__.setdefault('_generation_scopes', {})
+    if namespaces not in scopes:
+        scopes[namespaces] = namespaces(request, *args, **kwargs)
+    return scopes[namespaces]
+
+
+def page_version(namespaces):
+    """Поколение страницы для ``core.pagecache.page_cache``."""
+    def version(request, *args, **kwargs):
+        scope = scope_of(namespaces, request, *args, **kwargs)
+        return scope and generations.current(*scope)
+    return version
+
+
+def conditional(namespaces):
+    """304 для GET, если данные ``namespaces(request, **kwargs)`` не менялись.
+
+    ``namespaces`` возвращает список пространств имён или None, если
+    ответ сравнивать не нужно.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            scope = scope_of(namespaces, request, *args, **kwargs)
+            if scope is None:
+                return view(request, *args, **kwargs)
+            etag, last_modified = validators(request, scope)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code not in (200, 304):
+                return response
+            response.setdefault('ETag', etag)
+            response.setdefault('Last-Modified', http_date(last_modified))
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(
+                    response,
+                    public=True,
+                    max_age=0,
+                    s_maxage=settings.SHARED_CACHE_MAX_AGE,
+                )
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
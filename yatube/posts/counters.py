@@ -0,0 +1,189 @@
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from core.db import repair
+
+from .models import Comment, Follow, Post, PostCounter, UserStats
+
+User = get_user_model()
+
+ALL = 'posts'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def feed_scope(user_id):
+    return f'feed:{user_id}'
+
+
+def post_scopes(post):
+    """Области, в которые входит пост.
+
+    Посты автора считаются в ``UserStats.posts_count``, а не здесь.
+    """
+    scopes = [ALL]
+    if post.group_id is not None:
+        scopes.append(group_scope(post.group_id))
+    return scopes
+
+
+def _scope_posts(scope):
+    if scope == ALL:
+        return Post.objects.all()
+    kind, pk = scope.split(':')
+    return Post.objects.filter(**{f'{kind}_id': int(pk)})
+
+
+def _upsert(scope, value, delta):
+    """Заводит счётчик со значением ``value`` или сдвигает его на ``delta``."""
+    table = connection.ops.quote_name(PostCounter._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (scope, value) VALUES (%s, %s) '
+            f'ON CONFLICT (scope) DO UPDATE SET value = {table}.value + %s',
+            [scope, value, delta],
+        )
+
+
+def add(scopes, delta):
+    """Сдвигает счётчики областей.
+
+    Незаведённый счётчик заводится здесь же числом постов, которое видит
+    эта транзакция. Если ``get_count`` успел вставить подсчёт, сделанный
+    до этой записи, upsert сдвигает его, и запись не теряется.
+    """
+    existing = set(
+        PostCounter.objects.filter(scope__in=scopes).values_list(
+            'scope', flat=True
+        )
+    )
+    if existing:
+        PostCounter.objects.filter(scope__in=existing).update(
+            value=F('value') + delta
+        )
+    for scope in scopes:
+        if scope not in existing:
+            _upsert(scope, _scope_posts(scope).count(), delta)
+
+
+def forget(scope):
+    PostCounter.objects.filter(scope=scope).delete()
+
+
+def _count_by(queryset, field, user_ids):
+    return dict(
+        queryset
+        .filter(**{f'{field}__in': user_ids})
+        .order_by()
+        .values_list(field)
+        .annotate(Count('pk'))
+    )
+
+
+def rebuild_stats(user_ids):
+    """Пересчитывает статистику пользователей с нуля."""
+    user_ids = list(user_ids)
+    posts = _count_by(Post.objects, 'author_id', user_ids)
+    followers = _count_by(Follow.objects, 'author_id', user_ids)
+    following = _count_by(Follow.objects, 'user_id', user_ids)
+    UserStats.objects.filter(pk__in=user_ids).delete()
+    return UserStats.objects.bulk_create((
+        UserStats(
+            user_id=user_id,
+            posts_count=posts.get(user_id, 0),
+            followers_count=followers.get(user_id, 0),
+            following_count=following.get(user_id, 0),
+        )
+        for user_id in user_ids
+    ), ignore_conflicts=True)
+
+
+def add_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def rebuild_comment_counts():
+    comments = (
+        Comment.objects
+        .filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Post.objects.update(comments_count=Coalesce(Subquery(comments), 0))
+
+
+def rebuild_all(batch_size=1000):
+    """Пересчитывает все счётчики; возвращает число пользователей."""
+    PostCounter.objects.all().delete()
+    rebuild_comment_counts()
+    user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+    iterator = user_ids.iterator()
+    total = 0
+    batch = list(islice(iterator, batch_size))
+    while batch:
+        rebuild_stats(batch)
+        total += len(batch)
+        batch = list(islice(iterator, batch_size))
+    return total
+
+
+def get_stats(user_id):
+    """Счётчики профиля одним поиском по первичному ключу."""
+    stats = UserStats.objects.filter(pk=user_id).first()
+    if stats is None:
+        with repair():
+            stats, = rebuild_stats([user_id])
+    return stats
+
+
+def add_stats(user_id, field, delta):
+    """Сдвигает счётчик профиля; незаведённый посчитается при чтении."""
+    UserStats.objects.filter(pk=user_id).update(**{field: F(field) + delta})
+
+
+def _feed_count(user_id):
+    """Лента подписок — это ровно все посты авторов, на которых подписан."""
+    follows = Follow.objects.filter(user_id=user_id)
+    missing = list(
+        follows.filter(author__stats__isnull=True).values_list(
+            'author_id', flat=True
+        )
+    )
+    if missing:
+        with repair():
+            rebuild_stats(missing)
+    total = follows.aggregate(total=Sum('author__stats__posts_count'))
+    return total['total'] or 0
+
+
+def get_count(scope):
+    """Число постов в области без COUNT(*) по всей таблице постов."""
+    if scope.startswith('feed:'):
+        return _feed_count(int(scope.split(':')[1]))
+    if scope.startswith('author:'):
+        return get_stats(int(scope.split(':')[1])).posts_count
+    value = PostCounter.objects.filter(scope=scope).values_list(
+        'value', flat=True
+    ).first()
+    if value is None:
+        with repair():
+            counter, _ = PostCounter.objects.get_or_create(
+                scope=scope,
+                defaults={'value': _scope_posts(scope).count()},
+            )
+        value = counter.value
+    return value
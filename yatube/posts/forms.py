@@ -1,6 +1,8 @@
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
 from django import forms
 
+from . import uploads
 from .models import Post, Comment
 
 
@@ -11,6 +13,23 @@ class PostForm(ModelForm):
         labels = {'group': 'Группа', 'text': 'Сообщение'}
         help_texts = {'group': 'Выберите группу', 'text': 'Введите сообщение'}
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            return uploads.normalize(image)
+        return image
+
+    def save(self, commit=True):
+        post = super().save(commit=False)
+        if commit:
+            # Правка пишет только поля формы и не затирает comments_count,
+            # который в это время сдвигают комментарии.
+            post.save(
+                update_fields=None if post._state.adding else self._meta.fields
+            )
+            self.save_m2m()
+        return post
+
 
 class CommentForm(ModelForm):
     class Meta:
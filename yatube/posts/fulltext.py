@@ -0,0 +1,297 @@
+"""Полнотекстовый поиск по постам, комментариям и группам.
+
+Основной индекс — виртуальная таблица FTS5 ``posts_search`` в SQLite,
+ранжирование — её ``bm25()``. Если FTS5 нет (другая СУБД или SQLite
+без расширения, либо ``SEARCH_BACKEND = 'python'``), работает запасной
+обратный индекс на моделях SearchDocument и SearchPosting с тем же
+bm25, посчитанным в Python.
+
+У каждого документа один номер на оба индекса: ``pk * 4 + вид``.
+"""
+import binascii
+import math
+import re
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import Counter, defaultdict, namedtuple
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Avg, Count, F
+from django.urls import reverse
+
+from .models import Comment, Group, Post, SearchDocument, SearchPosting
+
+TABLE = 'posts_search'
+POST, COMMENT, GROUP = 1, 2, 3
+KINDS = {POST: 'post', COMMENT: 'comment', GROUP: 'group'}
+# Совпадение в заголовке группы весит как десять в тексте.
+TITLE_WEIGHT = 10
+K1 = 1.2
+B = 0.75
+MAX_TERM_LENGTH = 64
+
+Hit = namedtuple('Hit', 'kind object rank url')
+
+_fts_tables = {}
+
+
+def tokenize(text):
+    """Слова так, как их режет токенизатор unicode61 у FTS5."""
+    return [
+        word[:MAX_TERM_LENGTH]
+        for word in re.findall(r'[^\W_]+', text.lower())
+    ]
+
+
+def doc_id(kind, pk):
+    return pk * 4 + kind
+
+
+def split_doc_id(rowid):
+    return rowid % 4, rowid // 4
+
+
+def _document(instance):
+    """(номер, заголовок, текст) документа для индекса."""
+    if isinstance(instance, Post):
+        return doc_id(POST, instance.pk), '', instance.text
+    if isinstance(instance, Comment):
+        return doc_id(COMMENT, instance.pk), '', instance.text
+    return doc_id(GROUP, instance.pk), instance.title, instance.description
+
+
+def fts_available():
+    if settings.SEARCH_BACKEND == 'python':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts_tables:
+        _fts_tables[name] = (
+            connection.vendor == 'sqlite'
+            and TABLE in connection.introspection.table_names()
+        )
+    return _fts_tables[name]
+
+
+def _terms(title, body):
+    terms = Counter(tokenize(body))
+    for term in tokenize(title):
+        terms[term] += TITLE_WEIGHT
+    return terms
+
+
+def _python_insert(documents):
+    """Вставляет в запасной индекс новые документы пачкой."""
+    rows = []
+    postings = []
+    for rowid, title, body in documents:
+        terms = _terms(title, body)
+        if not terms:
+            continue
+        rows.append(SearchDocument(pk=rowid, length=sum(terms.values())))
+        postings.extend(
+            SearchPosting(term=term, document_id=rowid, frequency=frequency)
+            for term, frequency in terms.items()
+        )
+    SearchDocument.objects.bulk_create(rows)
+    SearchPosting.objects.bulk_create(postings)
+
+
+def _python_index(rowid, title, body):
+    SearchDocument.objects.filter(pk=rowid).delete()
+    _python_insert([(rowid, title, body)])
+
+
+def index(instance):
+    """Добавляет или обновляет документ в индексе."""
+    rowid, title, body = _document(instance)
+    if not fts_available():
+        _python_index(rowid, title, body)
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [rowid])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, title, body) VALUES (%s, %s, %s)',
+            [rowid, title, body],
+        )
+
+
+def remove(instance):
+    rowid = _document(instance)[0]
+    if not fts_available():
+        SearchDocument.objects.filter(pk=rowid).delete()
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [rowid])
+
+
+def remove_comments(post):
+    """Убирает из индекса все комментарии поста одним запросом."""
+    rowids = Comment.objects.filter(post=post).annotate(
+        rowid=doc_id(COMMENT, F('pk'))
+    ).values('rowid')
+    if not fts_available():
+        SearchDocument.objects.filter(pk__in=rowids).delete()
+        return
+    sql, params = rowids.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid IN ({sql})', params
+        )
+
+
+def _insert(documents):
+    """Вставляет пачку документов, которых ещё нет в индексе."""
+    if not fts_available():
+        _python_insert(documents)
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, title, body) VALUES (%s, %s, %s)',
+            documents,
+        )
+
+
+def rebuild(batch_size=1000):
+    """Строит индекс заново; возвращает число документов."""
+    if fts_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+    else:
+        SearchDocument.objects.all().delete()
+    total = 0
+    for queryset in (Post.objects, Comment.objects, Group.objects):
+        iterator = queryset.order_by('pk').iterator(chunk_size=batch_size)
+        batch = list(islice(iterator, batch_size))
+        while batch:
+            _insert([_document(instance) for instance in batch])
+            total += len(batch)
+            batch = list(islice(iterator, batch_size))
+    return total
+
+
+def encode_cursor(rank, rowid):
+    raw = f'{rank!r}|{rowid}'
+    return urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (ранг, номер документа) или None для мусора."""
+    if not token:
+        return None
+    try:
+        raw = urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        rank, rowid = raw.split('|')
+        return float(rank), int(rowid)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def _fts_search(terms, after, limit):
+    match = ' '.join(f'"{term}"' for term in terms)
+    sql = (
+        f'SELECT bm25({TABLE}, {TITLE_WEIGHT:.1f}, 1.0) AS score, rowid '
+        f'FROM {TABLE} WHERE {TABLE} MATCH %s'
+    )
+    params = [match]
+    if after is not None:
+        sql += ' AND (score > %s OR (score = %s AND rowid > %s))'
+        params += [after[0], after[0], after[1]]
+    sql += ' ORDER BY score, rowid LIMIT %s'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+
+def _python_search(terms, after, limit):
+    terms = set(terms)
+    matches = defaultdict(dict)
+    postings = SearchPosting.objects.filter(term__in=terms).values_list(
+        'term', 'document_id', 'frequency'
+    )
+    frequencies = Counter()
+    for term, rowid, frequency in postings:
+        matches[rowid][term] = frequency
+        frequencies[term] += 1
+    matches = {
+        rowid: found for rowid, found in matches.items()
+        if len(found) == len(terms)
+    }
+    if not matches:
+        return []
+    stats = SearchDocument.objects.aggregate(
+        total=Count('pk'), average=Avg('length')
+    )
+    lengths = dict(
+        SearchDocument.objects.filter(pk__in=matches).values_list(
+            'pk', 'length'
+        )
+    )
+    idf = {
+        term: max(1e-6, math.log(
+            (stats['total'] - count + 0.5) / (count + 0.5)
+        ))
+        for term, count in frequencies.items()
+    }
+    rows = []
+    for rowid, found in matches.items():
+        norm = K1 * (1 - B + B * lengths[rowid] / stats['average'])
+        score = sum(
+            idf[term] * frequency * (K1 + 1) / (frequency + norm)
+            for term, frequency in found.items()
+        )
+        rows.append((-score, rowid))
+    rows.sort()
+    if after is not None:
+        rows = [row for row in rows if row > after]
+    return rows[:limit]
+
+
+def _url(kind, instance):
+    if kind == POST:
+        return reverse('posts:post_detail', args=(instance.pk,))
+    if kind == COMMENT:
+        return reverse('posts:post_detail', args=(instance.post_id,))
+    return reverse('posts:group_posts', args=(instance.slug,))
+
+
+def _hits(rows):
+    ids = defaultdict(list)
+    for _, rowid in rows:
+        kind, pk = split_doc_id(rowid)
+        ids[kind].append(pk)
+    objects = {
+        POST: Post.objects.select_related('author', 'group').in_bulk(
+            ids[POST]
+        ),
+        COMMENT: Comment.objects.select_related('author').in_bulk(
+            ids[COMMENT]
+        ),
+        GROUP: Group.objects.in_bulk(ids[GROUP]),
+    }
+    hits = []
+    for rank, rowid in rows:
+        kind, pk = split_doc_id(rowid)
+        instance = objects[kind].get(pk)
+        if instance is not None:
+            hits.append(Hit(KINDS[kind], instance, rank, _url(kind, instance)))
+    return hits
+
+
+def search(query, cursor=None, limit=None):
+    """Найденные документы по убыванию релевантности.
+
+    Возвращает (список Hit, курсор следующей страницы или None).
+    Слова запроса объединяются по И.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return [], None
+    limit = limit or settings.POSTS_ON_PAGE
+    find = _fts_search if fts_available() else _python_search
+    rows = find(terms, decode_cursor(cursor), limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*rows[-1])
+    return _hits(rows), next_cursor
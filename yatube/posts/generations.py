@@ -0,0 +1,89 @@
+"""Поколения закэшированных фрагментов.
+
+Номер поколения входит в ключ ``{% cache %}``: вместо удаления
+фрагментов при изменении данных достаточно увеличить номер, и старые
+фрагменты просто перестают читаться, пока не истекут сами.
+
+Рядом с номером хранится время последнего увеличения: вместе они дают
+ответам ETag и Last-Modified без запросов к базе.
+"""
+import time
+
+from django.core.cache import cache
+
+SITE = 'site'
+POSTS = 'posts'
+
+
+def group(group_id):
+    return f'group:{group_id}'
+
+
+def author(author_id):
+    return f'author:{author_id}'
+
+
+def follows(user_id):
+    return f'follows:{user_id}'
+
+
+def followers(user_id):
+    return f'followers:{user_id}'
+
+
+def _key(namespace):
+    return f'generation:{namespace}'
+
+
+def _changed_key(namespace):
+    return f'generation:{namespace}:changed'
+
+
+def _fresh():
+    # Не с единицы: после вытеснения ключа из кэша номер не должен
+    # совпасть с номером ещё живых старых фрагментов.
+    return time.time_ns() // 1000
+
+
+def current(*namespaces):
+    """Общий номер поколения для набора пространств имён."""
+    keys = [_key(namespace) for namespace in namespaces]
+    values = cache.get_many(keys)
+    missing = {key: _fresh() for key in keys if key not in values}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        values.update(missing)
+    return '.'.join(str(values[key]) for key in keys)
+
+
+def snapshot(*namespaces):
+    """Номер поколения и время последнего изменения в секундах.
+
+    Если время вытеснено из кэша, изменением считается текущий момент:
+    лишний полный ответ лучше, чем 304 на изменившиеся данные.
+    """
+    keys = [_key(namespace) for namespace in namespaces]
+    changed = [_changed_key(namespace) for namespace in namespaces]
+    values = cache.get_many(keys + changed)
+    missing = {key: _fresh() for key in keys if key not in values}
+    now = time.time()
+    missing.update((key, now) for key in changed if key not in values)
+    if missing:
+        cache.set_many(missing, timeout=None)
+        values.update(missing)
+    version = '.'.join(str(values[key]) for key in keys)
+    return version, max(values[key] for key in changed)
+
+
+def bump(*namespaces):
+    now = time.time()
+    for namespace in namespaces:
+        key = _key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh(), timeout=None)
+    cache.set_many(
+        {_changed_key(namespace): now for namespace in namespaces},
+        timeout=None,
+    )
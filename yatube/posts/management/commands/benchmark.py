@@ -0,0 +1,99 @@
+import json
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import (
+    override_settings, setup_test_environment, teardown_test_environment
+)
+
+from posts import benchmark, synthetic
+
+
+class Command(BaseCommand):
+    help = ('Засевает временную базу и меряет задержки, запросы и память '
+            'страниц постов; результат — JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profile',
+            choices=sorted(synthetic.PROFILES),
+            default='small',
+            help='Объём синтетических данных',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Зерно генератора данных и выбора страниц',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=50,
+            help='Сколько замеряемых запросов на сценарий',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=5,
+            help='Сколько запросов сделать до замеров',
+        )
+        parser.add_argument(
+            '--memory-iterations',
+            type=int,
+            default=5,
+            help='Сколько запросов под tracemalloc на сценарий',
+        )
+        parser.add_argument(
+            '--scenarios',
+            nargs='+',
+            choices=[scenario.name for scenario in benchmark.SCENARIOS],
+            help='Какие сценарии прогонять; по умолчанию все',
+        )
+        parser.add_argument(
+            '--cache',
+            choices=sorted(settings.CACHE_BACKENDS),
+            default='locmem',
+            help='Бэкенд кэша на время прогона',
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для JSON; по умолчанию stdout',
+        )
+
+    def handle(self, *args, **options):
+        media_root = tempfile.mkdtemp()
+        old_name = connection.settings_dict['NAME']
+        setup_test_environment(debug=False)
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(
+                MEDIA_ROOT=media_root,
+                THUMBNAIL_WORKERS=0,
+                CACHES={'default': settings.CACHE_BACKENDS[options['cache']]},
+            ):
+                synthetic.seed(
+                    synthetic.PROFILES[options['profile']], options['seed']
+                )
+                result = benchmark.run(
+                    options['iterations'],
+                    options['warmup'],
+                    options['memory_iterations'],
+                    options['scenarios'],
+                    options['seed'],
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+        result['meta']['profile'] = options['profile']
+        result['meta']['cache'] = options['cache']
+        output = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                stream.write(output + '\n')
+        else:
+            self.stdout.write(output)
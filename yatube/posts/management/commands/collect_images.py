@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import uploads
+
+
+class Command(BaseCommand):
+    help = 'Удаляет картинки постов, на которые никто не ссылается'
+
+    def handle(self, *args, **options):
+        total = uploads.collect()
+        self.stdout.write(self.style.SUCCESS(f'Удалено картинок: {total}'))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии и подписки '
+            'в JSON Lines или CSV')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'directory',
+            help='Каталог, в который лягут файлы по видам записей',
+        )
+        parser.add_argument(
+            '--format',
+            choices=sorted(bulk.FORMATS),
+            default='jsonl',
+            help='Формат файлов',
+        )
+        parser.add_argument(
+            '--kinds',
+            nargs='+',
+            choices=bulk.KINDS,
+            default=bulk.KINDS,
+            help='Какие виды записей выгружать',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько записей читать из базы за раз',
+        )
+
+    def handle(self, *args, **options):
+        totals = bulk.export(
+            options['directory'],
+            options['format'],
+            options['kinds'],
+            options['batch_size'],
+        )
+        for kind, total in totals.items():
+            self.stdout.write(self.style.SUCCESS(
+                f'Выгружено {kind}: {total}'
+            ))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = ('Загружает группы, посты, комментарии и подписки '
+            'из JSON Lines или CSV')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'directory',
+            help='Каталог с файлами groups, posts, comments и follows',
+        )
+        parser.add_argument(
+            '--kinds',
+            nargs='+',
+            choices=bulk.KINDS,
+            default=bulk.KINDS,
+            help='Какие виды записей загружать',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько записей вставлять за раз',
+        )
+
+    def handle(self, *args, **options):
+        totals, skipped = bulk.import_(
+            options['directory'],
+            options['kinds'],
+            options['batch_size'],
+        )
+        for kind, total in totals.items():
+            self.stdout.write(self.style.SUCCESS(
+                f'Загружено {kind}: {total}'
+            ))
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                f'Пропущено комментариев к неизвестным постам: {skipped}'
+            ))
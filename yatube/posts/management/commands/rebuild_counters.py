@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику профилей и счётчики постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько пользователей пересчитывать за раз',
+        )
+
+    def handle(self, *args, **options):
+        total = counters.rebuild_all(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитана статистика {total} пользователей'
+        ))
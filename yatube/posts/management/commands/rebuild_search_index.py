@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import fulltext
+
+
+class Command(BaseCommand):
+    help = 'Строит поисковый индекс по постам, комментариям и группам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько записей читать из базы за раз',
+        )
+
+    def handle(self, *args, **options):
+        total = fulltext.rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано документов: {total}'
+        ))
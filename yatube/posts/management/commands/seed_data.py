@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from posts import synthetic
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими данными для нагрузочных прогонов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profile',
+            choices=sorted(synthetic.PROFILES),
+            default='small',
+            help='Объём данных',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Зерно генератора: тот же seed — те же данные',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько записей вставлять за раз',
+        )
+        parser.add_argument(
+            '--no-thumbnails',
+            action='store_true',
+            help='Не рисовать миниатюры картинок заранее',
+        )
+
+    def handle(self, *args, **options):
+        totals = synthetic.seed(
+            synthetic.PROFILES[options['profile']],
+            options['seed'],
+            options['batch_size'],
+            not options['no_thumbnails'],
+        )
+        for kind, total in totals.items():
+            self.stdout.write(self.style.SUCCESS(
+                f'Создано {kind}: {total}'
+            ))
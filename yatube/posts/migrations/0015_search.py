@@ -0,0 +1,72 @@
+# Generated by Django 2.2.16 on 2026-10-18 01:42
+
+from django.db import OperationalError, migrations, models
+import django.db.models.deletion
+
+
+def create_fts_index(apps, schema_editor):
+    # Без FTS5 поиск работает на SearchDocument/SearchPosting, которые
+    # заполняет команда rebuild_search_index.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE posts_search USING fts5("
+                "title, body, tokenize='unicode61')"
+            )
+        except OperationalError:
+            return
+        cursor.execute(
+            "INSERT INTO posts_search (rowid, title, body) "
+            "SELECT id * 4 + 1, '', text FROM posts_post"
+        )
+        cursor.execute(
+            "INSERT INTO posts_search (rowid, title, body) "
+            "SELECT id * 4 + 2, '', text FROM posts_comment"
+        )
+        cursor.execute(
+            "INSERT INTO posts_search (rowid, title, body) "
+            "SELECT id * 4 + 3, title, description FROM posts_group"
+        )
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='Номер документа')),
+                ('length', models.IntegerField(verbose_name='Длина в словах')),
+            ],
+            options={
+                'verbose_name': 'Документ поиска',
+                'verbose_name_plural': 'Документы поиска',
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Слово')),
+                ('frequency', models.IntegerField(verbose_name='Число вхождений')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='posts.SearchDocument', verbose_name='Документ')),
+            ],
+            options={
+                'verbose_name': 'Вхождение слова',
+                'verbose_name_plural': 'Вхождения слов',
+                'unique_together': {('term', 'document')},
+            },
+        ),
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+
+from core.storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -58,17 +60,109 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    comments_count = models.IntegerField(
+        "Комментариев",
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'), name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(fields=('image',), name='post_image_idx'),
+        ]
 
     def __str__(self):
         return self.text[:LIMIT_CHARS]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        # Группа и картинка, с которыми пост прочитан: при сохранении
+        # сигналы сравнивают с ними без повторного запроса.
+        post._loaded = {
+            name: value
+            for name, value in zip(field_names, values)
+            if name in ('group_id', 'image')
+        }
+        return post
+
+    def save(self, *args, **kwargs):
+        # Пост и счётчики, которые сдвигают сигналы, фиксируются вместе:
+        # подсчёт в counters.get_count видит либо и то и другое, либо ничего.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    def refresh_from_db(self, using=None, fields=None):
+        self.__dict__.pop('_loaded', None)
+        super().refresh_from_db(using, fields)
+
+
+class PostCounter(models.Model):
+    """Счётчик постов в области: вся лента, группа или автор."""
+    scope = models.CharField(
+        "Область",
+        max_length=64,
+        unique=True,
+    )
+    value = models.IntegerField(
+        "Количество постов",
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Счётчик постов'
+        verbose_name_plural = 'Счётчики постов'
+
+    def __str__(self):
+        return f'{self.scope}: {self.value}'
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики профиля пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name="Пользователь"
+    )
+    posts_count = models.IntegerField(
+        "Всего записей",
+        default=0,
+    )
+    followers_count = models.IntegerField(
+        "Подписчиков",
+        default=0,
+    )
+    following_count = models.IntegerField(
+        "Подписок",
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return str(self.user_id)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -95,6 +189,12 @@ class Comment(models.Model):
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         ordering = ('-created',)
+        indexes = [
+            models.Index(
+                fields=('post', '-created'),
+                name='comment_post_created_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:LIMIT_CHARS]
@@ -113,7 +213,99 @@ class Follow(models.Model):
         related_name="following",
         verbose_name="Автор"
     )
+    fanout = models.BooleanField(
+        "Рассылка в ленту",
+        default=True,
+        help_text='Посты автора раскладываются в ленту подписчика при '
+                  'публикации, иначе подмешиваются при чтении'
+    )
 
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='follow_unique_user_author',
+            ),
+        ]
+
+
+class Timeline(models.Model):
+    """Материализованная лента подписок: строка на пару подписчик-пост."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        verbose_name="Подписчик"
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="Пост"
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Автор поста"
+    )
+    pub_date = models.DateTimeField(
+        "Дата публикации",
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        ordering = ('-pub_date',)
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
+
+
+class SearchDocument(models.Model):
+    """Документ запасного поискового индекса, если нет FTS5."""
+    id = models.BigIntegerField(
+        "Номер документа",
+        primary_key=True,
+    )
+    length = models.IntegerField(
+        "Длина в словах",
+    )
+
+    class Meta:
+        verbose_name = 'Документ поиска'
+        verbose_name_plural = 'Документы поиска'
+
+    def __str__(self):
+        return str(self.id)
+
+
+class SearchPosting(models.Model):
+    """Вхождение слова в документ запасного поискового индекса."""
+    term = models.CharField(
+        "Слово",
+        max_length=64,
+    )
+    document = models.ForeignKey(
+        SearchDocument,
+        on_delete=models.CASCADE,
+        related_name="postings",
+        verbose_name="Документ"
+    )
+    frequency = models.IntegerField(
+        "Число вхождений",
+    )
+
+    class Meta:
+        verbose_name = 'Вхождение слова'
+        verbose_name_plural = 'Вхождения слов'
+        unique_together = ('term', 'document')
+
+    def __str__(self):
+        return f'{self.term}: {self.document_id}'
@@ -0,0 +1,233 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from . import counters, fulltext, generations, thumbnails, timeline, uploads
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Посты, которые удаляются прямо сейчас. Их комментарии уходят каскадом,
+# и счётчик, поколения и индекс поправляются один раз на пост, а не
+# на каждый комментарий.
+_deleting = threading.local()
+
+
+def _post_deleting(post_id):
+    return post_id in getattr(_deleting, 'posts', ())
+
+
+@receiver(pre_save, sender=Post)
+def post_remember_saved(sender, instance, raw=False, **kwargs):
+    instance._saved_group_id = None
+    instance._saved_image = None
+    if not instance.pk or raw:
+        return
+    loaded = getattr(instance, '_loaded', {})
+    if len(loaded) == 2:
+        instance._saved_group_id = loaded['group_id']
+        instance._saved_image = loaded['image']
+        return
+    instance._saved_group_id, instance._saved_image = (
+        Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image')
+            .first()
+    ) or (None, None)
+
+
+@receiver(post_save, sender=Post)
+def post_remember_loaded(sender, instance, raw=False, **kwargs):
+    instance._loaded = {
+        'group_id': instance.group_id,
+        'image': instance.image.name,
+    }
+
+
+@receiver(post_save, sender=Post)
+def post_fan_out(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_thumbnails(sender, instance, raw=False, **kwargs):
+    if not raw and instance.image:
+        thumbnails.schedule(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def post_release_old_image(sender, instance, raw=False, **kwargs):
+    old_image = getattr(instance, '_saved_image', None)
+    if not raw and old_image and old_image != instance.image.name:
+        transaction.on_commit(lambda: uploads.release(old_image))
+
+
+@receiver(pre_delete, sender=Post)
+def post_cascade_comments(sender, instance, **kwargs):
+    _deleting.posts = getattr(_deleting, 'posts', set()) | {instance.pk}
+    fulltext.remove_comments(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_cascade_done(sender, instance, **kwargs):
+    _deleting.posts = getattr(_deleting, 'posts', set()) - {instance.pk}
+
+
+@receiver(post_delete, sender=Post)
+def post_release_image(sender, instance, **kwargs):
+    name = instance.image.name
+    if name:
+        transaction.on_commit(lambda: uploads.release(name))
+
+
+@receiver(post_save, sender=Post)
+def post_count(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.add(counters.post_scopes(instance), 1)
+        counters.add_stats(instance.author_id, 'posts_count', 1)
+        return
+    old_group_id = getattr(instance, '_saved_group_id', None)
+    if old_group_id != instance.group_id:
+        if old_group_id is not None:
+            counters.add([counters.group_scope(old_group_id)], -1)
+        if instance.group_id is not None:
+            counters.add([counters.group_scope(instance.group_id)], 1)
+
+
+@receiver(post_delete, sender=Post)
+def post_uncount(sender, instance, **kwargs):
+    counters.add(counters.post_scopes(instance), -1)
+    counters.add_stats(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_delete, sender=Group)
+def group_forget(sender, instance, **kwargs):
+    counters.forget(counters.group_scope(instance.pk))
+
+
+@receiver(post_save, sender=Comment)
+def comment_count(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.add_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_uncount(sender, instance, **kwargs):
+    # Счётчик хранится в строке самого поста и уходит вместе с ней.
+    if _post_deleting(instance.post_id):
+        return
+    counters.add_comments(instance.post_id, -1)
+
+
+# Счётчики подписок сдвигаются раньше лент: по followers_count лента
+# решает, раскладывать ли посты автора при записи.
+@receiver(post_save, sender=Follow)
+def follow_count(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.add_stats(instance.author_id, 'followers_count', 1)
+        counters.add_stats(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_backfill(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.subscribe(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_uncount(sender, instance, **kwargs):
+    counters.add_stats(instance.author_id, 'followers_count', -1)
+    counters.add_stats(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_drop(sender, instance, **kwargs):
+    timeline.unsubscribe(instance)
+
+
+def _bump_post(author_id, *group_ids):
+    generations.bump(
+        generations.POSTS,
+        generations.author(author_id),
+        *(
+            generations.group(group_id)
+            for group_id in group_ids
+            if group_id is not None
+        ),
+    )
+
+
+@receiver(post_save, sender=Post)
+def post_invalidate(sender, instance, **kwargs):
+    _bump_post(
+        instance.author_id,
+        instance.group_id,
+        getattr(instance, '_saved_group_id', None),
+    )
+
+
+@receiver(post_delete, sender=Post)
+def post_delete_invalidate(sender, instance, **kwargs):
+    _bump_post(instance.author_id, instance.group_id)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_invalidate(sender, instance, **kwargs):
+    # Число комментариев выводится в карточке поста в каждой ленте;
+    # удаление самого поста сбрасывает их один раз.
+    if _post_deleting(instance.post_id):
+        return
+    post = Post.objects.filter(pk=instance.post_id).values_list(
+        'author_id', 'group_id'
+    ).first()
+    if post is not None:
+        _bump_post(*post)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_invalidate(sender, instance, **kwargs):
+    generations.bump(generations.SITE)
+
+
+@receiver(post_save, sender=User)
+def user_invalidate(sender, instance, created, update_fields=None, **kwargs):
+    # Вход пользователя сохраняет только last_login, ленты от этого
+    # не меняются.
+    if created or update_fields == frozenset(('last_login',)):
+        return
+    generations.bump(generations.SITE)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_invalidate(sender, instance, **kwargs):
+    generations.bump(
+        generations.follows(instance.user_id),
+        generations.followers(instance.author_id),
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Group)
+def search_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        fulltext.index(instance)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Group)
+def search_remove(sender, instance, **kwargs):
+    if sender is Comment and _post_deleting(instance.post_id):
+        return
+    fulltext.remove(instance)
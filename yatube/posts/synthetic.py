@@ -0,0 +1,159 @@
+"""Правдоподобные синтетические данные для нагрузочных прогонов.
+
+Популярность авторов распределена по Ципфу: немногие пишут много и
+собирают почти всех подписчиков, остальные — хвост. Несколько
+«вирусных» авторов вдобавок читает заметная доля всех пользователей,
+так что их подписчиков хватает на переключение ленты на подмешивание.
+Часть постов с картинками: картинок немного, и одинаковые хранятся
+одним файлом, как при настоящих перепостах.
+
+Строки идут в ``bulk.Importer`` потоком, как при загрузке выгрузки.
+"""
+import datetime as dt
+import io
+import random
+from collections import namedtuple
+from itertools import accumulate
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from . import bulk, thumbnails
+from .models import Post
+
+Profile = namedtuple(
+    'Profile',
+    'users groups posts comments follows viral images image_share',
+)
+
+PROFILES = {
+    'small': Profile(50, 5, 500, 1000, 500, 2, 10, 0.3),
+    'medium': Profile(1000, 20, 10000, 30000, 20000, 5, 50, 0.3),
+    'large': Profile(10000, 100, 200000, 500000, 300000, 10, 200, 0.3),
+}
+
+ZIPF_EXPONENT = 1.1
+FOLLOWS_EXPONENT = 1.5
+VIRAL_SHARE = 0.5
+IMAGE_SIZE = (1600, 1000)
+HISTORY = dt.timedelta(days=365)
+
+
+class Generator:
+    def __init__(self, profile, seed=0):
+        self.profile = profile
+        self.random = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(seed)
+        self.usernames = [
+            f'{self.fake.user_name()}{number}'
+            for number in range(profile.users)
+        ]
+        # Первые в списке — самые популярные.
+        self.weights = list(accumulate(
+            1 / rank ** ZIPF_EXPONENT
+            for rank in range(1, profile.users + 1)
+        ))
+        self.slugs = [f'group-{number}' for number in range(profile.groups)]
+        self.now = timezone.now()
+
+    def author(self):
+        return self.random.choices(
+            self.usernames, cum_weights=self.weights
+        )[0]
+
+    def date(self):
+        return (self.now - HISTORY * self.random.random()).isoformat()
+
+    def groups(self):
+        for slug in self.slugs:
+            yield {
+                'slug': slug,
+                'title': self.fake.catch_phrase()[:200],
+                'description': self.fake.paragraph(),
+            }
+
+    def posts(self, images=()):
+        for number in range(1, self.profile.posts + 1):
+            image = ''
+            if images and self.random.random() < self.profile.image_share:
+                image = self.random.choice(images)
+            yield {
+                'id': number,
+                'author': self.author(),
+                'group': (
+                    self.random.choice(self.slugs)
+                    if self.slugs and self.random.random() < 0.7 else None
+                ),
+                'text': self.fake.text(self.random.randint(50, 1500)),
+                'pub_date': self.date(),
+                'image': image,
+            }
+
+    def comments(self):
+        for _ in range(self.profile.comments):
+            yield {
+                # Обсуждают в основном свежее: новые посты с конца.
+                'post': self.profile.posts - int(
+                    self.profile.posts * self.random.random() ** 2
+                ),
+                'author': self.random.choice(self.usernames),
+                'text': self.fake.sentence(),
+                'created': self.date(),
+            }
+
+    def follows(self):
+        viral = self.usernames[:self.profile.viral]
+        for username in self.usernames:
+            for author in viral:
+                if self.random.random() < VIRAL_SHARE:
+                    yield {'user': username, 'author': author}
+        # Сколько авторов читает пользователь — тоже степенной закон.
+        total = 0
+        while total < self.profile.follows:
+            user = self.random.choice(self.usernames)
+            count = min(
+                int(self.random.paretovariate(FOLLOWS_EXPONENT)),
+                self.profile.follows - total,
+            )
+            for _ in range(count):
+                yield {'user': user, 'author': self.author()}
+            total += count
+
+    def images(self):
+        """Сохраняет картинки в хранилище постов; возвращает их имена."""
+        storage = Post._meta.get_field('image').storage
+        names = []
+        for number in range(self.profile.images):
+            color = tuple(self.random.randrange(256) for _ in range(3))
+            image = Image.new('RGB', IMAGE_SIZE, color)
+            noise = Image.effect_noise(IMAGE_SIZE, 40).convert('RGB')
+            image = Image.blend(image, noise, 0.3)
+            output = io.BytesIO()
+            image.save(output, 'JPEG', quality=85)
+            names.append(storage.save(
+                f'posts/synthetic-{number}.jpg',
+                ContentFile(output.getvalue()),
+            ))
+        return names
+
+
+def seed(profile, seed=0, batch_size=1000, draw_thumbnails=True):
+    """Заполняет базу; возвращает {вид: строк}."""
+    generator = Generator(profile, seed)
+    images = generator.images()
+    importer = bulk.Importer(batch_size)
+    totals = {
+        'groups': importer.load('groups', generator.groups()),
+        'posts': importer.load('posts', generator.posts(images)),
+        'comments': importer.load('comments', generator.comments()),
+        'follows': importer.load('follows', generator.follows()),
+    }
+    importer.finish()
+    if draw_thumbnails:
+        for name in images:
+            thumbnails.generate(name)
+    totals['images'] = len(images)
+    return totals
@@ -0,0 +1,19 @@
+from django import template
+
+from .. import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_picture(post):
+    """Готовые варианты картинки поста для <picture> или None.
+
+    Если страница уже разрешила картинки пачкой (``attach_pictures``),
+    берётся готовое, иначе — отдельный поход в KV-хранилище.
+    """
+    if not post.image:
+        return None
+    if hasattr(post, 'picture'):
+        return post.picture
+    return thumbnails.picture(post.image)
@@ -0,0 +1,218 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+LOCMEM = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+
+@override_settings(CACHES=LOCMEM, POSTS_ON_PAGE=2)
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Новости', slug='news', description='Свежее'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author,
+                group=cls.group if number % 2 else None,
+                text=f'Пост {number}',
+            )
+            for number in range(5)
+        ]
+        cls.comment = Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Первый'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def send(self, client, method, url, data):
+        return getattr(client, method)(
+            url, json.dumps(data), content_type='application/json'
+        )
+
+    def test_cursor_walks_all_posts(self):
+        """Курсор проходит все посты по одному разу, от новых к старым"""
+        url = reverse('posts:api_post_list')
+        seen = []
+        response = self.client.get(url)
+        while True:
+            data = response.json()
+            seen.extend(post['id'] for post in data['results'])
+            if data['next_cursor'] is None:
+                break
+            response = self.client.get(url, {'cursor': data['next_cursor']})
+        self.assertEqual(
+            seen, [post.pk for post in reversed(self.posts)]
+        )
+
+    def test_filters_reuse_feeds(self):
+        """Фильтры по группе и автору отдают посты этой ленты"""
+        response = self.client.get(
+            reverse('posts:api_post_list'), {'group': 'news', 'limit': 10}
+        )
+        self.assertEqual(
+            [post['group'] for post in response.json()['results']],
+            ['news', 'news'],
+        )
+        response = self.client.get(
+            reverse('posts:api_post_list'), {'author': 'reader'}
+        )
+        self.assertEqual(response.json()['results'], [])
+
+    def test_sparse_fields_narrow_query(self):
+        """?fields= оставляет только нужные поля и колонки в SELECT"""
+        with self.assertNumQueries(1) as context:
+            response = self.client.get(
+                reverse('posts:api_post_list'), {'fields': 'id,author'}
+            )
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'author'})
+        sql = context.captured_queries[0]['sql']
+        self.assertIn('"auth_user"."username"', sql)
+        self.assertNotIn('"posts_post"."text"', sql)
+        self.assertNotIn('posts_group', sql)
+        response = self.client.get(
+            reverse('posts:api_post_list'), {'fields': 'id,password'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_not_modified_until_change(self):
+        """Повторный GET с ETag — 304 без запросов, после правки — 200"""
+        url = reverse('posts:api_post_detail', args=(self.posts[0].pk,))
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.send(self.author_client, 'patch', url, {'text': 'Правка'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['text'], 'Правка')
+
+    def test_create_edit_delete_post(self):
+        """Автор создаёт, правит и удаляет пост, чужой — нет"""
+        url = reverse('posts:api_post_list')
+        self.assertEqual(
+            self.send(self.client, 'post', url, {'text': 'Аноним'})
+                .status_code,
+            401,
+        )
+        response = self.send(
+            self.author_client, 'post', url,
+            {'text': 'Через API', 'group': 'news'},
+        )
+        self.assertEqual(response.status_code, 201)
+        created = response.json()
+        self.assertEqual(created['group'], 'news')
+        detail = reverse('posts:api_post_detail', args=(created['id'],))
+        response = self.send(self.reader_client, 'patch', detail, {
+            'text': 'Чужая правка',
+        })
+        self.assertEqual(response.status_code, 403)
+        response = self.send(self.author_client, 'patch', detail, {
+            'group': None,
+        })
+        self.assertEqual(response.json()['group'], None)
+        self.assertEqual(response.json()['text'], 'Через API')
+        response = self.send(
+            self.author_client, 'post', url, {'group': 'nowhere'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('group', response.json()['errors'])
+        self.assertEqual(self.author_client.delete(detail).status_code, 204)
+        self.assertFalse(Post.objects.filter(pk=created['id']).exists())
+
+    def test_comments(self):
+        """Комментарии листаются курсором и добавляются"""
+        url = reverse('posts:api_comment_list', args=(self.posts[0].pk,))
+        response = self.send(
+            self.author_client, 'post', url, {'text': 'Второй'}
+        )
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get(url, {'limit': 1})
+        self.assertEqual(response.json()['results'][0]['text'], 'Второй')
+        response = self.client.get(
+            url, {'cursor': response.json()['next_cursor']}
+        )
+        self.assertEqual(response.json()['results'][0]['text'], 'Первый')
+        self.assertEqual(
+            self.author_client.delete(reverse(
+                'posts:api_comment_detail', args=(self.comment.pk,)
+            )).status_code,
+            403,
+        )
+
+    def test_groups(self):
+        """Группы отдаются списком и по слагу"""
+        response = self.client.get(reverse('posts:api_group_list'))
+        self.assertEqual(
+            [group['slug'] for group in response.json()['results']],
+            ['news'],
+        )
+        response = self.client.get(
+            reverse('posts:api_group_detail', args=('missing',))
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'detail': 'Не найдено'})
+
+    def test_follow_and_unfollow(self):
+        """Подписка и отписка через API"""
+        url = reverse('posts:api_follow_list')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        response = self.send(
+            self.reader_client, 'post', url, {'author': 'writer'}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.author
+        ).exists())
+        response = self.reader_client.get(url)
+        self.assertEqual(
+            [follow['author'] for follow in response.json()['results']],
+            ['writer'],
+        )
+        response = self.reader_client.delete(
+            reverse('posts:api_follow_detail', args=('writer',))
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+
+    def test_writes_need_csrf_token(self):
+        """Запись без входа — JSON 401, без токена CSRF — JSON 403"""
+        url = reverse('posts:api_post_list')
+        anonymous = Client(enforce_csrf_checks=True)
+        response = self.send(anonymous, 'post', url, {'text': 'Аноним'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'detail': 'Нужно войти'})
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.author)
+        response = self.send(client, 'post', url, {'text': 'Без токена'})
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('CSRF', response.json()['detail'])
+        client.get(reverse('posts:post_create'))
+        token = client.cookies[settings.CSRF_COOKIE_NAME].value
+        response = client.post(
+            url, json.dumps({'text': 'С токеном'}),
+            content_type='application/json', HTTP_X_CSRFTOKEN=token,
+        )
+        self.assertEqual(response.status_code, 201)
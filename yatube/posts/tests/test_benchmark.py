@@ -0,0 +1,70 @@
+import json
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count
+from django.test import TestCase, override_settings
+
+from .. import benchmark, synthetic
+from ..models import Comment, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+TINY = synthetic.Profile(
+    users=20, groups=2, posts=40, comments=30, follows=30, viral=1,
+    images=2, image_share=0.5,
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.totals = synthetic.seed(TINY, seed=1, batch_size=7)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_seed_follows_profile(self):
+        """Синтетика соответствует профилю, вирусный автор впереди"""
+        self.assertEqual(Post.objects.count(), TINY.posts)
+        self.assertEqual(Comment.objects.count(), TINY.comments)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        most_followed = (
+            User.objects
+                .annotate(followers=Count('following'))
+                .order_by('-followers')
+                .first()
+        )
+        viral = synthetic.Generator(TINY, seed=1).usernames[0]
+        self.assertEqual(most_followed.username, viral)
+
+    def test_run_reports_every_scenario(self):
+        """Прогон отдаёт по сценарию перцентили, запросы и память"""
+        result = benchmark.run(iterations=2, warmup=0, memory_iterations=1)
+        json.dumps(result)
+        self.assertEqual(
+            [scenario['name'] for scenario in result['scenarios']],
+            [scenario.name for scenario in benchmark.SCENARIOS],
+        )
+        for scenario in result['scenarios']:
+            self.assertEqual(
+                set(scenario['latency_ms']),
+                {'p50', 'p90', 'p95', 'p99', 'mean', 'max'},
+            )
+            self.assertGreater(scenario['queries']['max'], 0)
+            self.assertTrue(set(scenario['status']) <= {'200', '302'})
+
+    def test_percentile_nearest_rank(self):
+        """Перцентиль берётся по ближайшему рангу"""
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile([7], 90), 7)
@@ -0,0 +1,156 @@
+import csv
+import datetime as dt
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .. import bulk, counters
+from ..models import Comment, Follow, Group, Post, PostCounter, Timeline
+
+User = get_user_model()
+
+PUB_DATE = timezone.make_aware(dt.datetime(2020, 5, 17, 12, 30))
+
+
+class BulkImportExportTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.author = User.objects.create_user(username='writer')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='bulk', description='Описание'
+        )
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Текст, с "кавычками"'
+        )
+        Post.objects.filter(pk=self.post.pk).update(pub_date=PUB_DATE)
+        Post.objects.create(author=self.reader, text='Второй\nпост')
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def round_trip(self, format_):
+        call_command(
+            'export_data', self.directory, format=format_, batch_size=1,
+            stdout=StringIO(),
+        )
+        self.assertTrue(
+            os.path.exists(os.path.join(self.directory, f'posts.{format_}'))
+        )
+        Group.objects.all().delete()
+        User.objects.all().delete()
+        call_command(
+            'import_data', self.directory, batch_size=1, stdout=StringIO()
+        )
+
+    def assert_restored(self):
+        self.assertEqual(Post.objects.count(), 2)
+        post = Post.objects.get(group__slug='bulk')
+        self.assertEqual(post.text, 'Текст, с "кавычками"')
+        self.assertEqual(post.author.username, 'writer')
+        self.assertEqual(post.pub_date, PUB_DATE)
+        self.assertTrue(Post.objects.filter(text='Второй\nпост').exists())
+        comment = Comment.objects.get()
+        self.assertEqual(comment.post, post)
+        self.assertEqual(comment.author.username, 'reader')
+        follow = Follow.objects.get()
+        self.assertEqual(follow.user.username, 'reader')
+        self.assertFalse(follow.user.has_usable_password())
+
+    def test_jsonl_round_trip(self):
+        """Данные переживают выгрузку и загрузку в JSON Lines"""
+        self.round_trip('jsonl')
+        self.assert_restored()
+
+    def test_csv_round_trip(self):
+        """Данные переживают выгрузку и загрузку в CSV"""
+        limit = csv.field_size_limit()
+        self.round_trip('csv')
+        self.assert_restored()
+        self.assertEqual(csv.field_size_limit(), limit)
+
+    def test_live_posts_during_import(self):
+        """Пост, созданный во время загрузки, не занимает её ключи"""
+        importer = bulk.Importer()
+        live = Post.objects.create(author=self.author, text='Вживую')
+        importer.load('posts', [{
+            'id': '7',
+            'author': 'writer',
+            'text': 'Из выгрузки',
+            'pub_date': PUB_DATE.isoformat(),
+        }])
+        post = Post.objects.get(pk=importer.posts[7])
+        self.assertNotEqual(post.pk, live.pk)
+        self.assertEqual(post.text, 'Из выгрузки')
+        self.assertEqual(post.pub_date, PUB_DATE)
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+
+    def test_dates_restored_in_batches(self):
+        """Даты большой пачки возвращаются в пределе параметров SQLite"""
+        importer = bulk.Importer()
+        with CaptureQueriesContext(connection) as context:
+            importer.load('posts', [
+                {
+                    'id': str(number),
+                    'author': 'writer',
+                    'text': f'Пост {number}',
+                    'pub_date': PUB_DATE.isoformat(),
+                }
+                for number in range(500)
+            ])
+        self.assertEqual(
+            Post.objects.filter(pub_date=PUB_DATE).count(), 501
+        )
+        # На строку три параметра: ключ в IN, ключ и дата в WHEN.
+        updates = [
+            query['sql'].count(' WHEN ') * 3
+            for query in context.captured_queries
+            if query['sql'].startswith('UPDATE')
+        ]
+        self.assertGreater(len(updates), 1)
+        self.assertLessEqual(
+            max(updates), connection.features.max_query_params
+        )
+
+    def test_failed_finish_keeps_derived_data(self):
+        """Сбой пересчёта не оставляет сайт без счётчиков и лент"""
+        counters.get_stats(self.author.pk)
+        counters.get_count(counters.ALL)
+        timelines = Timeline.objects.count()
+        importer = bulk.Importer()
+        with mock.patch.object(
+            bulk.fulltext, 'rebuild', side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                importer.finish()
+        self.assertTrue(PostCounter.objects.exists())
+        self.assertEqual(Timeline.objects.count(), timelines)
+
+    def test_derived_data_rebuilt(self):
+        """После загрузки пересчитаны счётчики и ленты"""
+        self.round_trip('jsonl')
+        post = Post.objects.get(group__slug='bulk')
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(counters.get_stats(post.author_id).posts_count, 1)
+        reader = User.objects.get(username='reader')
+        self.assertEqual(
+            list(Timeline.objects.filter(user=reader).values_list(
+                'post', flat=True
+            )),
+            [post.pk],
+        )
+        new = Post.objects.create(author=reader, text='После загрузки')
+        self.assertGreater(new.pk, post.pk)
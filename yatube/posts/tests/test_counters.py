@@ -0,0 +1,262 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import counters
+from ..forms import PostForm
+from ..models import (
+    Comment, Follow, Group, Post, PostCounter, UserStats
+)
+from ..utils import CursorPaginator
+
+User = get_user_model()
+
+
+class PostCounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='counter')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Счёт',
+            slug='count',
+            description='Считаем посты',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая',
+            slug='other',
+            description='Ещё одна группа',
+        )
+        Post.objects.create(author=cls.author, text='Первый', group=cls.group)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def scopes(self):
+        return (
+            counters.ALL,
+            counters.group_scope(self.group.pk),
+        )
+
+    def assertCountersMatch(self):
+        for scope in self.scopes():
+            with self.subTest(scope=scope):
+                self.assertEqual(
+                    PostCounter.objects.get(scope=scope).value,
+                    counters._scope_posts(scope).count(),
+                )
+
+    def test_counter_created_lazily(self):
+        """Незаведённый счётчик считается один раз и сохраняется"""
+        PostCounter.objects.all().delete()
+        for scope in self.scopes():
+            counters.get_count(scope)
+        self.assertCountersMatch()
+
+    def test_write_creates_missing_counter(self):
+        """Запись заводит недостающий счётчик, а чтение его не затирает"""
+        PostCounter.objects.all().delete()
+        stale = Post.objects.count()
+        Post.objects.create(author=self.author, text='Рядом', group=self.group)
+        self.assertCountersMatch()
+        PostCounter.objects.get_or_create(
+            scope=counters.ALL, defaults={'value': stale}
+        )
+        self.assertCountersMatch()
+        PostCounter.objects.filter(scope=counters.ALL).update(value=stale)
+        counters._upsert(counters.ALL, stale + 1, 1)
+        self.assertEqual(
+            PostCounter.objects.get(scope=counters.ALL).value, stale + 1
+        )
+
+    def test_edit_does_not_reread_post(self):
+        """Сохранение прочитанного поста не перечитывает группу и картинку"""
+        post = Post.objects.get(text='Первый')
+        post.group = self.other_group
+        with CaptureQueriesContext(connection) as context:
+            post.save()
+        self.assertFalse([
+            query for query in context.captured_queries
+            if query['sql'].startswith('SELECT "posts_post"."group_id"')
+        ])
+        self.assertEqual(
+            counters.get_count(counters.group_scope(self.other_group.pk)), 1
+        )
+        post.group = self.group
+        post.save()
+        self.assertCountersMatch()
+
+    def test_counters_follow_create_edit_and_delete(self):
+        """Счётчики сдвигаются при создании, смене группы и удалении"""
+        for scope in self.scopes():
+            counters.get_count(scope)
+        post = Post.objects.create(
+            author=self.author, text='Второй', group=self.group
+        )
+        self.assertCountersMatch()
+        counters.get_count(counters.group_scope(self.other_group.pk))
+        post.group = self.other_group
+        post.save()
+        self.assertCountersMatch()
+        self.assertEqual(
+            counters.get_count(counters.group_scope(self.other_group.pk)), 1
+        )
+        post.delete()
+        self.assertCountersMatch()
+
+    def test_feed_count_sums_followed_authors(self):
+        """Счётчик ленты — сумма счётчиков авторов из подписок"""
+        Post.objects.create(author=self.author, text='Ещё')
+        self.assertEqual(
+            counters.get_count(counters.feed_scope(self.reader.pk)), 2
+        )
+        self.assertEqual(
+            counters.get_count(counters.feed_scope(self.author.pk)), 0
+        )
+
+    @override_settings(POSTS_ON_PAGE=1, PAGE_CACHE_TIMEOUT=0)
+    def test_numbered_page_uses_counter(self):
+        """Номерная страница не делает COUNT(*) по постам"""
+        counters.get_count(counters.ALL)
+        client = Client()
+        client.get(reverse('posts:index'), {'page': 1})
+        PostCounter.objects.filter(scope=counters.ALL).update(value=3)
+        cache.clear()
+        response = client.get(reverse('posts:index'), {'page': 1})
+        self.assertEqual(response.context['page_obj'].paginator.count, 3)
+
+
+class PageWindowTests(TestCase):
+    def test_window_elides_far_pages(self):
+        """Вместо тысяч ссылок выводится окно вокруг текущей страницы"""
+        paginator = CursorPaginator(range(1000), 10)
+        self.assertEqual(
+            list(paginator.page_window(50)),
+            [1, None, 48, 49, 50, 51, 52, None, 100],
+        )
+        self.assertEqual(
+            list(paginator.page_window(2)),
+            [1, 2, 3, 4, None, 100],
+        )
+        self.assertEqual(
+            list(CursorPaginator(range(30), 10).page_window(2)), [1, 2, 3]
+        )
+
+
+class UserStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def stats(self, user):
+        return UserStats.objects.get(pk=user.pk)
+
+    def test_stats_follow_posts_and_follows(self):
+        """Статистика профиля обновляется сигналами"""
+        counters.get_stats(self.author.pk)
+        counters.get_stats(self.reader.pk)
+        self.client.get(
+            reverse('posts:profile_follow', args=(self.author.username,))
+        )
+        Post.objects.create(author=self.author, text='Ещё пост')
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.client.get(
+            reverse('posts:profile_unfollow', args=(self.author.username,))
+        )
+        self.post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_profile_header_reads_stats(self):
+        """Шапка профиля выводит счётчики из статистики"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(
+            reverse('posts:profile', args=(self.author.username,))
+        )
+        self.assertEqual(response.context['stats'].followers_count, 1)
+        self.assertContains(response, 'Подписчиков: 1')
+        self.assertContains(response, 'Всего записей: 1')
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        self.assertContains(response, 'Всего постов у автора: 1')
+
+    def test_rebuild_command(self):
+        """Команда rebuild_counters исправляет разъехавшиеся счётчики"""
+        counters.get_stats(self.author.pk)
+        UserStats.objects.update(posts_count=100)
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.reader).posts_count, 0)
+
+
+class CommentCounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='commentator')
+        cls.post = Post.objects.create(author=cls.author, text='Обсудим')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def comments_count(self):
+        return Post.objects.get(pk=self.post.pk).comments_count
+
+    def test_add_and_delete_comment_update_counter(self):
+        """add_comment и comment_delete двигают счётчик комментариев"""
+        self.client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            {'text': 'Первый!'},
+        )
+        self.assertEqual(self.comments_count(), 1)
+        comment = Comment.objects.get(post=self.post)
+        self.client.get(reverse('posts:comment_delete', args=(comment.pk,)))
+        self.assertEqual(self.comments_count(), 0)
+
+    def test_edit_keeps_comment_counter(self):
+        """Правка поста формой и через API не затирает счётчик комментариев"""
+        form = PostForm({'text': 'Исправлено'}, instance=self.post)
+        self.assertTrue(form.is_valid())
+        Comment.objects.create(post=self.post, author=self.author, text='Да')
+        form.save()
+        self.assertEqual(self.comments_count(), 1)
+        post = Post.objects.get(pk=self.post.pk)
+        Comment.objects.create(post=post, author=self.author, text='Ещё')
+        response = self.client.generic(
+            'PATCH',
+            reverse('posts:api_post_detail', args=(post.pk,)),
+            '{"text": "Снова"}',
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.comments_count(), 2)
+
+    def test_feed_shows_comment_counts_without_extra_queries(self):
+        """Лента выводит число комментариев без запроса на каждый пост"""
+        for number in range(3):
+            Comment.objects.create(
+                post=self.post, author=self.author, text=f'№{number}'
+            )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Комментариев: 3')
+        url = reverse('posts:profile', args=(self.author.username,))
+        self.client.get(url)
+        with self.assertNumQueries(6):
+            self.client.get(url)
@@ -208,6 +208,7 @@ class PostCreateFormTests(TestCase):
         self.assertTrue(
             Post.objects.filter(
                 text=form_data['text'],
-                image=f"posts/{form_data['image']}"
+                image__startswith='posts/',
+                image__endswith='.gif',
             ).exists()
         )
@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import generations
+from ..models import Follow, Group, Post
+from ..timeline import switch_to_pull
+
+User = get_user_model()
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.POSTS_COUNT = 25
+        cls.author = User.objects.create_user(username='cursor')
+        cls.celebrity = User.objects.create_user(username='celebrity')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Курсоры',
+            slug='cursors',
+            description='Листаем без OFFSET',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.celebrity)
+        for number in range(cls.POSTS_COUNT):
+            Post.objects.create(
+                text=f'Пост №{number}',
+                author=cls.celebrity if number % 3 else cls.author,
+                group=cls.group,
+            )
+        switch_to_pull(cls.celebrity.pk)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def walk(self, url):
+        """Проходит ленту по курсорам вперёд, возвращает страницы"""
+        pages = []
+        response = self.client.get(url)
+        while True:
+            page = response.context['page_obj']
+            pages.append(page)
+            if not page.next_cursor:
+                return pages
+            response = self.client.get(url, {'cursor': page.next_cursor})
+
+    def test_cursor_walk_covers_every_post_once(self):
+        """По курсорам видны все посты ленты ровно один раз и по порядку"""
+        expected = list(
+            Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True
+            )
+        )
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=(self.group.slug,)),
+            reverse('posts:follow_index'),
+        ):
+            with self.subTest(url=url):
+                pages = self.walk(url)
+                seen = [post.pk for page in pages for post in page]
+                self.assertEqual(seen, expected)
+                self.assertEqual(len(pages[0]), settings.POSTS_ON_PAGE)
+                self.assertFalse(pages[0].has_previous())
+                self.assertTrue(pages[-1].has_previous())
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Курсор назад возвращает ту же страницу, с которой пришли"""
+        url = reverse('posts:index')
+        first, second = self.walk(url)[:2]
+        response = self.client.get(url, {'cursor': second.previous_cursor})
+        page = response.context['page_obj']
+        self.assertEqual(list(page), list(first))
+        self.assertTrue(page.has_next())
+
+    def test_page_number_fallback(self):
+        """Старые ссылки ?page=N продолжают работать"""
+        response = self.client.get(reverse('posts:index'), {'page': 3})
+        page = response.context['page_obj']
+        self.assertEqual(page.number, 3)
+        self.assertEqual(
+            len(page), self.POSTS_COUNT - 2 * settings.POSTS_ON_PAGE
+        )
+        self.assertContains(response, '?page=2')
+
+    def test_bad_cursor_shows_first_page(self):
+        """Испорченный курсор не ломает страницу"""
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': 'не-курсор'}
+        )
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    @override_settings(POSTS_ON_PAGE=5, PAGE_CACHE_TIMEOUT=0)
+    def test_cursor_page_has_constant_query_count(self):
+        """Глубокая страница стоит столько же запросов, что и первая"""
+        url = reverse('posts:group_posts', args=(self.group.slug,))
+        last = self.walk(url)[-2]
+        for params in ({}, {'cursor': last.next_cursor}):
+            # Новое поколение группы: фрагмент ленты собирается заново.
+            generations.bump(generations.group(self.group.pk))
+            with self.assertNumQueries(5):
+                self.client.get(url, params)
@@ -0,0 +1,168 @@
+import re
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+# Полный проход по таблице без индекса и сортировка во временном дереве.
+FULL_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE')
+# Запрос без условий и порядка — это намеренный список всей таблицы
+# (например, варианты групп в форме поста), индекс ему не нужен.
+WHOLE_TABLE = re.compile(r'\b(WHERE|ORDER BY|LIMIT)\b')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryPlanTests(TestCase):
+    """Каждый запрос каждой view из posts.views идёт по индексу"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='planner')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Планы',
+            slug='plans',
+            description='EXPLAIN QUERY PLAN',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author,
+            group=cls.group,
+            text='Пост с планом',
+            image=SimpleUploadedFile(
+                name='small.gif', content=SMALL_GIF, content_type='image/gif'
+            ),
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndexes(self, name, request):
+        with CaptureQueriesContext(connection) as context:
+            request()
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.startswith(('SELECT', 'UPDATE', 'DELETE')):
+                continue
+            for step in self.explain(sql):
+                with self.subTest(view=name, sql=sql, plan=step):
+                    self.assertIsNone(TEMP_SORT.search(step))
+                    if WHOLE_TABLE.search(sql):
+                        self.assertIsNone(FULL_SCAN.search(step))
+
+    def test_read_views_use_indexes(self):
+        """Ленты, профиль и страница поста читают по индексам"""
+        views = (
+            ('posts:index', None, {}),
+            ('posts:index', None, {'page': 1}),
+            ('posts:group_posts', (self.group.slug,), {}),
+            ('posts:group_posts', (self.group.slug,), {'page': 1}),
+            ('posts:profile', (self.author.username,), {}),
+            ('posts:profile', (self.author.username,), {'page': 1}),
+            ('posts:post_detail', (self.post.pk,), {}),
+            ('posts:follow_index', None, {}),
+            ('posts:follow_index', None, {'page': 1}),
+        )
+        for name, args, params in views:
+            url = reverse(name, args=args)
+            self.assertUsesIndexes(
+                name, lambda: self.reader_client.get(url, params)
+            )
+
+    def test_cursor_pages_use_indexes(self):
+        """Страницы по курсору тоже идут по индексам"""
+        for number in range(settings.POSTS_ON_PAGE):
+            Post.objects.create(
+                author=self.author, group=self.group, text=f'№{number}'
+            )
+        for name, args in (
+            ('posts:index', None),
+            ('posts:group_posts', (self.group.slug,)),
+            ('posts:profile', (self.author.username,)),
+            ('posts:follow_index', None),
+        ):
+            url = reverse(name, args=args)
+            page = self.reader_client.get(url).context['page_obj']
+            self.assertUsesIndexes(
+                name,
+                lambda: self.reader_client.get(
+                    url, {'cursor': page.next_cursor}
+                ),
+            )
+
+    def test_write_views_use_indexes(self):
+        """Создание, правка, удаление и подписки работают по индексам"""
+        post_url = reverse('posts:post_detail', args=(self.post.pk,))
+        views = (
+            ('posts:post_create', lambda: self.author_client.get(
+                reverse('posts:post_create')
+            )),
+            ('posts:post_create', lambda: self.author_client.post(
+                reverse('posts:post_create'),
+                {'text': 'Новый', 'group': self.group.pk},
+            )),
+            ('posts:post_edit', lambda: self.author_client.post(
+                reverse('posts:post_edit', args=(self.post.pk,)),
+                {'text': 'Правка', 'group': self.group.pk},
+            )),
+            ('posts:add_comment', lambda: self.reader_client.post(
+                reverse('posts:add_comment', args=(self.post.pk,)),
+                {'text': 'Ещё комментарий'},
+            )),
+            ('posts:comment_delete', lambda: self.reader_client.get(
+                reverse('posts:comment_delete', args=(self.comment.pk,))
+            )),
+            ('posts:profile_unfollow', lambda: self.reader_client.get(
+                reverse('posts:profile_unfollow', args=(self.author.username,))
+            )),
+            ('posts:profile_follow', lambda: self.reader_client.get(
+                reverse('posts:profile_follow', args=(self.author.username,))
+            )),
+            ('posts:post_delete', lambda: self.author_client.get(
+                reverse('posts:post_delete', args=(self.post.pk,))
+            )),
+            ('posts:post_detail', lambda: self.reader_client.get(post_url)),
+        )
+        for name, request in views:
+            self.assertUsesIndexes(name, request)
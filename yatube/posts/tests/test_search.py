@@ -0,0 +1,177 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import fulltext
+from ..models import Comment, Group, Post, SearchPosting
+
+User = get_user_model()
+
+
+class SearchMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='searcher')
+        cls.group = Group.objects.create(
+            title='Коты',
+            slug='cats',
+            description='Всё о домашних животных',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            group=cls.group,
+            text='Мой кот спит на клавиатуре',
+        )
+        cls.other_post = Post.objects.create(
+            author=cls.author,
+            text='Коты и собаки: коты спят больше собак',
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.post,
+            author=cls.author,
+            text='Собаки тоже спят',
+        )
+
+    def found(self, query, **kwargs):
+        hits, _ = fulltext.search(query, **kwargs)
+        return [(hit.kind, hit.object.pk) for hit in hits]
+
+    def test_finds_posts_comments_and_groups(self):
+        """Поиск идёт по постам, комментариям и группам"""
+        self.assertEqual(self.found('клавиатуре'), [('post', self.post.pk)])
+        self.assertEqual(
+            self.found('тоже'), [('comment', self.comment.pk)]
+        )
+        self.assertEqual(self.found('домашних'), [('group', self.group.pk)])
+        self.assertCountEqual(self.found('собаки спят'), [
+            ('comment', self.comment.pk),
+            ('post', self.other_post.pk),
+        ])
+        self.assertEqual(self.found('   '), [])
+
+    def test_title_ranks_above_text(self):
+        """Совпадение в заголовке группы выше совпадения в тексте"""
+        self.assertEqual(self.found('коты')[0], ('group', self.group.pk))
+        self.assertIn(('post', self.other_post.pk), self.found('коты'))
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при правке и удалении"""
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Теперь про попугаев'
+        post.save()
+        self.assertEqual(self.found('клавиатуре'), [])
+        self.assertEqual(self.found('попугаев'), [('post', self.post.pk)])
+        post.delete()
+        self.assertEqual(self.found('попугаев'), [])
+        self.assertEqual(self.found('тоже'), [])
+
+    def test_post_delete_drops_comments_at_once(self):
+        """Удаление поста убирает его комментарии из индекса разом"""
+        def delete_queries(comments):
+            post = Post.objects.create(author=self.author, text='Снос')
+            for _ in range(comments):
+                Comment.objects.create(
+                    post=post, author=self.author, text='Под снос'
+                )
+            with CaptureQueriesContext(connection) as context:
+                post.delete()
+            return len(context)
+
+        self.assertEqual(delete_queries(20), delete_queries(1))
+        self.assertEqual(fulltext.search('снос')[0], [])
+
+    def test_cursor_pagination(self):
+        """Курсор ведёт по ранжированной выдаче без повторов"""
+        for number in range(5):
+            Post.objects.create(author=self.author, text=f'лемур {number}')
+        seen = []
+        hits, cursor = fulltext.search('лемур', limit=2)
+        seen += hits
+        while cursor:
+            hits, cursor = fulltext.search('лемур', cursor, limit=2)
+            seen += hits
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len({hit.object.pk for hit in seen}), 5)
+        ranks = [(hit.rank, hit.object.pk) for hit in seen]
+        self.assertEqual(ranks, sorted(ranks))
+
+    def test_rebuild_command(self):
+        """rebuild_search_index строит индекс с нуля"""
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.found('клавиатуре'), [('post', self.post.pk)])
+
+    def test_views(self):
+        """Страница поиска и JSON API отдают найденное"""
+        client = Client()
+        response = client.get(reverse('posts:search'), {'q': 'клавиатуре'})
+        self.assertEqual(list(response.context['hits'])[0].object, self.post)
+        self.assertContains(response, 'Мой кот спит')
+        response = client.get(reverse('posts:search_api'), {'q': 'тоже'})
+        results = response.json()['results']
+        self.assertEqual(results[0]['type'], 'comment')
+        self.assertEqual(
+            results[0]['url'],
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        )
+        self.assertIsNone(response.json()['next_cursor'])
+
+    def test_api_cached_until_posts_change(self):
+        """Ответ API поиска кэшируется до новой записи"""
+        client = Client()
+        cache.clear()
+
+        def found():
+            response = client.get(reverse('posts:search_api'), {'q': 'сова'})
+            return [result['id'] for result in response.json()['results']]
+
+        self.assertEqual(found(), [])
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(found(), [])
+        self.assertEqual(len(context), 0)
+        post = Post.objects.create(author=self.author, text='Сова')
+        self.assertEqual(found(), [post.pk])
+
+    def test_search_page_resolves_pictures_in_one_batch(self):
+        """Число запросов страницы поиска не растёт с числом картинок"""
+        client = Client()
+
+        def queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                client.get(reverse('posts:search'), {'q': 'снимок'})
+            return len(context)
+
+        Post.objects.create(
+            author=self.author, text='Снимок', image='posts/search-0.jpg'
+        )
+        single = queries()
+        for number in range(1, 8):
+            Post.objects.create(
+                author=self.author,
+                text='Снимок',
+                image=f'posts/search-{number}.jpg',
+            )
+        self.assertEqual(queries(), single)
+
+
+class FTSSearchTests(SearchMixin, TestCase):
+    def test_uses_fts(self):
+        """В SQLite поиск идёт через FTS5"""
+        self.assertTrue(fulltext.fts_available())
+
+
+@override_settings(SEARCH_BACKEND='python')
+class PythonSearchTests(SearchMixin, TestCase):
+    def test_uses_python_index(self):
+        """Запасной индекс хранится в таблицах"""
+        self.assertFalse(fulltext.fts_available())
+        self.assertTrue(
+            SearchPosting.objects.filter(term='клавиатуре').exists()
+        )
@@ -0,0 +1,151 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from .. import thumbnails
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_RELEASE_GRACE=0)
+class ContentAddressedStorageTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reposter')
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name):
+        self.client.post(reverse('posts:post_create'), {
+            'text': name,
+            'image': SimpleUploadedFile(name, SMALL_GIF, 'image/gif'),
+        })
+        return Post.objects.get(text=name)
+
+    def test_same_image_stored_once(self):
+        """Одинаковые картинки под разными именами — один файл"""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith('posts/'))
+        files = [
+            name for _, _, names in os.walk(
+                os.path.join(TEMP_MEDIA_ROOT, 'posts')
+            )
+            for name in names
+        ]
+        self.assertEqual(len(files), 1)
+        self.assertEqual(
+            thumbnails.lookup(first.image).name,
+            thumbnails.lookup(second.image).name,
+        )
+
+    def test_file_deleted_with_last_reference(self):
+        """Файл и миниатюры удаляются вместе с последним постом"""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        path = first.image.path
+        thumbnail_path = os.path.join(
+            TEMP_MEDIA_ROOT, thumbnails.lookup(first.image).name
+        )
+        self.assertTrue(os.path.exists(thumbnail_path))
+        self.client.get(reverse('posts:post_delete', args=(first.pk,)))
+        self.assertTrue(os.path.exists(path))
+        self.client.get(reverse('posts:post_delete', args=(second.pk,)))
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(thumbnail_path))
+
+    def test_replaced_image_released(self):
+        """Заменённая при правке картинка удаляется, если не нужна"""
+        post = self.create_post('first.gif')
+        path = post.image.path
+        self.client.post(reverse('posts:post_edit', args=(post.pk,)), {
+            'text': 'Без картинки',
+            'image-clear': 'on',
+        })
+        self.assertFalse(os.path.exists(path))
+
+    def test_recent_file_kept_until_collected(self):
+        """Свежую картинку удаляет не пост, а collect_images"""
+        post = self.create_post('first.gif')
+        path = post.image.path
+        with self.settings(IMAGE_RELEASE_GRACE=60):
+            self.client.get(reverse('posts:post_delete', args=(post.pk,)))
+            self.assertTrue(os.path.exists(path))
+            call_command('collect_images', stdout=StringIO())
+            self.assertTrue(os.path.exists(path))
+        stdout = StringIO()
+        call_command('collect_images', stdout=stdout)
+        self.assertFalse(os.path.exists(path))
+        self.assertIn('1', stdout.getvalue())
+
+    def test_upload_during_release_keeps_file(self):
+        """Загрузка тех же байтов во время удаления не теряет файл"""
+        storage = Post._meta.get_field('image').storage
+        name = storage.save('posts/first.gif', ContentFile(SMALL_GIF))
+
+        def upload_meanwhile():
+            # Пост из параллельного запроса ещё не сохранён.
+            self.assertEqual(
+                storage.save('posts/again.gif', ContentFile(SMALL_GIF)),
+                name,
+            )
+            return False
+
+        self.assertTrue(storage.delete_unused(name, upload_meanwhile, 0))
+        self.assertTrue(storage.exists(name))
+        old = time.time() - 60
+        os.utime(storage.path(name), (old, old))
+        storage.save('posts/again.gif', ContentFile(SMALL_GIF))
+        self.assertFalse(storage.delete_unused(name, lambda: False, 30))
+        self.assertTrue(storage.exists(name))
+
+    def test_concurrent_upload_reuses_name(self):
+        """Загрузка, не заставшая файл, пишет его под тем же именем"""
+        storage = Post._meta.get_field('image').storage
+        name = storage.save('posts/first.gif', ContentFile(SMALL_GIF))
+        # Вторая загрузка проверила файл до того, как первая его записала.
+        with mock.patch('os.utime', side_effect=FileNotFoundError):
+            self.assertEqual(
+                storage.save('posts/again.gif', ContentFile(SMALL_GIF)),
+                name,
+            )
+        self.assertEqual(
+            os.listdir(os.path.dirname(storage.path(name))),
+            [os.path.basename(name)],
+        )
+
+    def test_long_name_rejected(self):
+        """Имя длиннее max_length поля не сохраняется"""
+        storage = Post._meta.get_field('image').storage
+        with self.assertRaises(SuspiciousFileOperation):
+            storage.save(
+                'posts/first.gif', ContentFile(SMALL_GIF), max_length=20
+            )
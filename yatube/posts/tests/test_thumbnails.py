@@ -0,0 +1,179 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from .. import thumbnails
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def small_gif(name='small.gif'):
+    return SimpleUploadedFile(
+        name=name, content=SMALL_GIF, content_type='image/gif'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTemplateTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='painter')
+        cls.post = Post.objects.create(
+            author=cls.author, text='С картинкой', image=small_gif()
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        thumbnails._failed.clear()
+
+    def test_page_never_draws_thumbnails(self):
+        """Страница не рисует миниатюры, а показывает заглушку"""
+        with mock.patch.object(thumbnails, 'get_thumbnail') as draw:
+            response = Client().get(reverse('posts:index'))
+        draw.assert_not_called()
+        self.assertContains(response, 'data:image/svg+xml')
+        self.assertIsNone(thumbnails.lookup(self.post.image))
+
+    def test_ready_thumbnail_is_shown(self):
+        """Готовая миниатюра выводится вместо заглушки"""
+        thumbnails.generate(self.post.image.name)
+        thumbnail = thumbnails.lookup(self.post.image)
+        self.assertIsNotNone(thumbnail)
+        response = Client().get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, 'data:image/svg+xml')
+
+    def test_picture_offers_widths_and_formats(self):
+        """Картинка выводится в нескольких ширинах и форматах"""
+        thumbnails.generate(self.post.image.name)
+        response = Client().get(reverse('posts:index'))
+        for width in thumbnails.WIDTHS:
+            self.assertContains(response, f' {width}w')
+        self.assertContains(response, 'type="image/webp"')
+        webp = thumbnails.lookup(self.post.image, (480, 'WEBP'))
+        self.assertTrue(webp.name.endswith('.webp'))
+        self.assertEqual(webp.width, 480)
+
+    def test_drawn_thumbnails_refresh_cached_pages(self):
+        """Нарисованные миниатюры сбрасывают страницы с заглушкой"""
+        with mock.patch.object(thumbnails.generations, 'bump') as bump:
+            thumbnails.generate(self.post.image.name)
+            bump.assert_called_once_with(
+                thumbnails.generations.POSTS,
+                thumbnails.generations.author(self.author.pk),
+            )
+            bump.reset_mock()
+            thumbnails.generate(self.post.image.name)
+            bump.assert_not_called()
+
+    def test_thumbnail_names_match_sorl(self):
+        """Имена миниатюр совпадают с теми, что выдаёт sorl-thumbnail"""
+        source = ImageFile(self.post.image)
+        for geometry, options in thumbnails.VARIANTS.values():
+            with self.subTest(geometry=geometry, options=options):
+                self.assertEqual(
+                    thumbnails._thumbnail_name(source, geometry, options),
+                    get_thumbnail(source, geometry, **options).name,
+                )
+
+    def test_failed_variants_not_rescheduled(self):
+        """Сбойные варианты не ставятся в очередь до срока повтора"""
+        with mock.patch.object(
+            thumbnails, 'get_thumbnail', side_effect=OSError
+        ), self.assertLogs('posts.thumbnails', 'ERROR'):
+            thumbnails.generate(self.post.image.name)
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            self.assertIsNone(thumbnails.picture(self.post.image))
+        schedule.assert_not_called()
+        with override_settings(THUMBNAIL_RETRY_AFTER=0):
+            with mock.patch.object(
+                thumbnails, 'get_thumbnail', side_effect=OSError
+            ), self.assertLogs('posts.thumbnails', 'ERROR'):
+                thumbnails.generate(self.post.image.name)
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            thumbnails.picture(self.post.image)
+        schedule.assert_called_once_with(self.post.image.name)
+
+    def test_page_resolves_thumbnails_in_one_batch(self):
+        """Миниатюры страницы достаются одним походом в кэш и базу"""
+        thumbnails.generate(self.post.image.name)
+        output = io.BytesIO()
+        Image.new('RGB', (4, 4), 'green').save(output, 'PNG')
+        other = Post.objects.create(
+            author=self.author, text='Ещё картинка',
+            image=SimpleUploadedFile('other.png', output.getvalue()),
+        )
+        posts = list(Post.objects.filter(pk__in=(self.post.pk, other.pk)))
+        cache.clear()
+        kv_cache = thumbnails.default.kvstore.cache
+        with mock.patch.object(
+            kv_cache, 'get_many', wraps=kv_cache.get_many
+        ) as get_many, CaptureQueriesContext(connection) as queries:
+            thumbnails.attach_pictures(posts)
+        get_many.assert_called_once()
+        self.assertEqual(len(queries), 1)
+        pictures = {post.pk: post.picture for post in posts}
+        self.assertEqual(
+            pictures[self.post.pk].src,
+            thumbnails.lookup(self.post.image).url,
+        )
+        self.assertIsNone(pictures[other.pk])
+        with CaptureQueriesContext(connection) as queries:
+            thumbnails.attach_pictures(posts)
+        self.assertEqual(len(queries), 0)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailScheduleTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user(username='poster'))
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_post_create_schedules_thumbnails(self):
+        """После сохранения поста с картинкой миниатюры уже готовы"""
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Новая картинка', 'image': small_gif('new.gif')},
+        )
+        post = Post.objects.get()
+        self.assertIsNotNone(thumbnails.lookup(post.image))
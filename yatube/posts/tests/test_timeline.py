@@ -0,0 +1,101 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import counters, timeline
+from ..models import Follow, Post, Timeline
+from ..timeline import MergedFeed, follow_feed
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.stranger = User.objects.create_user(username='stranger')
+        cls.old_post = Post.objects.create(
+            author=cls.author, text='Пост до подписки'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_follow_backfills_timeline(self):
+        """Подписка раскладывает в ленту старые посты автора"""
+        self.assertTrue(Timeline.objects.filter(
+            user=self.reader, post=self.old_post
+        ).exists())
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в ленты только подписчиков"""
+        post = Post.objects.create(author=self.author, text='Свежий пост')
+        self.assertTrue(
+            Timeline.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertFalse(
+            Timeline.objects.filter(user=self.stranger).exists()
+        )
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+
+    def test_unfollow_clears_timeline(self):
+        """Отписка убирает посты автора из ленты"""
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', args=(self.author.username,))
+        )
+        self.assertFalse(Timeline.objects.filter(user=self.reader).exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_big_author_is_merged_on_read(self):
+        """Посты крупного автора подмешиваются в ленту при чтении"""
+        Follow.objects.create(user=self.stranger, author=self.author)
+        post = Post.objects.create(author=self.author, text='Для всех')
+        self.assertFalse(Timeline.objects.filter(author=self.author).exists())
+        self.assertFalse(
+            Follow.objects.filter(author=self.author, fanout=True).exists()
+        )
+        feed = follow_feed(self.reader)
+        self.assertIsInstance(feed, MergedFeed)
+        self.assertEqual(list(feed), [post, self.old_post])
+        self.assertEqual(feed.count(), 2)
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_author_below_limit_fans_out_again(self):
+        """Автор, потерявший подписчиков, снова раскладывает посты"""
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.stranger, author=self.author)
+        Follow.objects.create(user=fan, author=self.author)
+        post = Post.objects.create(author=self.author, text='Для всех')
+        self.assertFalse(Timeline.objects.filter(author=self.author).exists())
+        Follow.objects.filter(user=fan).delete()
+        self.assertFalse(
+            Follow.objects.filter(author=self.author, fanout=True).exists()
+        )
+        Follow.objects.filter(user=self.stranger).delete()
+        self.assertFalse(
+            Follow.objects.filter(author=self.author, fanout=False).exists()
+        )
+        self.assertEqual(
+            set(Timeline.objects.filter(user=self.reader).values_list(
+                'post', flat=True
+            )),
+            {post.pk, self.old_post.pk},
+        )
+        self.assertNotIsInstance(follow_feed(self.reader), MergedFeed)
+
+    def test_big_author_check_reads_stats(self):
+        """Размер аудитории берётся из счётчика, без COUNT по подпискам"""
+        counters.get_stats(self.author.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(timeline.is_big_author(self.author.pk))
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT', queries[0]['sql'])
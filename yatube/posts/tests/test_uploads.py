@@ -0,0 +1,144 @@
+import io
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..forms import PostForm
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+ORIENTATION = 0x0112
+
+
+def jpeg(size, orientation=None, name='photo.jpg'):
+    output = io.BytesIO()
+    exif = Image.Exif()
+    exif[0x010F] = 'Камера'
+    if orientation:
+        exif[ORIENTATION] = orientation
+    Image.new('RGB', size, 'red').save(output, 'JPEG', exif=exif)
+    return SimpleUploadedFile(name, output.getvalue(), 'image/jpeg')
+
+
+def animation(size, frames, name='clip.gif'):
+    output = io.BytesIO()
+    images = [
+        Image.new('RGB', size, color)
+        for color in ('red', 'green', 'blue')[:frames]
+    ]
+    images[0].save(
+        output, 'GIF', save_all=True, append_images=images[1:],
+        duration=50, loop=0, comment=b'GPS 55.75, 37.61',
+    )
+    return SimpleUploadedFile(name, output.getvalue(), 'image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_MAX_SIDE=100)
+class UploadNormalizationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def stored_image(self):
+        post = Post.objects.get(author=self.user)
+        with Image.open(post.image.path) as image:
+            image.load()
+            return image
+
+    def test_large_image_is_downscaled_and_stripped(self):
+        """Большая картинка уменьшается и теряет EXIF"""
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Фото', 'image': jpeg((400, 200))},
+        )
+        image = self.stored_image()
+        self.assertEqual(image.size, (100, 50))
+        self.assertEqual(len(image.getexif()), 0)
+
+    def test_orientation_applied_before_strip(self):
+        """Поворот из EXIF применяется к пикселям"""
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Боком', 'image': jpeg((80, 40), orientation=6)},
+        )
+        self.assertEqual(self.stored_image().size, (40, 80))
+
+    @override_settings(IMAGE_MAX_PIXELS=1000)
+    def test_decompression_bomb_rejected(self):
+        """Картинка больше лимита пикселей не принимается"""
+        form = PostForm(
+            data={'text': 'Бомба'},
+            files={'image': jpeg((100, 100))},
+        )
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()['image'][0].code,
+                         'image_too_large')
+        self.assertFalse(Post.objects.exists())
+
+    def test_animation_is_downscaled_and_stripped(self):
+        """Анимация уменьшается по кадрам и теряет метаданные"""
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Гифка', 'image': animation((400, 200), 3)},
+        )
+        post = Post.objects.get(author=self.user)
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertEqual(image.n_frames, 3)
+            self.assertNotIn('comment', image.info)
+
+    @override_settings(IMAGE_MAX_FRAMES=2)
+    def test_long_animation_rejected(self):
+        """Анимация длиннее лимита кадров не принимается"""
+        form = PostForm(
+            data={'text': 'Длинная'},
+            files={'image': animation((10, 10), 3)},
+        )
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()['image'][0].code,
+                         'image_too_large')
+
+    @override_settings(IMAGE_MAX_PIXELS=250)
+    def test_animation_pixels_counted_over_frames(self):
+        """Предел пикселей считается по всем кадрам анимации"""
+        form = PostForm(
+            data={'text': 'Тяжёлая'},
+            files={'image': animation((10, 10), 3)},
+        )
+        self.assertFalse(form.is_valid())
+
+    def test_foreign_format_converted(self):
+        """BMP пересохраняется в JPEG с новым расширением"""
+        output = io.BytesIO()
+        Image.new('RGB', (10, 10), 'blue').save(output, 'BMP')
+        self.client.post(
+            reverse('posts:post_create'),
+            {
+                'text': 'BMP',
+                'image': SimpleUploadedFile(
+                    'old.bmp', output.getvalue(), 'image/bmp'
+                ),
+            },
+        )
+        post = Post.objects.get(author=self.user)
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        self.assertEqual(self.stored_image().format, 'JPEG')
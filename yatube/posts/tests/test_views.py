@@ -7,7 +7,9 @@ from django.conf import settings
 from django.contrib.auth import get_user_model, REDIRECT_FIELD_NAME
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.shortcuts import get_object_or_404
 from ..forms import PostForm
@@ -281,18 +283,63 @@ class CacheTests(TestCase):
 
     def test_index_cache(self):
         """Тест кэширования главной страницы"""
-        Post.objects.create(
-            text="Не понимаю теорию ЯП. Помогите!",
-            author=self.author,
-        )
         response_1 = self.author_client.get(reverse('posts:index'))
-        Post.objects.filter(text="Не понимаю теорию ЯП. Помогите!").delete()
+        Post.objects.filter(pk=self.post.pk).update(text='Мимо сигналов')
         response_2 = self.author_client.get(reverse('posts:index'))
         self.assertEqual(response_1.content, response_2.content)
         cache.clear()
         response_3 = self.author_client.get(reverse('posts:index'))
         self.assertNotEqual(response_1.content, response_3.content)
 
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_cached_fragment_skips_feed_query(self):
+        """Лента из кэша фрагмента не читает посты из базы"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.author_client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    second = self.author_client.get(url)
+                self.assertEqual(first.content, second.content)
+                self.assertFalse([
+                    query['sql'] for query in queries
+                    if '"posts_post"' in query['sql']
+                ])
+
+    def test_cache_invalidated_on_change(self):
+        """Изменения постов, групп и авторов сразу видны в лентах"""
+        group = Group.objects.create(
+            title='Кэш', slug='cache-slug', description='Поколения'
+        )
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=(group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+        )
+        for url in urls:
+            self.author_client.get(url)
+        post = Post.objects.create(
+            text='Свежий пост', author=self.author, group=group
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.author_client.get(url), post.text)
+        group.title = 'Переименована'
+        group.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.author_client.get(url), 'Переименована'
+                )
+        post.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(self.author_client.get(url), post.text)
+
 
 class FollowTests(TestCase):
     @classmethod
@@ -347,3 +394,82 @@ class FollowTests(TestCase):
             reverse("posts:follow_index", None)
         )
         self.assertNotContains(response, self.post.text)
+
+
+class ConditionalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='validated')
+        cls.reader = User.objects.create_user(username='revisiting')
+        cls.post = Post.objects.create(author=cls.author, text='Без правок')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_anonymous_page_not_modified(self):
+        """Аноним получает 304 без запросов, а CDN может хранить страницу"""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                url,
+                HTTP_IF_NONE_MATCH=response['ETag'],
+                HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+            )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertContains(response, 'Новый пост')
+
+    def test_user_pages_private(self):
+        """Страницы вошедшего пользователя хранит только браузер"""
+        response = self.reader_client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotEqual(
+            response['ETag'],
+            self.client.get(
+                reverse('posts:post_detail', args=(self.post.pk,))
+            )['ETag'],
+        )
+
+    def test_changes_in_scope_refresh_page(self):
+        """Комментарий и подписка меняют валидаторы своих страниц"""
+        pages = {
+            reverse('posts:post_detail', args=(self.post.pk,)): lambda: (
+                Comment.objects.create(
+                    post=self.post, author=self.reader, text='Свежий'
+                )
+            ),
+            reverse('posts:profile', args=(self.author.username,)): lambda: (
+                Follow.objects.create(user=self.reader, author=self.author)
+            ),
+        }
+        for url, change in pages.items():
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.assertEqual(
+                    self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                        .status_code,
+                    HTTPStatus.NOT_MODIFIED,
+                )
+                change()
+                self.assertEqual(
+                    self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                        .status_code,
+                    HTTPStatus.OK,
+                )
+
+    def test_missing_page_not_validated(self):
+        """Для несуществующей группы валидаторов нет, ответ 404"""
+        response = self.client.get(
+            reverse('posts:group_posts', args=('nowhere',))
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertNotIn('ETag', response)
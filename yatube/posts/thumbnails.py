@@ -0,0 +1,304 @@
+"""Миниатюры картинок постов, которые рисуются в фоне.
+
+Шаблоны только спрашивают у KV-хранилища sorl-thumbnail, готова ли
+миниатюра, и никогда не декодируют оригинал сами. Недостающие размеры
+рисует пул потоков: после сохранения поста с картинкой и при первом
+промахе в шаблоне, если картинка появилась раньше этого кода.
+
+Каждая картинка рисуется в нескольких ширинах для ``srcset`` и, кроме
+формата по умолчанию, в WebP, если его умеет сохранять Pillow.
+Варианты, которые нарисовать не удалось, процесс не ставит в очередь
+снова ``THUMBNAIL_RETRY_AFTER`` секунд.
+
+Имена миниатюр считаются закрытыми методами ``ThumbnailBackend``, а
+промах KV-хранилища узнаётся по ``EMPTY_VALUE`` из sorl-thumbnail
+12.7.0. Версия закреплена в requirements.txt, тест сверяет имена с
+теми, что выдаёт ``get_thumbnail``.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import metrics, timing
+
+from . import generations
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+CARD_WIDTH = 960
+CARD_HEIGHT = 339
+WIDTHS = (480, 960, 1440)
+# None — формат миниатюр sorl по умолчанию, он же для <img>; остальные
+# идут в <source> и отдаются браузерам, которые их понимают.
+MIME_TYPES = {'WEBP': 'image/webp'}
+
+Image.init()
+FORMATS = [None] + [
+    format_ for format_ in MIME_TYPES if format_ in Image.SAVE
+]
+
+VARIANTS = {
+    (width, format_): (
+        f'{width}x{round(width * CARD_HEIGHT / CARD_WIDTH)}',
+        dict(
+            {'crop': 'center', 'upscale': True},
+            **({'format': format_} if format_ else {}),
+        ),
+    )
+    for format_ in FORMATS
+    for width in WIDTHS
+}
+CARD = (CARD_WIDTH, None)
+
+Picture = namedtuple('Picture', 'src srcset sources width height')
+
+_executor = None
+_pending = set()
+# Имя картинки → (варианты, которые не нарисовались; до какого момента
+# их не пробовать).
+_failed = {}
+_lock = threading.Lock()
+
+
+def _thumbnail_name(source, geometry, options):
+    # Те же умолчания, что у ThumbnailBackend.get_thumbnail: от них
+    # зависит имя файла миниатюры.
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return backend._get_thumbnail_filename(source, geometry, options)
+
+
+def lookup(image, variant=CARD):
+    """Готовая миниатюра или None; сама ничего не рисует."""
+    geometry, options = VARIANTS[variant]
+    name = _thumbnail_name(ImageFile(image), geometry, options)
+    return default.kvstore.get(ImageFile(name, default.storage))
+
+
+def lookup_all(image):
+    """Все готовые варианты картинки: {(ширина, формат): миниатюра}."""
+    source = ImageFile(image)
+    ready = {}
+    for variant, (geometry, options) in VARIANTS.items():
+        name = _thumbnail_name(source, geometry, options)
+        thumbnail = default.kvstore.get(ImageFile(name, default.storage))
+        if thumbnail is not None:
+            ready[variant] = thumbnail
+    return ready
+
+
+def _srcset(ready, format_):
+    return ', '.join(
+        f'{ready[width, format_].url} {width}w'
+        for width in WIDTHS
+        if (width, format_) in ready
+    )
+
+
+def _thumbnail_keys(image):
+    """{вариант: ключ в KV-хранилище} для всех вариантов картинки."""
+    source = ImageFile(image)
+    return {
+        variant: add_prefix(ImageFile(
+            _thumbnail_name(source, geometry, options), default.storage
+        ).key)
+        for variant, (geometry, options) in VARIANTS.items()
+    }
+
+
+def resolve(images):
+    """Готовые варианты многих картинок: {имя: {вариант: миниатюра}}.
+
+    Вместо запроса в кэш и базу на каждый вариант каждой картинки —
+    один ``get_many`` в кэш и один запрос в базу за промахами.
+    """
+    if not isinstance(default.kvstore, CachedDBKVStore):
+        return {image.name: lookup_all(image) for image in images}
+    keys = {image.name: _thumbnail_keys(image) for image in images}
+    raw_keys = [
+        key for variants in keys.values() for key in variants.values()
+    ]
+    kv_cache = default.kvstore.cache
+    with timing.timer('cache'):
+        values = kv_cache.get_many(raw_keys)
+    missing = [key for key in raw_keys if key not in values]
+    timing.count('cache.hit', len(values))
+    timing.count('cache.miss', len(missing))
+    if missing:
+        found = dict(
+            KVStoreModel.objects.filter(key__in=missing).values_list(
+                'key', 'value'
+            )
+        )
+        fetched = {key: found.get(key, EMPTY_VALUE) for key in missing}
+        kv_cache.set_many(fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return {
+        name: {
+            variant: deserialize_image_file(values[key])
+            for variant, key in variants.items()
+            if values[key] != EMPTY_VALUE
+        }
+        for name, variants in keys.items()
+    }
+
+
+def attach_pictures(posts):
+    """Раздаёт постам страницы готовые ``picture`` одним походом в KV."""
+    posts = [post for post in posts if post.image]
+    ready = resolve([post.image for post in posts])
+    for post in posts:
+        post.picture = picture(post.image, ready[post.image.name])
+
+
+def _failed_variants(name):
+    failed, until = _failed.get(name, ((), 0))
+    return failed if until > time.monotonic() else ()
+
+
+def _remember_failed(name, failed):
+    now = time.monotonic()
+    with _lock:
+        for expired in [
+            key for key, (_, until) in _failed.items() if until <= now
+        ]:
+            del _failed[expired]
+        if failed:
+            _failed[name] = (
+                frozenset(failed), now + settings.THUMBNAIL_RETRY_AFTER
+            )
+        else:
+            _failed.pop(name, None)
+
+
+def picture(image, ready=None):
+    """Данные для <picture> или None, пока основной вариант не готов.
+
+    Недостающие варианты ставятся в очередь, кроме недавно сбойных.
+    """
+    if ready is None:
+        ready = lookup_all(image)
+    missing = set(VARIANTS) - set(ready) - set(_failed_variants(image.name))
+    if missing:
+        schedule(image.name)
+    if CARD not in ready:
+        return None
+    sources = [
+        (MIME_TYPES[format_], _srcset(ready, format_))
+        for format_ in reversed(FORMATS[1:])
+        if any((width, format_) in ready for width in WIDTHS)
+    ]
+    return Picture(
+        ready[CARD].url, _srcset(ready, None), sources,
+        CARD_WIDTH, CARD_HEIGHT,
+    )
+
+
+def _invalidate(name):
+    """Новое поколение страниц с постами картинки.
+
+    Пока миниатюры не было, ленты и страницы постов закэшировались с
+    заглушкой вместо картинки.
+    """
+    posts = set(Post.objects.filter(image=name).values_list(
+        'author_id', 'group_id'
+    ))
+    if not posts:
+        return
+    generations.bump(
+        generations.POSTS,
+        *{generations.author(author_id) for author_id, _ in posts},
+        *{
+            generations.group(group_id)
+            for _, group_id in posts
+            if group_id is not None
+        },
+    )
+
+
+def generate(name):
+    """Рисует все размеры картинки, которых ещё нет."""
+    source = ImageFile(name, Post._meta.get_field('image').storage)
+    drawn = lookup_all(source)
+    started = time.perf_counter()
+    with timing.timer('thumbnail'):
+        for variant, (geometry, options) in VARIANTS.items():
+            if variant in drawn:
+                continue
+            try:
+                get_thumbnail(source, geometry, **options)
+            except Exception:
+                logger.exception(
+                    'Не удалось нарисовать миниатюру %s %s %s',
+                    name, geometry, options.get('format', ''),
+                )
+    ready = lookup_all(source)
+    # sorl-thumbnail сам глотает ошибки чтения оригинала: сбойный
+    # вариант — тот, которого нет в KV-хранилище.
+    _remember_failed(name, set(VARIANTS) - set(ready))
+    if len(ready) > len(drawn):
+        _invalidate(name)
+    metrics.THUMBNAIL_SECONDS.observe(time.perf_counter() - started)
+    timing.count('thumbnail.drawn')
+
+
+def _run(name):
+    try:
+        generate(name)
+    except Exception:
+        logger.exception('Не удалось нарисовать миниатюры %s', name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+        connection.close()
+
+
+def _submit(name):
+    global _executor
+    if not settings.THUMBNAIL_WORKERS:
+        generate(name)
+        return
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    _executor.submit(_run, name)
+
+
+def schedule(name):
+    """Ставит картинку в очередь после фиксации транзакции.
+
+    При ``THUMBNAIL_WORKERS = 0`` миниатюры рисуются сразу в том же
+    потоке — это для тестов и команд.
+    """
+    if name:
+        transaction.on_commit(lambda: _submit(name))
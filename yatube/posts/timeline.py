@@ -0,0 +1,258 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Q
+
+from .models import Follow, Post, Timeline, UserStats
+from .utils import NEXT, PREVIOUS, keyset_filter, keyset_ordering, seek
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+def _followers(author_id):
+    """Число подписчиков из UserStats; пока строки нет — COUNT.
+
+    Строку здесь не заводим: запись, внутри которой это спрашивают,
+    ещё сдвинет счётчики сама.
+    """
+    followers = UserStats.objects.filter(pk=author_id).values_list(
+        'followers_count', flat=True
+    ).first()
+    if followers is None:
+        followers = Follow.objects.filter(author_id=author_id).count()
+    return followers
+
+
+def is_big_author(author_id):
+    """Слишком много подписчиков, чтобы раскладывать посты при записи."""
+    return _followers(author_id) > settings.TIMELINE_FANOUT_LIMIT
+
+
+def _fill(condition, params):
+    """Раскладывает посты авторов по лентам подписок из ``condition``."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {Timeline._meta.db_table} '
+            f'(user_id, post_id, author_id, pub_date) '
+            f'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+            f'FROM {Follow._meta.db_table} f '
+            f'JOIN {Post._meta.db_table} p ON p.author_id = f.author_id '
+            f'WHERE {condition}',
+            params,
+        )
+
+
+def switch_to_pull(author_id):
+    """Переводит всех подписчиков автора на подмешивание при чтении."""
+    Follow.objects.filter(author_id=author_id, fanout=True).update(
+        fanout=False
+    )
+    Timeline.objects.filter(author_id=author_id).delete()
+
+
+def switch_to_push(author_id):
+    """Возвращает подписчиков автора к раскладке постов при записи."""
+    _fill('f.author_id = %s AND f.fanout = %s', [author_id, False])
+    Follow.objects.filter(author_id=author_id, fanout=False).update(
+        fanout=True
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_big_author(post.author_id):
+        switch_to_pull(post.author_id)
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id, fanout=True
+    ).values_list('user_id', flat=True)
+    for batch in _batched(followers.iterator(), settings.TIMELINE_BATCH_SIZE):
+        Timeline.objects.bulk_create(
+            (
+                Timeline(
+                    user_id=user_id,
+                    post_id=post.pk,
+                    author_id=post.author_id,
+                    pub_date=post.pub_date,
+                )
+                for user_id in batch
+            ),
+            ignore_conflicts=True,
+        )
+
+
+def subscribe(follow):
+    """Заполняет ленту новой подписки уже опубликованными постами."""
+    if is_big_author(follow.author_id):
+        switch_to_pull(follow.author_id)
+        return
+    posts = Post.objects.filter(author_id=follow.author_id).values_list(
+        'pk', 'pub_date'
+    )
+    for batch in _batched(posts.iterator(), settings.TIMELINE_BATCH_SIZE):
+        Timeline.objects.bulk_create(
+            (
+                Timeline(
+                    user_id=follow.user_id,
+                    post_id=post_id,
+                    author_id=follow.author_id,
+                    pub_date=pub_date,
+                )
+                for post_id, pub_date in batch
+            ),
+            ignore_conflicts=True,
+        )
+
+
+def rebuild():
+    """Раскладывает все ленты заново одним INSERT ... SELECT.
+
+    Подписчики крупных авторов сначала переводятся на подмешивание,
+    остальные — на раскладку при записи.
+    """
+    Timeline.objects.all().delete()
+    big_authors = (
+        Follow.objects
+        .order_by()
+        .values('author')
+        .annotate(total=Count('pk'))
+        .filter(total__gt=settings.TIMELINE_FANOUT_LIMIT)
+        .values('author')
+    )
+    Follow.objects.filter(author__in=big_authors, fanout=True).update(
+        fanout=False
+    )
+    Follow.objects.exclude(author__in=big_authors).filter(
+        fanout=False
+    ).update(fanout=True)
+    _fill('f.fanout = %s', [True])
+
+
+def unsubscribe(follow):
+    """Убирает автора из ленты; автор, у которого подписчиков стало
+    меньше предела, снова раскладывает посты при записи."""
+    Timeline.objects.filter(
+        user_id=follow.user_id, author_id=follow.author_id
+    ).delete()
+    if not follow.fanout and (
+        _followers(follow.author_id) < settings.TIMELINE_FANOUT_LIMIT
+    ):
+        switch_to_push(follow.author_id)
+
+
+class TimelineFeed:
+    """Материализованная часть ленты подписчика.
+
+    Все условия по ``timeline_entries`` собираются в один ``filter()``,
+    чтобы Django не добавлял второй JOIN к многозначной связи.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    date_field = 'timeline_entries__pub_date'
+    id_field = 'timeline_entries__post'
+
+    def _posts(self, *conditions, direction=NEXT):
+        return (
+            Post.objects
+                .select_related('author', 'group')
+                .filter(Q(timeline_entries__user=self.user), *conditions)
+                .order_by(*keyset_ordering(
+                    direction, self.date_field, self.id_field
+                ))
+        )
+
+    def count(self):
+        return Timeline.objects.filter(user=self.user).count()
+
+    def __getitem__(self, key):
+        return self._posts()[key]
+
+    def seek(self, key, direction, limit):
+        conditions = []
+        if key is not None:
+            conditions.append(
+                keyset_filter(key, direction, self.date_field, self.id_field)
+            )
+        posts = list(self._posts(*conditions, direction=direction)[:limit])
+        if direction == PREVIOUS:
+            posts.reverse()
+        return posts
+
+
+class MergedFeed:
+    """Слияние нескольких лент, отсортированных по убыванию даты.
+
+    Поддерживает ``count()``, срезы и ``seek()``, поэтому подходит для
+    ``CursorPaginator`` в обоих режимах.
+    """
+
+    def __init__(self, *sources):
+        self.sources = sources
+
+    def count(self):
+        return sum(source.count() for source in self.sources)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def _merge(self, sources):
+        return heapq.merge(
+            *sources,
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=True,
+        )
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        stop = key.stop
+        if stop is None:
+            sources = self.sources
+        else:
+            sources = [source[:stop] for source in self.sources]
+        return list(islice(self._merge(sources), start, stop))
+
+    def seek(self, key, direction, limit):
+        posts = list(self._merge(
+            seek(source, key, direction, limit) for source in self.sources
+        ))
+        if direction == PREVIOUS:
+            return posts[-limit:]
+        return posts[:limit]
+
+
+def follow_feed(user):
+    """Лента «Избранные авторы».
+
+    Посты обычных авторов читаются одним диапазоном по индексу ленты,
+    посты крупных авторов подмешиваются из их собственных постов.
+    """
+    pushed = TimelineFeed(user)
+    pulled_authors = list(
+        Follow.objects.filter(user=user, fanout=False).values_list(
+            'author_id', flat=True
+        )
+    )
+    if not pulled_authors:
+        return pushed
+    pulled = (
+        Post.objects
+            .select_related('author', 'group')
+            .filter(author_id__in=pulled_authors)
+            .order_by('-pub_date', '-pk')
+    )
+    return MergedFeed(pushed, pulled)
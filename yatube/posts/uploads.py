@@ -0,0 +1,168 @@
+"""Приведение загруженных картинок постов к разумному виду.
+
+Оригинал не хранится как есть: картинка уменьшается до
+``IMAGE_MAX_SIDE`` по большей стороне, поворачивается по EXIF, теряет
+метаданные и пересохраняется с ``IMAGE_QUALITY``. Размер проверяется
+по заголовку, до декодирования, поэтому «бомба» из пары килобайт,
+которая распаковывается в гигабайты, отклоняется сразу. Анимация
+пересобирается по кадрам так же, а её предел — ``IMAGE_MAX_FRAMES``
+кадров и ``IMAGE_MAX_PIXELS`` пикселей на все кадры вместе.
+
+Одинаковые картинки хранятся одним файлом (ContentAddressedStorage),
+поэтому файл и его миниатюры удаляются, только когда на него не
+ссылается ни один пост. Файл, который загружали меньше
+``IMAGE_RELEASE_GRACE`` секунд назад, остаётся: его может ждать пост
+из параллельного запроса. Такие файлы позже убирает
+``manage.py collect_images``.
+"""
+import io
+import os
+import warnings
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, ImageSequence
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post
+
+KEEP_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png'}
+
+
+def _target_format(image):
+    if image.format in KEEP_FORMATS:
+        return image.format
+    if image.mode in ('RGBA', 'LA', 'P') or 'transparency' in image.info:
+        return 'PNG'
+    return 'JPEG'
+
+
+def _open(upload):
+    upload.seek(0)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            image = Image.open(upload)
+    except (Image.DecompressionBombWarning, Image.DecompressionBombError):
+        raise ValidationError(
+            'Картинка слишком большая.', code='image_too_large'
+        )
+    width, height = image.size
+    frames = getattr(image, 'n_frames', 1)
+    if (
+        frames > settings.IMAGE_MAX_FRAMES
+        or width * height * frames > settings.IMAGE_MAX_PIXELS
+    ):
+        raise ValidationError(
+            'Картинка слишком большая: %(width)s×%(height)s, '
+            'кадров: %(frames)s.',
+            code='image_too_large',
+            params={'width': width, 'height': height, 'frames': frames},
+        )
+    return image
+
+
+def _animation(image, upload):
+    """Анимация, уменьшенная покадрово и без метаданных."""
+    max_side = settings.IMAGE_MAX_SIDE
+    frames = []
+    durations = []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get('duration', 100))
+        frame = frame.convert('RGBA')
+        frame.thumbnail((max_side, max_side), Image.LANCZOS)
+        frame.info = {}
+        frames.append(frame)
+    output = io.BytesIO()
+    frames[0].save(
+        output, image.format,
+        save_all=True,
+        append_images=frames[1:],
+        duration=durations,
+        loop=image.info.get('loop', 0),
+        # Кадры уже сведены целиком: каждый заменяет предыдущий.
+        disposal=2,
+    )
+    return ContentFile(output.getvalue(), name=upload.name)
+
+
+def normalize(upload):
+    """Новый файл вместо загруженного; ValidationError для «бомб»."""
+    image = _open(upload)
+    if getattr(image, 'n_frames', 1) > 1:
+        return _animation(image, upload)
+    source_format = image.format
+    format_ = _target_format(image)
+    max_side = settings.IMAGE_MAX_SIDE
+    # JPEG декодируется сразу в уменьшенном масштабе, не в полном.
+    image.draft('RGB', (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    if format_ == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    options = {'quality': settings.IMAGE_QUALITY, 'optimize': True}
+    if format_ == 'JPEG':
+        options['progressive'] = True
+    if 'icc_profile' in image.info:
+        options['icc_profile'] = image.info['icc_profile']
+    # Из метаданных остаётся только то, без чего картинка выглядит иначе.
+    image.info = {
+        key: value for key, value in image.info.items()
+        if key in ('transparency', 'background')
+    }
+    output = io.BytesIO()
+    image.save(output, format_, **options)
+    name = upload.name
+    if format_ != source_format:
+        name = os.path.splitext(name)[0] + EXTENSIONS[format_]
+    return ContentFile(output.getvalue(), name=name)
+
+
+def _storage():
+    return Post._meta.get_field('image').storage
+
+
+def release(name):
+    """Удаляет картинку и её миниатюры, если она больше никому не нужна.
+
+    Возвращает True, если файл удалён.
+    """
+    if not name:
+        return False
+    storage = _storage()
+    try:
+        deleted = storage.delete_unused(
+            name,
+            lambda: Post.objects.filter(image=name).exists(),
+            settings.IMAGE_RELEASE_GRACE,
+        )
+    except SuspiciousFileOperation:
+        # Имя вне MEDIA_ROOT: такого файла в хранилище нет.
+        return False
+    if deleted:
+        default.backend.delete(ImageFile(name, storage), delete_file=False)
+    return deleted
+
+
+def collect():
+    """Удаляет картинки, на которые не ссылается ни один пост.
+
+    Возвращает число удалённых файлов.
+    """
+    storage = _storage()
+    upload_to = Post._meta.get_field('image').upload_to
+    storage.restore_releasing(upload_to)
+    used = set(
+        Post.objects.exclude(image='').values_list('image', flat=True)
+    )
+    root = storage.path('')
+    names = [
+        os.path.relpath(os.path.join(dirpath, filename), root)
+        .replace(os.sep, '/')
+        for dirpath, _, filenames in os.walk(storage.path(upload_to))
+        for filename in filenames
+    ]
+    return sum(release(name) for name in names if name not in used)
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = 'posts'
 
@@ -19,6 +19,8 @@ urlpatterns = [
         'posts/<int:post_id>/comment/',
         views.add_comment, name='add_comment'
     ),
+    path('search/', views.search, name='search'),
+    path('api/search/', views.search_api, name='search_api'),
     path('follow/', views.follow_index,
          name='follow_index'),
     path(
@@ -35,4 +37,17 @@ urlpatterns = [
         'comments/<int:comment_id>/delete/',
         views.comment_delete, name='comment_delete'
     ),
+    path('api/posts/', api.post_list, name='api_post_list'),
+    path('api/posts/<int:post_id>/', api.post_detail,
+         name='api_post_detail'),
+    path('api/posts/<int:post_id>/comments/', api.comment_list,
+         name='api_comment_list'),
+    path('api/comments/<int:comment_id>/', api.comment_detail,
+         name='api_comment_detail'),
+    path('api/groups/', api.group_list, name='api_group_list'),
+    path('api/groups/<slug:slug>/', api.group_detail,
+         name='api_group_detail'),
+    path('api/follows/', api.follow_list, name='api_follow_list'),
+    path('api/follows/<str:username>/', api.follow_detail,
+         name='api_follow_detail'),
 ]
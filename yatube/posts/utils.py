@@ -1,8 +1,172 @@
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.paginator import Page, Paginator
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from . import counters, thumbnails
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(post, direction, date_field='pub_date'):
+    raw = f'{direction}|{getattr(post, date_field).isoformat()}|{post.pk}'
+    return urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (направление, (pub_date, pk)) или None для мусора."""
+    if not token:
+        return None
+    try:
+        raw = urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        direction, pub_date, pk = raw.split('|')
+        key = (parse_datetime(pub_date), int(pk))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or key[0] is None:
+        return None
+    return direction, key
+
+
+def keyset_filter(key, direction, date_field='pub_date', id_field='pk'):
+    """Условие «строго после ключа» в порядке выдачи ленты.
+
+    Записано как ``date <= d AND (date < d OR id < i)``, чтобы первая
+    часть была диапазоном по индексу, а вторая отсекала только дубли даты.
+    """
+    pub_date, pk = key
+    op = 'lt' if direction == NEXT else 'gt'
+    return Q(**{f'{date_field}__{op}e': pub_date}) & (
+        Q(**{f'{date_field}__{op}': pub_date})
+        | Q(**{f'{id_field}__{op}': pk})
+    )
+
+
+def keyset_ordering(direction, date_field='pub_date', id_field='pk'):
+    # F(), а не строки: строка с именем связи развернулась бы в её
+    # Meta.ordering и лишний JOIN.
+    fields = F(date_field), F(id_field)
+    if direction == NEXT:
+        return tuple(field.desc() for field in fields)
+    return tuple(field.asc() for field in fields)
+
 
+def seek(post_list, key, direction, limit, date_field='pub_date'):
+    """До ``limit`` постов за ключом, по убыванию даты.
 
-def paginate_posts(request, post_list):
-    paginator = Paginator(post_list, settings.POSTS_ON_PAGE)
+    Лента может быть QuerySet постов или объектом со своим ``seek()``.
+    ``date_field`` — поле даты в ключе для других моделей.
+    """
+    if hasattr(post_list, 'seek'):
+        return post_list.seek(key, direction, limit)
+    if key is not None:
+        post_list = post_list.filter(
+            keyset_filter(key, direction, date_field)
+        )
+    posts = list(
+        post_list.order_by(*keyset_ordering(direction, date_field))[:limit]
+    )
+    if direction == PREVIOUS:
+        posts.reverse()
+    return posts
+
+
+class CursorPaginator(Paginator):
+    """Paginator, который умеет листать по ключу (pub_date, id).
+
+    Страница по курсору — один запрос ``LIMIT per_page + 1`` без COUNT и
+    OFFSET, поэтому далёкие страницы стоят столько же, сколько первая.
+    Номер страницы и ``num_pages`` в этом режиме условные: их хватает,
+    чтобы ``has_next``/``has_previous`` у обычного ``Page`` работали.
+    """
+    by_cursor = False
+
+    def __init__(self, object_list, per_page, scope=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.scope = scope
+
+    @cached_property
+    def count(self):
+        """Число постов из счётчика области, а не COUNT(*) по ленте."""
+        if self.scope is None:
+            return super().count
+        return counters.get_count(self.scope)
+
+    def page_window(self, number, on_each_side=2, on_ends=1):
+        """Номера страниц вокруг текущей; None на месте пропуска."""
+        if self.num_pages <= (on_each_side + on_ends) * 2 + 1:
+            yield from self.page_range
+            return
+        if number > on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield None
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < self.num_pages - on_each_side - on_ends:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield None
+            yield from range(
+                self.num_pages - on_ends + 1, self.num_pages + 1
+            )
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+    def get_page(self, number):
+        page = super().get_page(number)
+        page.page_window = list(self.page_window(page.number))
+        return page
+
+    def cursor_page(self, cursor):
+        direction, key = decode_cursor(cursor) or (NEXT, None)
+        posts = seek(self.object_list, key, direction, self.per_page + 1)
+        if not posts and key is not None:
+            return self.cursor_page(None)
+        has_more = len(posts) > self.per_page
+        if direction == NEXT:
+            posts = posts[:self.per_page]
+            has_previous, has_next = key is not None, has_more
+        else:
+            posts = posts[-self.per_page:]
+            has_previous, has_next = has_more, True
+        self.by_cursor = True
+        number = 2 if has_previous else 1
+        self.num_pages = number + 1 if has_next else number
+        page = Page(posts, number, self)
+        page.next_cursor = (
+            encode_cursor(posts[-1], NEXT) if has_next else None
+        )
+        page.previous_cursor = (
+            encode_cursor(posts[0], PREVIOUS) if has_previous else None
+        )
+        return page
+
+
+def paginate_posts(request, post_list, scope=None):
+    paginator = CursorPaginator(post_list, settings.POSTS_ON_PAGE, scope)
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    if page_number is not None:
+        page = paginator.get_page(page_number)
+        page.object_list = list(page.object_list)
+    else:
+        page = paginator.cursor_page(request.GET.get('cursor'))
+    thumbnails.attach_pictures(page.object_list)
+    return page
+
+
+def lazy_page(request, post_list, scope=None):
+    """``paginate_posts``, отложенный до отрисовки фрагмента с лентой.
+
+    Шаблон получает функцию и берёт страницу внутри ``{% fresh_cache %}``
+    через ``{% with page_obj=feed %}``: если фрагмент уже в кэше, лента
+    не читается. ``post_list`` может быть функцией, которая её собирает.
+    """
+    def page():
+        posts = post_list() if callable(post_list) else post_list
+        return paginate_posts(request, posts, scope)
+    return page
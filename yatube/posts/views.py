@@ -1,31 +1,122 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
+from core.budget import query_budget
+from core.pagecache import page_cache
+from core.db import use_replica
+from core.sqlite import writes
+from core.stampede import cache_view
+
+from . import counters, fulltext, generations, thumbnails
+from .conditional import conditional, page_version
 from .forms import PostForm, CommentForm
 from .models import Group, Post, Comment, Follow
-from .utils import paginate_posts
+from .timeline import follow_feed
+from .utils import lazy_page
 
 User = get_user_model()
 
+# Ответы API поиска одинаковы для всех; правки сбрасывают их раньше
+# поколением ленты.
+SEARCH_CACHE_TIMEOUT = 60
+
+
+def feed_posts():
+    return Post.objects.select_related('author', 'group')
+
+
+def group_feed(group):
+    return group.posts.select_related('author').all()
+
+
+def author_feed(author):
+    return author.posts.select_related('group').all()
+
+
+def post_comments(post_id):
+    return Comment.objects.select_related('author').filter(post_id=post_id)
+
+
+def _index_scope(request):
+    return [generations.SITE, generations.POSTS]
+
+
+def _group_scope(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    if group_id is None:
+        return None
+    return [generations.SITE, generations.group(group_id)]
+
+
+def _profile_scope(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    scope = [
+        generations.SITE,
+        generations.author(author_id),
+        generations.follows(author_id),
+        generations.followers(author_id),
+    ]
+    if request.user.is_authenticated:
+        # Кнопка «Подписаться» или «Отписаться».
+        scope.append(generations.follows(request.user.pk))
+    return scope
+
+
+def _post_scope(request, post_id):
+    # Правка поста и комментарии к нему увеличивают поколение автора.
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    return [generations.SITE, generations.author(author_id)]
 
+
+@query_budget(4)
+@use_replica
+@conditional(_index_scope)
+@page_cache(page_version(_index_scope))
 def index(request):
-    posts_list = Post.objects.select_related('author', 'group')
-    page_obj = paginate_posts(request, posts_list)
-    context = {'page_obj': page_obj}
+    posts_list = feed_posts()
+    context = {
+        'feed': lazy_page(request, posts_list, counters.ALL),
+        'cache_version': generations.current(
+            generations.SITE, generations.POSTS
+        ),
+    }
     return render(request, 'posts/index.html', context)
 
 
+@query_budget(6)
+@use_replica
+@conditional(_group_scope)
+@page_cache(page_version(_group_scope))
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts_list = group.posts.select_related('author').all()
+    posts_list = group_feed(group)
     context = {
         'group': group,
-        'page_obj': paginate_posts(request, posts_list)
+        'feed': lazy_page(
+            request, posts_list, counters.group_scope(group.pk)
+        ),
+        'cache_version': generations.current(
+            generations.SITE, generations.group(group.pk)
+        ),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@query_budget(8)
+@use_replica
+@conditional(_profile_scope)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
     following = (request.user.is_authenticated and Follow.objects.filter(
@@ -35,14 +126,24 @@ def profile(request, username):
     )
     context = {
         'author': author,
-        'page_obj': paginate_posts(
-            request, author.posts.select_related('group').all()
+        'stats': counters.get_stats(author.pk),
+        'feed': lazy_page(
+            request,
+            author_feed(author),
+            counters.author_scope(author.pk),
         ),
         'following': following,
+        'cache_version': generations.current(
+            generations.SITE, generations.author(author.pk)
+        ),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@query_budget(8)
+@use_replica
+@conditional(_post_scope)
+@page_cache(page_version(_post_scope))
 def post_detail(request, post_id):
     queryset = (
         Post.objects
@@ -50,14 +151,52 @@ def post_detail(request, post_id):
             .prefetch_related('comments__author')
     )
     post = get_object_or_404(queryset, id=post_id)
+    thumbnails.attach_pictures([post])
     form = CommentForm()
     comments = post.comments.all()
     context = {
-        'form': form, 'post': post, 'comments': comments
+        'form': form, 'post': post, 'comments': comments,
+        'stats': counters.get_stats(post.author_id),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(5)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    hits, next_cursor = fulltext.search(query, request.GET.get('cursor'))
+    thumbnails.attach_pictures(
+        [hit.object for hit in hits if hit.kind == 'post']
+    )
+    context = {'query': query, 'hits': hits, 'next_cursor': next_cursor}
+    return render(request, 'posts/search.html', context)
+
+
+@query_budget(2)
+@cache_view(SEARCH_CACHE_TIMEOUT, version=page_version(_index_scope))
+def search_api(request):
+    query = request.GET.get('q', '').strip()
+    hits, next_cursor = fulltext.search(query, request.GET.get('cursor'))
+    return JsonResponse({
+        'query': query,
+        'results': [
+            {
+                'type': hit.kind,
+                'id': hit.object.pk,
+                'url': hit.url,
+                'text': (
+                    hit.object.title if hit.kind == 'group'
+                    else hit.object.text
+                ),
+                'rank': hit.rank,
+            }
+            for hit in hits
+        ],
+        'next_cursor': next_cursor,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+@query_budget(3, POST=14)
 @login_required
 def post_create(request):
     form = PostForm(
@@ -68,10 +207,11 @@ def post_create(request):
         return render(request, 'posts/create_post.html', {'form': form})
     post = form.save(commit=False)
     post.author = request.user
-    post.save()
+    writes.run(post.save)
     return redirect("posts:profile", post.author.username)
 
 
+@query_budget(5, POST=11)
 @login_required
 def post_edit(request, post_id):
     original_post = get_object_or_404(Post, pk=post_id)
@@ -85,19 +225,21 @@ def post_edit(request, post_id):
     context = {"form": form}
     if not form.is_valid():
         return render(request, 'posts/create_post.html', context)
-    form.save()
+    writes.run(form.save)
     return redirect('posts:post_detail', post_id)
 
 
+@query_budget(14)
 @login_required
 def post_delete(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
-    if request.user != post.author:
+    if request.user.pk != post.author_id:
         return redirect('posts:post_detail', post_id)
-    post.delete()
-    return redirect('posts:profile', post.author)
+    writes.run(post.delete)
+    return redirect('posts:profile', request.user.username)
 
 
+@query_budget(3, POST=8)
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
@@ -106,37 +248,51 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        writes.run(comment.save)
     return redirect('posts:post_detail', post_id=post_id)
 
+@query_budget(7)
 @login_required
 def comment_delete(request, comment_id):
     comment = get_object_or_404(Comment, id=comment_id)
-    if request.user == comment.author:
-        comment.delete()
-    return redirect('posts:post_detail', post_id=comment.post.id)
+    if request.user.pk == comment.author_id:
+        writes.run(comment.delete)
+    return redirect('posts:post_detail', post_id=comment.post_id)
 
+@query_budget(5)
+@use_replica
 @login_required
 def follow_index(request):
-    posts_list = Post.objects.prefetch_related('author').filter(
-        author__following__user=request.user
-    )
-    page_obj = paginate_posts(request, posts_list)
-    context = {'page_obj': page_obj}
+    context = {
+        'feed': lazy_page(
+            request,
+            lambda: follow_feed(request.user),
+            counters.feed_scope(request.user.pk),
+        ),
+        'cache_version': generations.current(
+            generations.SITE,
+            generations.POSTS,
+            generations.follows(request.user.pk),
+        ),
+    }
     return render(request, 'posts/follow.html', context)
 
 
+@query_budget(11)
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        writes.run(lambda: Follow.objects.get_or_create(
+            user=request.user, author=author
+        ))
     return redirect("posts:profile", username=username)
 
 
+@query_budget(7)
 @login_required
 def profile_unfollow(request, username):
-    Follow.objects.filter(
+    writes.run(Follow.objects.filter(
         user=request.user, author__username=username
-    ).delete()
+    ).delete)
     return redirect("posts:profile", username=username)
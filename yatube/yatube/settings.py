@@ -21,6 +21,60 @@ ALLOWED_HOSTS = [
 
 POSTS_ON_PAGE = 10
 
+# Авторы, у которых подписчиков больше этого числа, не раскладывают посты
+# по лентам при публикации: их посты подмешиваются в ленту при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+
+TIMELINE_BATCH_SIZE = 500
+
+# Сколько секунд CDN или обратный прокси может отдавать страницу
+# анонимам без проверки; браузеры проверяют её по ETag каждый раз.
+SHARED_CACHE_MAX_AGE = 60
+
+# Страницы лент и постов целиком хранятся в кэше столько секунд;
+# личные части вставляются при каждом ответе (core.pagecache). 0 —
+# без кэша страниц.
+PAGE_CACHE_TIMEOUT = 6 * 60 * 60
+
+# Поиск: auto — FTS5 в SQLite, если доступен, иначе обратный индекс
+# в таблицах; python — всегда обратный индекс в таблицах.
+SEARCH_BACKEND = 'auto'
+
+# Сколько потоков рисуют миниатюры в фоне; 0 — рисовать сразу.
+THUMBNAIL_WORKERS = 2
+# Вариант миниатюры, который не удалось нарисовать, не ставится в
+# очередь снова столько секунд.
+THUMBNAIL_RETRY_AFTER = 60 * 60
+
+# Загруженные картинки: больше IMAGE_MAX_PIXELS пикселей не принимаем,
+# остальные уменьшаем до IMAGE_MAX_SIDE по большей стороне.
+IMAGE_MAX_PIXELS = 40_000_000
+# У анимации пиксели считаются по всем кадрам вместе.
+IMAGE_MAX_FRAMES = 300
+IMAGE_MAX_SIDE = 2048
+IMAGE_QUALITY = 85
+# Освободившуюся картинку моложе стольких секунд не удаляем сразу: её
+# может ждать пост из параллельного запроса (manage.py collect_images).
+IMAGE_RELEASE_GRACE = 10 * 60
+
+# Доля запросов, которые замеряются для Server-Timing и лога
+# yatube.timing. Замер дешёвый, но не бесплатный: в бою хватит процента.
+SERVER_TIMING_SAMPLE_RATE = float(os.environ.get(
+    'YATUBE_TIMING_SAMPLE_RATE', 1.0 if DEBUG else 0.01
+))
+
+# Метрики Prometheus: каждый процесс сбрасывает свои значения в файл
+# каталога METRICS_DIR не чаще раза в METRICS_FLUSH_INTERVAL секунд,
+# страница /metrics их складывает. Каталог чистят при выкатке.
+METRICS_DIR = os.environ.get(
+    'YATUBE_METRICS_DIR', os.path.join(BASE_DIR, '.metrics')
+)
+METRICS_FLUSH_INTERVAL = 1
+# Если задан, /metrics отдаётся только с заголовком
+# «Authorization: Bearer <токен>»; если нет — только прямым запросам
+# с адресов INTERNAL_IPS. Остальным страница не существует.
+METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN', '')
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -47,6 +101,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.timing.ServerTimingMiddleware',
+    'core.db.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,13 +137,58 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Соединение живёт CONN_MAX_AGE секунд вместо одного запроса; если оно
+# простояло дольше CONN_HEALTH_CHECK_INTERVAL, перед запросом его
+# проверяют (core.db).
+CONN_MAX_AGE = int(os.environ.get('YATUBE_CONN_MAX_AGE', 60))
+CONN_HEALTH_CHECK_INTERVAL = 30
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+    }
+}
+
+# Реплики только для чтения: пути к файлам SQLite через запятую в
+# YATUBE_REPLICAS.
+REPLICA_DATABASES = []
+for number, path in enumerate(
+    filter(None, os.environ.get('YATUBE_REPLICAS', '').split(','))
+):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
     }
+    REPLICA_DATABASES.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+
+# Прагмы каждого нового соединения SQLite (core.sqlite): WAL, fsync
+# только на контрольных точках, 256 МБ отображения в память, 64 МБ кэша
+# страниц и пять секунд ожидания блокировки вместо ошибки.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
 }
 
+# Записи комментариев и подписок выстраиваются в очередь к одному
+# писателю и фиксируются пачками до WRITE_QUEUE_BATCH_SIZE штук.
+# Включается там, где fsync дорог (медленный диск, synchronous=FULL),
+# — см. manage.py sqlite_benchmark.
+WRITE_QUEUE = os.environ.get('YATUBE_WRITE_QUEUE', '') == '1'
+WRITE_QUEUE_BATCH_SIZE = 50
+
+# После записи браузер столько секунд читает с основной базы, пока
+# реплики догоняют; недоступная реплика столько же выпадает из ротации.
+REPLICA_STICKY_SECONDS = 10
+REPLICA_RETRY_SECONDS = 30
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -102,10 +204,44 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
-CACHES = {
-    'default': {
+# Кэш общий для всех процессов сервера: иначе каждый воркер держит свою
+# копию фрагментов и поколений. Бэкенд выбирается переменной окружения
+# YATUBE_CACHE: file (по умолчанию), redis или locmem.
+CACHE_BACKENDS = {
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_DIR', os.path.join(BASE_DIR, '.cache')
+        ),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'redis': {
+        'BACKEND': 'core.cache.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0'),
+    },
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[os.environ.get('YATUBE_CACHE', 'file')],
+}
+
+# Замеры запросов — по строке JSON на запрос.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'yatube.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
 
 INTERNAL_IPS = [
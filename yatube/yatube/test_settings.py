@@ -0,0 +1,36 @@
+"""Настройки для тестов.
+
+``manage.py test`` берёт их сам, pytest — из ``pytest.ini``.
+"""
+import os
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, CACHE_BACKENDS, DATABASES
+
+# Картинки, которые тесты сохраняют без своего MEDIA_ROOT (например,
+# mixer в фикстурах pytest), не должны попадать в media/ проекта.
+MEDIA_ROOT = os.path.join(tempfile.gettempdir(), 'yatube-test-media')
+
+# Фоновый поток миниатюр писал бы во временный MEDIA_ROOT, пока тест
+# его удаляет.
+THUMBNAIL_WORKERS = 0
+
+SERVER_TIMING_SAMPLE_RATE = 0
+
+METRICS_DIR = os.path.join(tempfile.gettempdir(), 'yatube-test-metrics')
+
+# Кэш в памяти процесса: файлы .cache пережили бы прогон и подсунули
+# следующему фрагменты и поколения от прошлой тестовой базы.
+CACHES = {'default': CACHE_BACKENDS['locmem']}
+
+# Тест держит свою транзакцию: записи идут сразу, без очереди.
+WRITE_QUEUE = False
+
+# Одна реплика для тестов маршрутизатора; остальные тесты с неё не
+# читают.
+DATABASES['replica0'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': os.path.join(BASE_DIR, 'replica0.sqlite3'),
+}
+REPLICA_DATABASES = []
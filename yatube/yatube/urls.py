@@ -4,11 +4,14 @@ from django.contrib import admin
 from django.urls import include, path
 import debug_toolbar
 
+from core.views import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("auth/", include("users.urls")),
     path("auth/", include("django.contrib.auth.urls")),
     path('about/', include('about.urls', namespace='about')),
+    path('metrics', metrics_view, name='metrics'),
     path("", include("posts.urls")),
 ]
 